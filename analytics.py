@@ -0,0 +1,131 @@
+"""
+Columnar rollups for the leave and substitution analytics.
+
+Rows are loaded once into flat typed buffers, one per column, with string
+columns dictionary-encoded into integer codes. Grouped sums then work on
+whole columns: with NumPy installed they are a single bincount over the
+combined group key, otherwise the same computation runs over the
+array-module buffers in pure Python. NumPy is optional and not in
+requirements.txt; results are identical either way.
+"""
+
+import operator
+import threading
+import time
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+ENGINE = 'numpy' if np is not None else 'python'
+
+
+def encode(values):
+    """Dictionary-encode values into (codes, categories), categories sorted"""
+    categories = sorted(set(values), key=lambda v: (v is None, v))
+    lookup = {value: code for code, value in enumerate(categories)}
+    return array('q', (lookup[value] for value in values)), categories
+
+
+def as_array(values, typecode='q'):
+    return array(typecode, values)
+
+
+def _np(column):
+    return np.asarray(column)
+
+
+def group_sum(keys, sizes, weights=None, mask=None):
+    """Sum weights (or count rows) per combination of key codes.
+
+    `keys` are code columns with `sizes` distinct values each; `mask`
+    optionally selects rows (a sequence of 0/1). Returns {(code, ...): total}
+    for the non-empty groups.
+    """
+    if not keys or not len(keys[0]):
+        return {}
+    if np is not None:
+        combined = np.ravel_multi_index([_np(k) for k in keys], sizes)
+        w = _np(weights).astype(np.float64) if weights is not None else None
+        if mask is not None:
+            selected = _np(mask).astype(bool)
+            combined = combined[selected]
+            w = w[selected] if w is not None else None
+        totals = np.bincount(combined, weights=w, minlength=int(np.prod(sizes)))
+        nonzero = np.flatnonzero(totals)
+        groups = zip(*np.unravel_index(nonzero, sizes)) if len(nonzero) else ()
+        return {tuple(int(c) for c in group): totals[i].item() for group, i in zip(groups, nonzero)}
+
+    totals = {}
+    columns = list(keys)
+    rows = zip(*columns)
+    for i, group in enumerate(rows):
+        if mask is not None and not mask[i]:
+            continue
+        totals[group] = totals.get(group, 0) + (weights[i] if weights is not None else 1)
+    return totals
+
+
+def weekday_counts(starts, ends):
+    """Per row, how many of each weekday fall in [start, end] (date ordinals).
+
+    Returns seven columns, Monday first.
+    """
+    if np is not None:
+        start = _np(starts)
+        days = _np(ends) - start + 1
+        full_weeks, remainder = np.divmod(days, 7)
+        first = (start - 1) % 7  # date.fromordinal(1) is a Monday
+        offset = (np.arange(7)[:, None] - first[None, :]) % 7
+        counts = full_weeks[None, :] + (offset < remainder[None, :])
+        return [array('q', counts[d].tolist()) for d in range(7)]
+
+    columns = [array('q', [0]) * len(starts) for _ in range(7)]
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        full_weeks, remainder = divmod(end - start + 1, 7)
+        first = (start - 1) % 7
+        for d in range(7):
+            columns[d][i] = full_weeks + (1 if (d - first) % 7 < remainder else 0)
+    return columns
+
+
+def dot_rows(columns, lookup, index):
+    """sum_d columns[d][i] * lookup[index[i]][d] for every row i"""
+    if np is not None:
+        table = np.asarray(lookup, dtype=np.int64).reshape(-1, 7) if len(lookup) else np.zeros((0, 7), np.int64)
+        stacked = np.stack([_np(c) for c in columns], axis=1)
+        return array('q', (stacked * table[_np(index)]).sum(axis=1).tolist())
+    return array('q', (
+        sum(map(operator.mul, counts, lookup[i])) for i, *counts in zip(index, *columns)
+    ))
+
+
+class PeriodCache:
+    """Computed reports keyed by period and options, kept for `ttl` seconds"""
+
+    def __init__(self, ttl=300, max_entries=64):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        """Return (value, cached)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[0] <= self.ttl:
+                return entry[1], True
+        value = compute()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                oldest = min(self._entries, key=lambda k: self._entries[k][0])
+                del self._entries[oldest]
+            self._entries[key] = (now, value)
+        return value, False
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -1,25 +1,43 @@
-from flask import Flask, request, jsonify, session, send_from_directory
+from flask import Flask, Blueprint, Response, current_app, request, jsonify, session, send_from_directory, stream_with_context, url_for
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.hybrid import hybrid_property
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import os
+import io
+import csv
 import json
+import hashlib
+import secrets
+import threading
+import time
+import uuid
+import click
 from dateutil.parser import parse as parse_date
+from jobs import ACTIVE_STATUSES, JobWorkerPool
+from buffers import WriteBehindBuffer
+from archive import NDJSONArchive
+from metrics import RequestMetrics
+from notifications import NotificationBroker
+import analytics
+import ical
+from intervals import MINUTES_PER_DAY, IntervalIndex, format_minutes, format_time_slot, overlaps, parse_time, parse_time_slot
+import migrations
+import solver
+from rooms import RoomAvailabilityIndex, parse_facilities
+from session_hooks import track_changes
+from assignment import BALANCED, STRATEGIES, CandidateProfile, SubstitutePlanner, SubstituteRequest
+from config import DEFAULT_SECRET_KEY, config as configs
 
-# Initialize Flask app with static folder configuration
-app = Flask(__name__, static_folder='public', static_url_path='')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///college_management.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
-app.config['SESSION_COOKIE_HTTPONLY'] = True
-app.config['SESSION_COOKIE_SECURE'] = False  # Set to True in production with HTTPS
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=8)
-
-db = SQLAlchemy(app)
-CORS(app, supports_credentials=True)
+# Extensions and routes are bound to an application in create_app()
+db = SQLAlchemy()
+api = Blueprint('api', __name__, cli_group=None)
+request_metrics = RequestMetrics()
 
 # Database Models
 class Admin(db.Model):
@@ -46,6 +64,7 @@ class Staff(db.Model):
     position = db.Column(db.String(100), nullable=False)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    calendar_token = db.Column(db.String(64), nullable=True, unique=True, index=True)  # secret part of the iCal feed URL
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -63,6 +82,17 @@ class Classroom(db.Model):
     facilities = db.Column(db.Text, nullable=True)  # e.g., "Projector, AC, Whiteboard"
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    tags = db.relationship('ClassroomFacility', backref='classroom', cascade='all, delete-orphan')
+
+    def set_facilities(self, value):
+        """Store facilities as display text plus one indexed tag each"""
+        names = value.split(',') if isinstance(value, str) else (value or [])
+        self.facilities = ', '.join(' '.join(str(name).split()) for name in names if str(name).strip())
+        wanted = parse_facilities(self.facilities)
+        # Keep unchanged tag rows, the unique index would reject re-inserting them
+        self.tags = [tag for tag in self.tags if tag.tag in wanted] + [
+            ClassroomFacility(tag=tag) for tag in sorted(wanted - {tag.tag for tag in self.tags})
+        ]
 
     def to_dict(self):
         return {
@@ -73,17 +103,36 @@ class Classroom(db.Model):
             'floor': self.floor,
             'building': self.building,
             'facilities': self.facilities,
+            'facility_tags': sorted(parse_facilities(self.facilities)),
             'is_active': self.is_active,
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S')
         }
 
+class ClassroomFacility(db.Model):
+    """One facility of a classroom as a lowercase tag, e.g. 'smart board'"""
+    __table_args__ = (
+        db.UniqueConstraint('classroom_id', 'tag', name='uq_classroom_facility'),
+        db.Index('ix_classroom_facility_tag', 'tag', 'classroom_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    classroom_id = db.Column(db.Integer, db.ForeignKey('classroom.id'), nullable=False)
+    tag = db.Column(db.String(100), nullable=False)
+
 class Timetable(db.Model):
+    __table_args__ = (
+        db.Index('ix_timetable_staff_day_slot', 'staff_id', 'day', 'time_slot'),
+        db.Index('ix_timetable_day_start', 'day', 'start_minute'),
+        # Last line of defence against a double booking slipping past the clash check
+        db.Index('uq_timetable_day_staff_slot', 'day', 'staff_id', 'time_slot', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     staff_id = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False)
     course_code = db.Column(db.String(50), nullable=False)
     course_name = db.Column(db.String(200), nullable=False)
     day = db.Column(db.String(20), nullable=False)  # Monday, Tuesday, etc.
     time_slot = db.Column(db.String(50), nullable=False)  # 09:00-10:30
+    start_minute = db.Column(db.Integer, nullable=True)  # Minutes since midnight, parsed from time_slot
+    end_minute = db.Column(db.Integer, nullable=True)  # Exclusive
     room = db.Column(db.String(50), nullable=False)
     classroom_id = db.Column(db.Integer, db.ForeignKey('classroom.id'), nullable=True)  # Link to classroom
     batch = db.Column(db.String(100), nullable=True)
@@ -91,10 +140,20 @@ class Timetable(db.Model):
     staff = db.relationship('Staff', backref='timetable_entries')
     classroom = db.relationship('Classroom', backref='timetable_entries')  # Classroom relationship
 
+    def set_time_slot(self, text):
+        """Store a slot like "9:00-10:30" as normalized text plus start/end minutes"""
+        self.start_minute, self.end_minute = parse_time_slot(text)
+        self.time_slot = format_time_slot(self.start_minute, self.end_minute)
+
 class Leave(db.Model):
+    __table_args__ = (
+        db.Index('ix_leave_status', 'status'),
+        db.Index('ix_leave_staff_applied', 'staff_id', 'applied_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     staff_id = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False)
-    leave_date = db.Column(db.Date, nullable=False)
+    leave_date = db.Column(db.Date, nullable=False)  # First day of leave
+    end_date = db.Column(db.Date, nullable=True)  # Last day of leave, None for a single day
     leave_type = db.Column(db.String(50), nullable=False)  # sick, casual, emergency
     reason = db.Column(db.Text, nullable=True)
     status = db.Column(db.String(20), default='pending')  # pending, approved, rejected
@@ -103,7 +162,29 @@ class Leave(db.Model):
     staff = db.relationship('Staff', backref='leave_requests')
     admin = db.relationship('Admin', backref='leave_approvals')
 
+    @hybrid_property
+    def last_date(self):
+        return self.end_date or self.leave_date
+
+    @last_date.expression
+    def last_date(cls):
+        return db.func.coalesce(cls.end_date, cls.leave_date)
+
+    def weekdays(self):
+        """Lower-case names of the weekdays covered by this leave"""
+        days = set()
+        current = self.leave_date
+        while current <= self.last_date and len(days) < 7:
+            days.add(current.strftime('%A').lower())
+            current += timedelta(days=1)
+        return days
+
 class ClassRescheduling(db.Model):
+    __table_args__ = (
+        # One substitute per class per leave, even if two rescheduling runs race
+        db.Index('uq_class_rescheduling_timetable_leave', 'original_timetable_id', 'leave_id', unique=True),
+        db.Index('ix_class_rescheduling_leave', 'leave_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     original_timetable_id = db.Column(db.Integer, db.ForeignKey('timetable.id'), nullable=False)
     original_staff_id = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False)
@@ -115,6 +196,59 @@ class ClassRescheduling(db.Model):
     assigned_staff = db.relationship('Staff', foreign_keys=[assigned_staff_id], backref='assigned_classes')
     leave = db.relationship('Leave', backref='rescheduling_records')
 
+class RescheduleJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    leave_id = db.Column(db.Integer, db.ForeignKey('leave.id'), nullable=False, index=True)
+    auto_mode = db.Column(db.Boolean, default=False)
+    strategy = db.Column(db.String(20), nullable=True)
+    status = db.Column(db.String(20), default='queued', index=True)  # queued, running, done, failed
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=3)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    leave = db.relationship('Leave', backref='reschedule_jobs')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'leave_id': self.leave_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'finished_at': self.finished_at.strftime('%Y-%m-%d %H:%M:%S') if self.finished_at else None
+        }
+
+class TimetableJob(db.Model):
+    """A queued timetable generation request (see generate_timetable)"""
+    id = db.Column(db.Integer, primary_key=True)
+    params = db.Column(db.JSON, nullable=False)  # the request body
+    status = db.Column(db.String(20), default='queued', index=True)  # queued, running, done, failed
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=2)
+    result = db.Column(db.JSON, nullable=True)  # the generation report
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'finished_at': self.finished_at.strftime('%Y-%m-%d %H:%M:%S') if self.finished_at else None
+        }
+
 class Attendance(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     staff_id = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False)
@@ -124,7 +258,14 @@ class Attendance(db.Model):
     staff = db.relationship('Staff', backref='attendance_records')
 
 class LoginLog(db.Model):
+    __table_args__ = (
+        db.Index('ix_login_log_staff_status_time', 'staff_id', 'status', 'login_time'),
+        db.Index('ix_login_log_admin_status_time', 'admin_id', 'status', 'login_time'),
+        db.Index('ix_login_log_login_time', 'login_time'),
+        db.Index('ix_login_log_session_key', 'session_key', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
+    session_key = db.Column(db.String(32), nullable=True)  # also kept in the user's session
     staff_id = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=True)
     admin_id = db.Column(db.Integer, db.ForeignKey('admin.id'), nullable=True)
     login_time = db.Column(db.DateTime, default=datetime.utcnow)
@@ -135,6 +276,823 @@ class LoginLog(db.Model):
     staff = db.relationship('Staff', backref='login_logs')
     admin = db.relationship('Admin', backref='login_logs')
 
+class Notification(db.Model):
+    """A message for one staff member, streamed to their dashboard"""
+    __table_args__ = (
+        db.Index('ix_notification_staff_id', 'staff_id', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    staff_id = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False)
+    kind = db.Column(db.String(40), nullable=False)  # substitution_assigned, substitution_removed, leave_approved, leave_rejected
+    payload = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'payload': self.payload,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+class ChangeLog(db.Model):
+    """One row per inserted, updated or deleted record; the id is the change feed cursor"""
+    __table_args__ = (
+        db.Index('ix_change_log_entity', 'entity', 'entity_id', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(50), nullable=False)  # table name
+    entity_id = db.Column(db.Integer, nullable=True)  # NULL: reload the whole entity
+    op = db.Column(db.String(10), nullable=False)  # insert, update, delete, reload
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CacheVersion(db.Model):
+    """Version of data that workers copy into memory, bumped by every commit changing it"""
+    name = db.Column(db.String(50), primary_key=True)  # timetable, classroom, change_log
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+# Scheduling Helpers
+def data_version(name, lock=False):
+    """Current version of shared data such as the timetable.
+
+    With lock=True the transaction first takes the database write lock
+    (SQLite: BEGIN IMMEDIATE; other databases lock the version row), so the
+    version, and anything read after it, stays current until the commit.
+    """
+    if lock:
+        connection = db.session.connection()
+        if connection.dialect.name == 'sqlite' and not connection.connection.dbapi_connection.in_transaction:
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+    query = db.select(CacheVersion.version).where(CacheVersion.name == name)
+    if lock:
+        query = query.with_for_update()
+    return db.session.execute(query).scalar() or 0
+
+def data_versions(*names):
+    """Current versions of several kinds of shared data, as a tuple"""
+    versions = dict(db.session.query(CacheVersion.name, CacheVersion.version).filter(CacheVersion.name.in_(names)))
+    return tuple(versions.get(name, 0) for name in names)
+
+def committed_versions(session):
+    """Versions bumped by the transaction being committed: name -> new version,
+    or None where the database cannot return it. Use in after_commit hooks."""
+    return session.info.get('bumped_versions', {})
+
+def bump_version(session, name):
+    """Bump a data version once per transaction, inside that transaction"""
+    bumped = session.info.setdefault('bumped_versions', {})
+    if name in bumped:
+        return
+    table = CacheVersion.__table__
+    connection = session.connection()
+    update = table.update().where(table.c.name == name).values(version=table.c.version + 1)
+    if connection.dialect.update_returning:
+        version = connection.execute(update.returning(table.c.version)).scalar()
+        found = version is not None
+    else:
+        version = None
+        found = connection.execute(update).rowcount > 0
+    if not found:
+        connection.execute(table.insert().values(name=name, version=1))
+        version = 1
+    bumped[name] = version
+
+def lock_change_log(session):
+    """Make the transaction the only change log writer until it ends.
+
+    Change feed cursors are change log ids, so ids must become visible in
+    order. SQLite allows one write transaction at a time, which guarantees
+    that. Other databases run writers concurrently; there the transaction
+    locks the 'change_log' version row. Change log rows are only written
+    just before the commit (see write_change_log), so the lock is the last
+    one a transaction takes and is held only for that insert and the commit.
+    """
+    if session.info.get('change_log_locked'):
+        return
+    connection = session.connection()
+    if connection.dialect.name != 'sqlite':
+        table = CacheVersion.__table__
+        connection.execute(table.update().where(table.c.name == 'change_log').values(version=table.c.version + 1))
+    session.info['change_log_locked'] = True
+
+VERSIONED_MODELS = {Timetable: 'timetable', Classroom: 'classroom', ClassroomFacility: 'classroom'}
+
+@event.listens_for(db.session, 'after_flush')
+def bump_data_versions(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        name = VERSIONED_MODELS.get(type(obj))
+        if name:
+            bump_version(session, name)
+
+@event.listens_for(db.session, 'do_orm_execute')
+def bump_bulk_data_versions(orm_execute_state):
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in VERSIONED_MODELS and (
+        orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete
+    ):
+        bump_version(orm_execute_state.session, VERSIONED_MODELS[mapper.class_])
+
+@event.listens_for(db.session, 'after_transaction_end')
+def reset_bumped_versions(session, transaction):
+    # After the after_commit hooks have read them, or after a rollback
+    if transaction.parent is None:
+        session.info.pop('bumped_versions', None)
+        session.info.pop('change_log_locked', None)
+
+class TimetableOccupancyIndex:
+    """In-memory interval index over the timetable.
+
+    Entries are indexed by day, and by (day, staff), (day, room) and
+    (day, batch), so clash checks and "who is busy at 10:15" lookups take a
+    binary search instead of a query per staff member.
+
+    Every worker process has its own copy, so it is labelled with the
+    timetable version it was built from: sync() reloads it when another
+    process has committed a change since, and record()/discard() apply this
+    process's own changes without a reload.
+    """
+
+    DIMENSIONS = ('staff', 'room', 'batch')
+
+    def __init__(self, loaded=False):
+        self._lock = threading.Lock()
+        self._loaded = loaded  # True for a scratch index that never reads the database
+        self.version = None  # timetable version the contents reflect
+        self._entries = {}  # timetable_id -> (day, start, end, {dimension: value})
+        self.by_day = IntervalIndex()
+        self.by_dimension = {dimension: IntervalIndex() for dimension in self.DIMENSIONS}  # keyed by (day, value)
+
+    @staticmethod
+    def day_key(day):
+        return (day or '').strip().lower()
+
+    @staticmethod
+    def text_key(value):
+        return (value or '').strip().lower()
+
+    def _keys(self, staff_id, room, batch):
+        keys = {'staff': staff_id, 'room': self.text_key(room), 'batch': self.text_key(batch)}
+        return {dimension: value for dimension, value in keys.items() if value}
+
+    def _add(self, entry_id, staff_id, day, start, end, room, batch):
+        if start is None or end is None:
+            return
+        day = self.day_key(day)
+        keys = self._keys(staff_id, room, batch)
+        self._entries[entry_id] = (day, start, end, keys)
+        self.by_day.add(day, start, end, entry_id)
+        for dimension, value in keys.items():
+            self.by_dimension[dimension].add((day, value), start, end, entry_id)
+
+    def _remove(self, entry_id):
+        previous = self._entries.pop(entry_id, None)
+        if not previous:
+            return
+        day, start, end, keys = previous
+        self.by_day.remove(day, start, end, entry_id)
+        for dimension, value in keys.items():
+            self.by_dimension[dimension].remove((day, value), start, end, entry_id)
+
+    def _clear(self):
+        self._entries = {}
+        self.by_day.clear()
+        for index in self.by_dimension.values():
+            index.clear()
+
+    def load(self):
+        version = data_version('timetable')  # read first: the rows are at least this recent
+        rows = db.session.query(
+            Timetable.id, Timetable.staff_id, Timetable.day, Timetable.start_minute,
+            Timetable.end_minute, Timetable.room, Timetable.batch
+        ).all()
+        with self._lock:
+            self._clear()
+            for row in rows:
+                self._add(*row)
+            self._loaded = True
+            self.version = version
+
+    def ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def sync(self, version):
+        """Reload unless the index already reflects this timetable version"""
+        if not (self._loaded and self.version == version):
+            self.load()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+            self.version = None
+            self._clear()
+
+    def record(self, entry, version):
+        """Add or move an entry committed by a transaction that locked `version`"""
+        with self._lock:
+            if self._loaded and self.version == version:
+                self._remove(entry.id)
+                self._add(entry.id, entry.staff_id, entry.day, entry.start_minute, entry.end_minute, entry.room, entry.batch)
+                self.version = version + 1
+                return
+        self.invalidate()  # other changes came in between: reload on next use
+
+    def discard(self, entry_id, version):
+        with self._lock:
+            if self._loaded and self.version == version:
+                self._remove(entry_id)
+                self.version = version + 1
+                return
+        self.invalidate()
+
+    def add(self, entry_id, staff_id, day, start, end, room=None, batch=None):
+        with self._lock:
+            self._add(entry_id, staff_id, day, start, end, room, batch)
+
+    def entries_between(self, day, start, end):
+        """Ids of entries on `day` overlapping [start, end)"""
+        self.ensure_loaded()
+        with self._lock:
+            return [item for _, _, item in self.by_day.overlapping(self.day_key(day), start, end)]
+
+    def busy_staff(self, day, start, end):
+        """Ids of staff teaching at any point in [start, end) on `day`"""
+        self.ensure_loaded()
+        with self._lock:
+            return {
+                self._entries[item][3]['staff']
+                for _, _, item in self.by_day.overlapping(self.day_key(day), start, end)
+            }
+
+    def conflicts_for(self, day, start, end, staff_id=None, room=None, batch=None, exclude_id=None):
+        """[(dimension, timetable_id)] of entries that would clash with the given slot"""
+        self.ensure_loaded()
+        day = self.day_key(day)
+        clashes = []
+        with self._lock:
+            for dimension, value in self._keys(staff_id, room, batch).items():
+                for _, _, item in self.by_dimension[dimension].overlapping((day, value), start, end):
+                    if item != exclude_id:
+                        clashes.append((dimension, item))
+        return clashes
+
+    def all_conflicts(self):
+        """[(dimension, [timetable_id, ...])] for every group of clashing entries"""
+        self.ensure_loaded()
+        clashes = []
+        with self._lock:
+            for dimension, index in self.by_dimension.items():
+                for key in index.keys():
+                    for group in index.overlapping_groups(key):
+                        clashes.append((dimension, group))
+        return clashes
+
+occupancy = TimetableOccupancyIndex()
+
+# Dashboard Statistics Cache
+class DashboardStatsCache:
+    """Materialized dashboard counters kept in memory.
+
+    Loaded with a few GROUP BY queries, then kept current by the session
+    events below: ORM inserts, updates and deletes of Staff, Leave and
+    ClassRescheduling rows adjust the counters when their transaction
+    commits. Bulk UPDATE/DELETE statements (and ORM changes whose previous
+    values weren't loaded) can't be applied incrementally, so they mark the
+    cache stale and the next read reloads it. The TTL bounds how long
+    writes from other worker processes take to show up.
+
+    Per-day counters cover `days_back` days before today onwards.
+    """
+
+    def __init__(self, ttl=60, days_back=30):
+        self.ttl = ttl
+        self.days_back = days_back
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._clear()
+
+    def _clear(self):
+        self.window_start = date.today() - timedelta(days=self.days_back)
+        self.staff_by_department = {}    # department -> [total, active]
+        self.leaves_by_status = {}       # status -> count
+        self.on_leave_by_day = {}        # date -> approved leaves covering it
+        self.reschedules_total = 0
+        self.reschedules_by_day = {}     # date created -> count
+
+    def load(self):
+        window_start = date.today() - timedelta(days=self.days_back)
+        staff_rows = db.session.query(Staff.department, Staff.is_active, db.func.count(Staff.id)).group_by(
+            Staff.department, Staff.is_active).all()
+        leave_rows = db.session.query(Leave.status, db.func.count(Leave.id)).group_by(Leave.status).all()
+        approved = db.session.query(Leave.leave_date, Leave.end_date).filter(
+            Leave.status == 'approved', Leave.last_date >= window_start).all()
+        reschedules_total = db.session.query(db.func.count(ClassRescheduling.id)).scalar()
+        day_column = db.func.date(ClassRescheduling.created_at)
+        reschedule_rows = db.session.query(day_column, db.func.count(ClassRescheduling.id)).filter(
+            ClassRescheduling.created_at >= datetime.combine(window_start, datetime.min.time())
+        ).group_by(day_column).all()
+        db.session.rollback()
+        
+        with self._lock:
+            self._clear()
+            self.window_start = window_start
+            for department, is_active, count in staff_rows:
+                self._add_staff((is_active, department), count)
+            for status, count in leave_rows:
+                self.leaves_by_status[status] = count
+            for leave_date, end_date in approved:
+                self._add_leave_days(leave_date, end_date, 1)
+            self.reschedules_total = reschedules_total
+            for day, count in reschedule_rows:
+                day = day if isinstance(day, date) else date.fromisoformat(str(day))
+                self.reschedules_by_day[day] = count
+            self._loaded_at = time.monotonic()
+
+    def ensure_loaded(self):
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > self.ttl or self.window_start != date.today() - timedelta(days=self.days_back):
+            self.load()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    # Incremental updates; states are the tuples built by the session hooks
+    def apply(self, changes):
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            for kind, state, sign in changes:
+                if kind == 'staff':
+                    self._add_staff(state, sign)
+                elif kind == 'leave':
+                    status, leave_date, end_date = state
+                    self.leaves_by_status[status] = self.leaves_by_status.get(status, 0) + sign
+                    if status == 'approved':
+                        self._add_leave_days(leave_date, end_date, sign)
+                elif kind == 'reschedule':
+                    self.reschedules_total += sign
+                    if state >= self.window_start:
+                        self.reschedules_by_day[state] = self.reschedules_by_day.get(state, 0) + sign
+
+    def _add_staff(self, state, count):
+        is_active, department = state
+        counts = self.staff_by_department.setdefault(department, [0, 0])
+        counts[0] += count
+        if is_active:
+            counts[1] += count
+
+    def _add_leave_days(self, leave_date, end_date, sign):
+        day = max(leave_date, self.window_start)
+        last = end_date or leave_date
+        while day <= last:
+            self.on_leave_by_day[day] = self.on_leave_by_day.get(day, 0) + sign
+            day += timedelta(days=1)
+
+    # Reads
+    def snapshot(self, days=7):
+        """Counters for the dashboard, with per-day values from today on"""
+        self.ensure_loaded()
+        today = date.today()
+        with self._lock:
+            departments = {
+                department: {'total': total, 'active': active}
+                for department, (total, active) in sorted(self.staff_by_department.items()) if total
+            }
+            upcoming = [today + timedelta(days=n) for n in range(days)]
+            return {
+                'total_staff': sum(d['total'] for d in departments.values()),
+                'active_staff': sum(d['active'] for d in departments.values()),
+                'departments': departments,
+                'leaves': {status: count for status, count in sorted(self.leaves_by_status.items()) if count},
+                'pending_leaves': self.leaves_by_status.get('pending', 0),
+                'on_leave': {day.isoformat(): self.on_leave_by_day.get(day, 0) for day in upcoming},
+                'reschedules_total': self.reschedules_total,
+                'reschedules_today': self.reschedules_by_day.get(today, 0),
+            }
+
+dashboard_stats = DashboardStatsCache()
+
+UNKNOWN = object()
+
+def _previous_value(obj, attr):
+    """Committed value of an attribute before this flush, or UNKNOWN"""
+    history = sa_inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return UNKNOWN if history.added else getattr(obj, attr)
+
+def _stats_state(obj, previous=False):
+    value = (lambda attr: _previous_value(obj, attr)) if previous else (lambda attr: getattr(obj, attr))
+    if isinstance(obj, Staff):
+        state = (value('is_active'), value('department'))
+        if state[0] is None and not previous:
+            state = (True, state[1])  # column default
+        return 'staff', state
+    if isinstance(obj, Leave):
+        status = value('status') or ('pending' if not previous else None)
+        return 'leave', (status, value('leave_date'), value('end_date'))
+    if isinstance(obj, ClassRescheduling):
+        created_at = value('created_at')
+        return 'reschedule', (created_at.date() if isinstance(created_at, datetime) else date.today())
+    return None, None
+
+def collect_stats_changes(session, changes):
+    for obj in session.new:
+        kind, state = _stats_state(obj)
+        if kind:
+            changes.items.append((kind, state, 1))
+    for obj in session.deleted:
+        kind, state = _stats_state(obj, previous=True)
+        if kind:
+            changes.items.append((kind, state, -1))
+    for obj in session.dirty:
+        if not isinstance(obj, (Staff, Leave)) or not session.is_modified(obj):
+            continue
+        kind, old = _stats_state(obj, previous=True)
+        _, new = _stats_state(obj)
+        if UNKNOWN in old:
+            changes.stale = True
+        elif old != new:
+            changes.items.extend([(kind, old, -1), (kind, new, 1)])
+
+def collect_bulk_stats_changes(orm_execute_state, changes):
+    params = orm_execute_state.parameters
+    if orm_execute_state.is_insert and orm_execute_state.bind_mapper.class_ is ClassRescheduling and isinstance(params, list):
+        # The bulk insert of substitutions made by the rescheduler
+        changes.items.extend(
+            ('reschedule', (row.get('created_at') or datetime.utcnow()).date(), 1) for row in params
+        )
+    else:
+        changes.stale = True
+
+def apply_stats_changes(session, changes):
+    if changes.stale:
+        dashboard_stats.invalidate()
+    else:
+        dashboard_stats.apply(changes.items)
+    if changes.stale or any(kind != 'staff' for kind, _, _ in changes.items):
+        analytics_cache.clear()
+
+track_changes(db.session, 'stats_changes', (Staff, Leave, ClassRescheduling),
+              collect_stats_changes, apply_stats_changes, collect_bulk_stats_changes)
+
+# Room Availability
+room_availability = RoomAvailabilityIndex()
+
+ROOM_DATA = ('timetable', 'classroom')
+
+def load_room_availability():
+    """(Re)build the free-room index from the active classrooms and the timetable"""
+    version = data_versions(*ROOM_DATA)  # read first: the rows are at least this recent
+    tags = {}
+    for classroom_id, tag in db.session.query(ClassroomFacility.classroom_id, ClassroomFacility.tag):
+        tags.setdefault(classroom_id, set()).add(tag)
+    rooms = [
+        (room_id, number, name, capacity, building, floor, tags.get(room_id, ()))
+        for room_id, number, name, capacity, building, floor in db.session.query(
+            Classroom.id, Classroom.room_number, Classroom.room_name, Classroom.capacity,
+            Classroom.building, Classroom.floor
+        ).filter(Classroom.is_active == True)
+    ]
+    entries = db.session.query(
+        Timetable.id, Timetable.classroom_id, Timetable.room, Timetable.day, Timetable.start_minute, Timetable.end_minute
+    )
+    room_availability.load(rooms, entries, version)
+
+def sync_room_availability():
+    """Rebuild the free-room index if any process has changed rooms or the timetable since"""
+    if not (room_availability.loaded and room_availability.version == data_versions(*ROOM_DATA)):
+        load_room_availability()
+
+def collect_room_changes(session, changes):
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Timetable):
+            changes.items.append((obj.id, obj.classroom_id, obj.room, obj.day, obj.start_minute, obj.end_minute))
+        elif isinstance(obj, (Classroom, ClassroomFacility)):
+            changes.stale = True
+    for obj in session.deleted:
+        if isinstance(obj, Timetable):
+            changes.items.append((obj.id,))
+        elif isinstance(obj, (Classroom, ClassroomFacility)):
+            changes.stale = True
+
+def apply_room_changes(session, changes):
+    if changes.stale:
+        room_availability.invalidate()
+        return
+    # Apply this commit's entries only on top of the version just before it
+    committed = committed_versions(session).get('timetable')
+    loaded_version = room_availability.version
+    if committed is None or loaded_version is None or loaded_version[0] != committed - 1:
+        room_availability.invalidate()
+        return
+    for change in changes.items:
+        if len(change) == 1:
+            room_availability.remove_entry(change[0])
+        else:
+            room_availability.set_entry(*change)
+    room_availability.version = (committed,) + loaded_version[1:]
+
+# Bulk statements can't be followed entry by entry, so they rebuild the index
+track_changes(db.session, 'room_changes', (Timetable, Classroom, ClassroomFacility),
+              collect_room_changes, apply_room_changes)
+
+# Live Occupancy
+class LiveOccupancySnapshot:
+    """Today's classes with substitutions applied, indexed by minute of day.
+
+    Holds the timetable entries for today's weekday with the teacher who
+    actually takes each class: the substitute when an approved leave
+    covering today has one, otherwise the timetabled teacher (flagged
+    uncovered if they are on leave). Commits mark the entries or staff
+    they touch and the next read reloads only those. The whole snapshot is
+    rebuilt when the date changes, after bulk writes, and at least every
+    `ttl` seconds so changes made by other worker processes show up.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.day = None
+        self.version = 0
+        self._built_at = 0.0
+        self._stale = True
+        self._dirty_entries = set()
+        self._dirty_staff = set()
+        self.classes = {}  # timetable_id -> class
+        self.by_staff = {}  # timetabled staff_id -> {timetable_id}
+        self.by_minute = [set() for _ in range(MINUTES_PER_DAY)]
+        self._rendered = {}  # minute -> (payload, JSON body) for this version
+
+    def invalidate(self):
+        with self._lock:
+            self._stale = True
+
+    def mark(self, entry_ids=(), staff_ids=()):
+        with self._lock:
+            self._dirty_entries.update(i for i in entry_ids if i is not None)
+            self._dirty_staff.update(i for i in staff_ids if i is not None)
+
+    def _load(self, today, entry_ids=None):
+        """Classes for today, all of them or only the given entries"""
+        weekday = today.strftime('%A')
+        # Days are stored capitalised; entries typed in by hand may be lowercase
+        query = db.session.query(
+            Timetable.id, Timetable.staff_id, Timetable.course_code, Timetable.course_name, Timetable.room,
+            Timetable.batch, Timetable.time_slot, Timetable.start_minute, Timetable.end_minute
+        ).filter(Timetable.day.in_((weekday, weekday.lower())), Timetable.start_minute.isnot(None))
+        todays_leaves = db.and_(Leave.status == 'approved', Leave.leave_date <= today, Leave.last_date >= today)
+        substitutes = db.session.query(
+            ClassRescheduling.original_timetable_id, ClassRescheduling.assigned_staff_id
+        ).join(Leave, ClassRescheduling.leave_id == Leave.id).filter(todays_leaves).order_by(ClassRescheduling.id)
+        on_leave = db.session.query(Leave.staff_id).filter(todays_leaves)
+        if entry_ids is not None:
+            query = query.filter(Timetable.id.in_(entry_ids))
+            substitutes = substitutes.filter(ClassRescheduling.original_timetable_id.in_(entry_ids))
+        
+        rows = query.all()
+        substitute_for = dict(substitutes)
+        absent = {staff_id for staff_id, in on_leave.filter(Leave.staff_id.in_({row[1] for row in rows}))} if rows else set()
+        staff_ids = {row[1] for row in rows} | set(substitute_for.values())
+        names = dict(db.session.query(Staff.id, Staff.name).filter(Staff.id.in_(staff_ids))) if staff_ids else {}
+        
+        classes = []
+        for entry_id, staff_id, course_code, course_name, room, batch, time_slot, start, end in rows:
+            teacher = substitute_for.get(entry_id)
+            status = 'substituted' if teacher else 'uncovered' if staff_id in absent else 'scheduled'
+            teacher = teacher or (None if status == 'uncovered' else staff_id)
+            classes.append({
+                'timetable_id': entry_id,
+                'course_code': course_code,
+                'course_name': course_name,
+                'room': room,
+                'batch': batch,
+                'time_slot': time_slot,
+                'start_minute': start,
+                'end_minute': end,
+                'status': status,
+                'staff_id': teacher,
+                'staff_name': names.get(teacher),
+                'timetabled_staff_id': staff_id,
+                'timetabled_staff_name': names.get(staff_id, 'Unknown'),
+            })
+        return classes
+
+    def _remove(self, entry_id):
+        previous = self.classes.pop(entry_id, None)
+        if previous is None:
+            return
+        self.by_staff.get(previous['timetabled_staff_id'], set()).discard(entry_id)
+        for minute in range(previous['start_minute'], min(previous['end_minute'], MINUTES_PER_DAY)):
+            self.by_minute[minute].discard(entry_id)
+
+    def _add(self, cls):
+        entry_id = cls['timetable_id']
+        self.classes[entry_id] = cls
+        self.by_staff.setdefault(cls['timetabled_staff_id'], set()).add(entry_id)
+        for minute in range(max(cls['start_minute'], 0), min(cls['end_minute'], MINUTES_PER_DAY)):
+            self.by_minute[minute].add(entry_id)
+
+    def ensure_current(self):
+        today = date.today()
+        with self._lock:
+            rebuild = self._stale or self.day != today or time.monotonic() - self._built_at > self.ttl
+            entry_ids, staff_ids = self._dirty_entries, self._dirty_staff
+            self._dirty_entries, self._dirty_staff = set(), set()
+            self._stale = False
+            if not rebuild:
+                for staff_id in staff_ids:
+                    entry_ids |= self.by_staff.get(staff_id, set())
+                if not entry_ids:
+                    return
+        
+        if rebuild:
+            classes = self._load(today)
+            with self._lock:
+                # Keep what was committed or invalidated while loading
+                pending = (self.version, self._stale, self._dirty_entries, self._dirty_staff)
+                self._reset()
+                self.version, self._stale, self._dirty_entries, self._dirty_staff = pending
+                self.version += 1
+                self.day, self._built_at = today, time.monotonic()
+                for cls in classes:
+                    self._add(cls)
+            return
+        
+        entry_ids = list(entry_ids)
+        classes = []
+        for i in range(0, len(entry_ids), 500):
+            classes.extend(self._load(today, entry_ids[i:i + 500]))
+        with self._lock:
+            for entry_id in entry_ids:
+                self._remove(entry_id)
+            for cls in classes:
+                self._add(cls)
+            self.version += 1
+            self._rendered = {}
+
+    def at(self, minute):
+        """(payload, JSON body) of the classes running at a minute of today"""
+        self.ensure_current()
+        with self._lock:
+            rendered = self._rendered.get(minute)
+            if rendered:
+                return rendered
+            classes = sorted((self.classes[i] for i in self.by_minute[minute]), key=lambda c: ((c['room'] or '').lower(), c['timetable_id']))
+            day = self.day
+        payload = {
+            'date': day.isoformat(),
+            'day': day.strftime('%A'),
+            'time': format_minutes(minute),
+            'classes': [dict(cls, ends_at=format_minutes(cls['end_minute'])) for cls in classes],
+            'teaching': len({cls['staff_id'] for cls in classes if cls['staff_id']}),
+            'uncovered': sum(1 for cls in classes if cls['status'] == 'uncovered'),
+        }
+        rendered = (payload, json.dumps(payload))
+        with self._lock:
+            self._rendered[minute] = rendered
+        return rendered
+
+live_occupancy = LiveOccupancySnapshot()
+
+# Changes are ('entry', timetable_id) and ('staff', staff_id) of a teacher whose leave changed
+def collect_live_changes(session, changes):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Timetable):
+            changes.items.append(('entry', obj.id))
+        elif isinstance(obj, ClassRescheduling):
+            changes.items.append(('entry', obj.original_timetable_id))
+            previous = _previous_value(obj, 'original_timetable_id')
+            if previous is not UNKNOWN:
+                changes.items.append(('entry', previous))
+        elif isinstance(obj, Leave):
+            changes.items.append(('staff', obj.staff_id))
+        elif isinstance(obj, Staff):
+            changes.stale = True
+
+def collect_bulk_live_changes(orm_execute_state, changes):
+    params = orm_execute_state.parameters
+    if orm_execute_state.is_insert and orm_execute_state.bind_mapper.class_ is ClassRescheduling and isinstance(params, list):
+        changes.items.extend(('entry', row.get('original_timetable_id')) for row in params)
+    else:
+        changes.stale = True
+
+def apply_live_changes(session, changes):
+    if changes.stale:
+        live_occupancy.invalidate()
+    else:
+        live_occupancy.mark(
+            {key for kind, key in changes.items if kind == 'entry'},
+            {key for kind, key in changes.items if kind == 'staff'}
+        )
+
+track_changes(db.session, 'live_changes', (Timetable, ClassRescheduling, Leave, Staff),
+              collect_live_changes, apply_live_changes, collect_bulk_live_changes)
+
+# Login Event Log
+def insert_login_rows():
+    """INSERT into login_log that skips rows whose session_key is already stored"""
+    table = LoginLog.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing(index_elements=['session_key'])
+    if dialect == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing(index_elements=['session_key'])
+    if dialect in ('mysql', 'mariadb'):
+        return table.insert().prefix_with('IGNORE')
+    return table.insert()
+
+def write_login_events(events):
+    """Store buffered login/logout events with bulk INSERTs and one UPDATE.
+
+    A logout whose login is in the same batch is folded into the inserted
+    row. Other logouts close their row by session_key, a unique index hit.
+    The login may not be stored yet (it is still buffered in this or
+    another worker process), so a logout also carries the whole row and
+    inserts it as logged out; the login, written later, then finds its
+    session_key taken and is skipped.
+    """
+    table = LoginLog.__table__
+    logins = {}
+    closes = {}
+    for event in events:
+        if event['type'] == 'login':
+            logins[event['row']['session_key']] = event['row']
+        elif event['session_key'] in logins:
+            logins[event['session_key']].update(logout_time=event['time'], status='logged_out')
+        else:
+            closes[event['session_key']] = event
+    try:
+        if logins:
+            db.session.execute(insert_login_rows(), list(logins.values()))
+        if closes:
+            db.session.execute(
+                table.update()
+                .where(table.c.session_key == db.bindparam('key'), table.c.status == 'logged_in')
+                .values(logout_time=db.bindparam('time'), status='logged_out'),
+                [{'key': key, 'time': event['time']} for key, event in closes.items()]
+            )
+            stored = {key for (key,) in db.session.execute(
+                db.select(table.c.session_key).where(table.c.session_key.in_(list(closes)))
+            )}
+            missing = [event['row'] for key, event in closes.items() if key not in stored and event.get('row')]
+            if missing:
+                db.session.execute(insert_login_rows(), missing)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+login_events = WriteBehindBuffer(write_login_events)
+
+def login_row(key, user_type, user_id, ip_address, login_time):
+    return {
+        'session_key': key,
+        'admin_id': user_id if user_type == 'admin' else None,
+        'staff_id': user_id if user_type == 'staff' else None,
+        'user_type': user_type,
+        'ip_address': ip_address,
+        'login_time': login_time,
+        'logout_time': None,
+        'status': 'logged_in'
+    }
+
+def record_login(user_type, user_id):
+    """Queue the login row and remember it in the session for the matching logout"""
+    key = uuid.uuid4().hex
+    login_time = datetime.utcnow()
+    session['login_key'] = key
+    session['login_time'] = login_time.isoformat()
+    session['login_ip'] = request.remote_addr
+    login_events.add({'type': 'login', 'row': login_row(key, user_type, user_id, request.remote_addr, login_time)})
+
+def record_logout():
+    if session.get('login_key'):
+        now = datetime.utcnow()
+        row = None
+        if session.get('login_time'):
+            # Stands in for the login row if that has not been written yet
+            row = login_row(
+                session['login_key'], session['user_type'], session['user_id'], session.get('login_ip'),
+                datetime.fromisoformat(session['login_time'])
+            )
+            row.update(logout_time=now, status='logged_out')
+        login_events.add({'type': 'logout', 'session_key': session['login_key'], 'time': now, 'row': row})
+        return
+    # Sessions started before login keys existed: close the latest open row
+    column = LoginLog.admin_id if session.get('user_type') == 'admin' else LoginLog.staff_id
+    log = LoginLog.query.filter(column == session['user_id'], LoginLog.status == 'logged_in').order_by(LoginLog.login_time.desc()).first()
+    if log:
+        log.logout_time = datetime.utcnow()
+        log.status = 'logged_out'
+        db.session.commit()
+
 # Authentication Decorators
 def login_required(f):
     @wraps(f)
@@ -161,7 +1119,7 @@ def staff_required(f):
     return decorated_function
 
 # Admin Routes
-@app.route('/api/admin/register', methods=['POST'])
+@api.route('/api/admin/register', methods=['POST'])
 def admin_register():
     data = request.json
     if Admin.query.filter_by(email=data.get('email')).first():
@@ -176,7 +1134,7 @@ def admin_register():
     db.session.commit()
     return jsonify({'message': 'Admin registered successfully'}), 201
 
-@app.route('/api/admin/login', methods=['POST'])
+@api.route('/api/admin/login', methods=['POST'])
 def admin_login():
     data = request.json
     admin = Admin.query.filter_by(email=data.get('email')).first()
@@ -190,30 +1148,20 @@ def admin_login():
     session['name'] = admin.name
     
     # Log the login
-    log = LoginLog(
-        admin_id=admin.id,
-        user_type='admin',
-        ip_address=request.remote_addr,
-        status='logged_in'
-    )
-    db.session.add(log)
-    db.session.commit()
+    record_login('admin', admin.id)
     
     return jsonify({'message': 'Login successful', 'user': {'id': admin.id, 'name': admin.name}}), 200
 
-@app.route('/api/admin/logout', methods=['POST'])
+@api.route('/api/admin/logout', methods=['POST'])
 @login_required
 def admin_logout():
     if session.get('user_type') == 'admin':
-        log = LoginLog.query.filter_by(admin_id=session['user_id'], status='logged_in').order_by(LoginLog.login_time.desc()).first()
-        if log:
-            log.logout_time = datetime.utcnow()
-            log.status = 'logged_out'
+        record_logout()
     session.clear()
     return jsonify({'message': 'Logged out successfully'}), 200
 
 # Staff Routes
-@app.route('/api/staff/login', methods=['POST'])
+@api.route('/api/staff/login', methods=['POST'])
 def staff_login():
     data = request.json
     staff = Staff.query.filter_by(email=data.get('email')).first()
@@ -230,36 +1178,26 @@ def staff_login():
     session['name'] = staff.name
     
     # Log the login
-    log = LoginLog(
-        staff_id=staff.id,
-        user_type='staff',
-        ip_address=request.remote_addr,
-        status='logged_in'
-    )
-    db.session.add(log)
-    db.session.commit()
+    record_login('staff', staff.id)
     
     return jsonify({'message': 'Login successful', 'user': {'id': staff.id, 'name': staff.name}}), 200
 
-@app.route('/api/staff/logout', methods=['POST'])
+@api.route('/api/staff/logout', methods=['POST'])
 @login_required
 def staff_logout():
     if session.get('user_type') == 'staff':
-        log = LoginLog.query.filter_by(staff_id=session['user_id'], status='logged_in').order_by(LoginLog.login_time.desc()).first()
-        if log:
-            log.logout_time = datetime.utcnow()
-            log.status = 'logged_out'
+        record_logout()
     session.clear()
     return jsonify({'message': 'Logged out successfully'}), 200
 
-@app.route('/api/session', methods=['GET'])
+@api.route('/api/session', methods=['GET'])
 def get_session():
     if 'user_id' in session:
         return jsonify({'user': {'id': session.get('user_id'), 'name': session.get('name'), 'type': session.get('user_type')}}), 200
     return jsonify({'user': None}), 200
 
 # Admin Dashboard Routes
-@app.route('/api/admin/staff', methods=['GET'])
+@api.route('/api/admin/staff', methods=['GET'])
 @admin_required
 def get_all_staff():
     staff_list = Staff.query.filter_by(is_active=True).all()
@@ -267,7 +1205,7 @@ def get_all_staff():
         'staff': [{'id': s.id, 'employee_id': s.employee_id, 'name': s.name, 'email': s.email, 'department': s.department, 'position': s.position, 'is_active': s.is_active, 'phone': s.phone} for s in staff_list]
     }), 200
 
-@app.route('/api/admin/staff', methods=['POST'])
+@api.route('/api/admin/staff', methods=['POST'])
 @admin_required
 def add_staff():
     try:
@@ -315,7 +1253,7 @@ def add_staff():
         db.session.rollback()
         return jsonify({'error': f'Error adding staff: {str(e)}'}), 500
 
-@app.route('/api/admin/staff/<int:staff_id>', methods=['PUT'])
+@api.route('/api/admin/staff/<int:staff_id>', methods=['PUT'])
 @admin_required
 def update_staff(staff_id):
     data = request.json
@@ -334,7 +1272,7 @@ def update_staff(staff_id):
     db.session.commit()
     return jsonify({'message': 'Staff updated successfully'}), 200
 
-@app.route('/api/admin/staff/<int:staff_id>', methods=['DELETE'])
+@api.route('/api/admin/staff/<int:staff_id>', methods=['DELETE'])
 @admin_required
 def deactivate_staff(staff_id):
     try:
@@ -356,10 +1294,54 @@ def deactivate_staff(staff_id):
         return jsonify({'error': str(e)}), 500
 
 # Timetable Routes
-@app.route('/api/admin/timetable', methods=['GET'])
+TIMETABLE_PAGE_SIZE = 500
+TIMETABLE_MAX_PAGE_SIZE = 2000
+
+def filter_timetable(query, args):
+    """Apply the day, staff_id, department, batch, room and classroom_id filters.
+
+    The query must already be joined to Staff.
+    """
+    if args.get('day'):
+        query = query.filter(db.func.lower(Timetable.day) == args['day'].strip().lower())
+    if args.get('staff_id'):
+        query = query.filter(Timetable.staff_id == args.get('staff_id', type=int))
+    if args.get('department'):
+        query = query.filter(Staff.department == args['department'])
+    if args.get('batch'):
+        query = query.filter(Timetable.batch == args['batch'])
+    if args.get('room'):
+        query = query.filter(db.func.lower(Timetable.room) == args['room'].strip().lower())
+    if args.get('classroom_id'):
+        query = query.filter(Timetable.classroom_id == args.get('classroom_id', type=int))
+    return query
+
+@api.route('/api/admin/timetable', methods=['GET'])
 @admin_required
 def get_timetable():
-    timetable = Timetable.query.all()
+    """One page of timetable entries, ordered by id.
+
+    Pass the returned next_cursor as ?cursor= to get the following page.
+    Optional filters: day, staff_id, department, batch, room, classroom_id.
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', TIMETABLE_PAGE_SIZE)), 1), TIMETABLE_MAX_PAGE_SIZE)
+        cursor = int(request.args.get('cursor', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and cursor must be integers'}), 400
+    
+    # Staff and classroom come back in the same query as the entries
+    query = Timetable.query.join(Timetable.staff).options(
+        db.contains_eager(Timetable.staff),
+        db.joinedload(Timetable.classroom)
+    )
+    
+    query = filter_timetable(query, request.args)
+    
+    timetable = query.filter(Timetable.id > cursor).order_by(Timetable.id).limit(limit + 1).all()
+    has_more = len(timetable) > limit
+    timetable = timetable[:limit]
+    
     return jsonify({
         'timetable': [{
             'id': t.id,
@@ -372,174 +1354,1283 @@ def get_timetable():
             'room': t.room,
             'batch': t.batch,
             'classroom': t.classroom.to_dict() if t.classroom else None
-        } for t in timetable]
+        } for t in timetable],
+        'next_cursor': timetable[-1].id if has_more else None
+    }), 200
+
+def describe_timetable_entry(t):
+    return {
+        'id': t.id,
+        'staff_id': t.staff_id,
+        'course_code': t.course_code,
+        'day': t.day,
+        'time_slot': t.time_slot,
+        'room': t.room,
+        'batch': t.batch
+    }
+
+CONFLICT_MESSAGES = {
+    'staff': 'staff member already teaches',
+    'room': 'room is already booked for',
+    'batch': 'batch already attends'
+}
+
+def check_timetable_conflicts(entry):
+    """Return a 409 response describing clashes with other entries, or None"""
+    clashes = occupancy.conflicts_for(
+        entry.day, entry.start_minute, entry.end_minute,
+        staff_id=int(entry.staff_id) if entry.staff_id is not None else None,
+        room=entry.room,
+        batch=entry.batch,
+        exclude_id=entry.id
+    )
+    if not clashes:
+        return None
+    
+    others = {t.id: t for t in Timetable.query.filter(Timetable.id.in_({item for _, item in clashes}))}
+    conflicts = [dict(describe_timetable_entry(others[item]), dimension=dimension) for dimension, item in clashes]
+    first = conflicts[0]
+    message = (f"Timetable conflict: {CONFLICT_MESSAGES[first['dimension']]} {first['course_code']} "
+               f"on {first['day']} {first['time_slot']}")
+    return jsonify({'error': message, 'conflicts': conflicts}), 409
+
+@api.route('/api/admin/timetable/conflicts', methods=['GET'])
+@admin_required
+def get_timetable_conflicts():
+    """Scan the whole timetable for double-booked staff, rooms and batches"""
+    occupancy.sync(data_version('timetable'))
+    clashes = occupancy.all_conflicts()
+    involved = {item for _, group in clashes for item in group}
+    
+    entries = {}
+    involved = list(involved)
+    for i in range(0, len(involved), 500):
+        for t in Timetable.query.filter(Timetable.id.in_(involved[i:i + 500])):
+            entries[t.id] = t
+    
+    return jsonify({
+        'count': len(clashes),
+        'conflicts': [{
+            'dimension': dimension,
+            'entries': [describe_timetable_entry(entries[item]) for item in group]
+        } for dimension, group in clashes]
     }), 200
 
-@app.route('/api/admin/timetable', methods=['POST'])
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+def parse_day(value):
+    """Normalise a weekday name ('monday' -> 'Monday'), raising ValueError if invalid"""
+    day = str(value or '').strip().capitalize()
+    if day not in WEEKDAYS:
+        raise ValueError(f'Invalid day: {value}')
+    return day
+
+@api.route('/api/admin/timetable', methods=['POST'])
 @admin_required
 def add_timetable_entry():
     data = request.json
+    room = data.get('room')
+    if not room and data.get('classroom_id'):
+        classroom = Classroom.query.get(data['classroom_id'])
+        room = classroom.room_number if classroom else None
+    
     timetable_entry = Timetable(
         staff_id=data.get('staff_id'),
         course_code=data.get('course_code'),
         course_name=data.get('course_name'),
-        day=data.get('day'),
-        time_slot=data.get('time_slot'),
-        room=data.get('room'),
+        room=room,
         classroom_id=data.get('classroom_id', None),
         batch=data.get('batch', '')
     )
+    try:
+        timetable_entry.day = parse_day(data.get('day'))
+        timetable_entry.set_time_slot(data.get('time_slot'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Check and insert under the write lock, against an index current with the database
+    version = data_version('timetable', lock=True)
+    occupancy.sync(version)
+    conflict_response = check_timetable_conflicts(timetable_entry)
+    if conflict_response:
+        db.session.rollback()
+        return conflict_response
+    
     db.session.add(timetable_entry)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Timetable conflict: the staff member already has this slot'}), 409
+    occupancy.record(timetable_entry, version)
     return jsonify({'message': 'Timetable entry added successfully', 'id': timetable_entry.id}), 201
 
-@app.route('/api/admin/timetable/<int:timetable_id>', methods=['PUT'])
-@admin_required
-def update_timetable_entry(timetable_id):
-    data = request.json
-    timetable_entry = Timetable.query.get(timetable_id)
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 500
+
+def iter_import_rows(stream, fmt):
+    """Yield (line_number, row dict) from a CSV or NDJSON upload without reading it all"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
     
-    if not timetable_entry:
-        return jsonify({'error': 'Timetable entry not found'}), 404
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None
+            continue
+        yield line_number, row if isinstance(row, dict) else None
+
+def parse_import_row(row, staff_ids, classroom_ids):
+    """Turn an uploaded row into Timetable column values, raising ValueError if invalid"""
+    if row is None:
+        raise ValueError('Row is not a JSON object')
+    row = {key.strip().lower(): (str(value).strip() if value is not None else '') for key, value in row.items() if key}
     
-    timetable_entry.staff_id = data.get('staff_id', timetable_entry.staff_id)
-    timetable_entry.course_code = data.get('course_code', timetable_entry.course_code)
-    timetable_entry.course_name = data.get('course_name', timetable_entry.course_name)
-    timetable_entry.day = data.get('day', timetable_entry.day)
-    timetable_entry.time_slot = data.get('time_slot', timetable_entry.time_slot)
-    timetable_entry.room = data.get('room', timetable_entry.room)
-    timetable_entry.classroom_id = data.get('classroom_id', timetable_entry.classroom_id)
-    timetable_entry.batch = data.get('batch', timetable_entry.batch)
+    for field in ('employee_id', 'course_code', 'course_name', 'day', 'time_slot'):
+        if not row.get(field):
+            raise ValueError(f'Missing required field: {field}')
     
-    db.session.commit()
-    return jsonify({'message': 'Timetable entry updated successfully'}), 200
-
-@app.route('/api/admin/timetable/<int:timetable_id>', methods=['DELETE'])
-@admin_required
-def delete_timetable_entry(timetable_id):
-    timetable_entry = Timetable.query.get(timetable_id)
-    if not timetable_entry:
-        return jsonify({'error': 'Timetable entry not found'}), 404
+    staff_id = staff_ids.get(row['employee_id'])
+    if staff_id is None:
+        raise ValueError(f"Unknown employee_id: {row['employee_id']}")
     
-    db.session.delete(timetable_entry)
-    db.session.commit()
-    return jsonify({'message': 'Timetable entry deleted successfully'}), 200
+    day = parse_day(row['day'])
+    
+    room = row.get('room_number') or row.get('room')
+    if not room:
+        raise ValueError('Missing required field: room_number')
+    
+    start, end = parse_time_slot(row['time_slot'])
+    return {
+        'staff_id': staff_id,
+        'course_code': row['course_code'],
+        'course_name': row['course_name'],
+        'day': day,
+        'time_slot': format_time_slot(start, end),
+        'start_minute': start,
+        'end_minute': end,
+        'room': room,
+        'classroom_id': classroom_ids.get(room),
+        'batch': row.get('batch', '')
+    }
 
-# Staff Timetable Route
-@app.route('/api/staff/timetable', methods=['GET'])
-@staff_required
-def get_staff_timetable():
-    staff_id = session['user_id']
-    timetable = Timetable.query.filter_by(staff_id=staff_id).all()
-    return jsonify({
-        'timetable': [{
-            'id': t.id,
-            'course_code': t.course_code,
-            'course_name': t.course_name,
-            'day': t.day,
-            'time_slot': t.time_slot,
-            'room': t.room,
-            'batch': t.batch,
-            'classroom': t.classroom.to_dict() if t.classroom else None
-        } for t in timetable]
-    }), 200
+@api.route('/api/admin/timetable/import', methods=['POST'])
+@admin_required
+def import_timetable():
+    """Bulk-load timetable entries from a streamed CSV or NDJSON upload.
 
-# Leave Management Routes
-@app.route('/api/staff/leave/apply', methods=['POST'])
-@staff_required
-def apply_leave():
-    data = request.json
-    staff_id = session['user_id']
+    Query parameters: format=csv|ndjson (guessed from the upload otherwise),
+    dry_run=1 to only validate, atomic=1 to import nothing if any row fails.
+    """
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    filename = upload.filename if upload else ''
+    content_type = (upload.content_type if upload else request.content_type) or ''
     
-    leave = Leave(
-        staff_id=staff_id,
-        leave_date=parse_date(data.get('leave_date')).date(),
-        leave_type=data.get('leave_type'),
-        reason=data.get('reason', '')
-    )
-    db.session.add(leave)
-    db.session.commit()
+    fmt = request.args.get('format')
+    if not fmt:
+        fmt = 'ndjson' if 'json' in content_type or filename.endswith(('.ndjson', '.jsonl')) else 'csv'
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Unsupported format, expected csv or ndjson'}), 400
     
-    # Auto-reschedule classes
-    reschedule_classes_for_leave(leave.id)
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    atomic = request.args.get('atomic', '').lower() in ('1', 'true', 'yes')
     
-    return jsonify({'message': 'Leave applied successfully', 'leave_id': leave.id}), 201
-
-def reschedule_classes_for_leave(leave_id, auto_mode=False):
-    leave = Leave.query.get(leave_id)
-    if not leave:
-        return False
+    # Lookup maps so rows resolve without a query each
+    staff_ids = dict(db.session.query(Staff.employee_id, Staff.id).filter(Staff.is_active == True))
+    classroom_ids = dict(db.session.query(Classroom.room_number, Classroom.id).filter(Classroom.is_active == True))
     
-    # Find all classes of the staff on the leave date
-    leave_day = leave.leave_date.strftime('%A')
-    staff_classes = Timetable.query.filter_by(staff_id=leave.staff_id).all()
+    # Rows accepted in this upload, checked together with the existing timetable.
+    # Writes hold the database write lock from the checks until their commit.
+    staged = TimetableOccupancyIndex(loaded=True)
+    version = data_version('timetable', lock=not dry_run)
+    occupancy.sync(version)
     
-    rescheduled_count = 0
-    for timetable_entry in staff_classes:
-        if timetable_entry.day.lower() == leave_day.lower():
-            # Check if already rescheduled
-            existing = ClassRescheduling.query.filter_by(
-                original_timetable_id=timetable_entry.id,
-                leave_id=leave_id
-            ).first()
-            
-            if existing:
+    processed = valid = written = 0
+    error_count = 0
+    errors = []
+    chunk = []
+    
+    def flush():
+        nonlocal chunk, written, version
+        if chunk and not dry_run and not (atomic and error_count):
+            db.session.execute(db.insert(Timetable), chunk)
+            if not atomic:
+                db.session.commit()
+                # The next rows are checked under the lock again; the index plus
+                # `staged` still covers the timetable unless another process wrote
+                latest = data_version('timetable', lock=True)
+                if latest != version + 1:
+                    occupancy.sync(latest)
+                version = latest
+            written += len(chunk)
+        chunk = []
+    
+    try:
+        for line_number, row in iter_import_rows(stream, fmt):
+            processed += 1
+            try:
+                values = parse_import_row(row, staff_ids, classroom_ids)
+                slot = (values['day'], values['start_minute'], values['end_minute'])
+                dimensions = {'staff_id': values['staff_id'], 'room': values['room'], 'batch': values['batch']}
+                clashes = occupancy.conflicts_for(*slot, **dimensions) + staged.conflicts_for(*slot, **dimensions)
+                if clashes:
+                    dimension, other = clashes[0]
+                    where = f'line {-other}' if other < 0 else f'timetable entry {other}'
+                    raise ValueError(f'{dimension} clash with {where}')
+            except ValueError as e:
+                error_count += 1
+                if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+                    errors.append({'line': line_number, 'error': str(e)})
+                if atomic and error_count == 1 and not dry_run:
+                    # Nothing will be written; keep validating to report every bad row
+                    db.session.rollback()
+                    written = 0
                 continue
             
-            # Find available staff
-            available_staff = find_available_staff(timetable_entry)
-            
-            if available_staff:
-                rescheduling = ClassRescheduling(
-                    original_timetable_id=timetable_entry.id,
-                    original_staff_id=leave.staff_id,
-                    assigned_staff_id=available_staff.id,
-                    leave_id=leave_id,
-                    reason='Auto-assigned due to leave' if auto_mode else 'Manual assignment'
-                )
-                db.session.add(rescheduling)
-                rescheduled_count += 1
+            staged.add(-line_number, values['staff_id'], *slot, room=values['room'], batch=values['batch'])
+            chunk.append(dict(values, created_at=datetime.utcnow()))
+            valid += 1
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                flush()
+        
+        if atomic and error_count:
+            db.session.rollback()
+            written = 0
+        else:
+            flush()
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Import failed: {str(e)}', 'imported': 0 if atomic else written}), 500
+    finally:
+        if written:
+            occupancy.invalidate()
     
-    db.session.commit()
-    return rescheduled_count > 0
+    status = 422 if atomic and error_count else 200
+    return jsonify({
+        'dry_run': dry_run,
+        'atomic': atomic,
+        'processed': processed,
+        'valid': valid,
+        'imported': written,
+        'failed': error_count,
+        'errors': errors
+    }), status
 
-def find_available_staff(timetable_entry):
-    """Find an available staff member without conflicts for the given time slot"""
-    all_staff = Staff.query.filter_by(is_active=True).all()
+# Timetable Generation
+def parse_requirement(row, staff_by_employee, staff_by_id, max_hours):
+    """Validate a course requirement, raising ValueError if invalid"""
+    if not isinstance(row, dict):
+        raise ValueError('Requirement is not a JSON object')
+    for field in ('course_code', 'course_name'):
+        if not str(row.get(field) or '').strip():
+            raise ValueError(f'Missing required field: {field}')
     
-    for staff in all_staff:
-        if staff.id == timetable_entry.staff_id:
-            continue
-        
-        # Check if staff has any class at the same time
-        conflict = Timetable.query.filter(
-            Timetable.staff_id == staff.id,
-            Timetable.day == timetable_entry.day,
-            Timetable.time_slot == timetable_entry.time_slot
-        ).first()
-        
-        if not conflict:
-            return staff
+    if row.get('employee_id'):
+        staff = staff_by_employee.get(str(row['employee_id']).strip())
+    elif row.get('staff_id'):
+        staff = staff_by_id.get(int(row['staff_id']))
+    else:
+        raise ValueError('Missing required field: employee_id or staff_id')
+    if staff is None:
+        raise ValueError(f"Unknown staff: {row.get('employee_id') or row.get('staff_id')}")
     
-    return None
+    try:
+        hours = int(row.get('hours_per_week') or 0)
+        min_capacity = int(row.get('min_capacity') or 0)
+    except (TypeError, ValueError):
+        raise ValueError('hours_per_week and min_capacity must be numbers')
+    if hours < 1:
+        raise ValueError('hours_per_week must be at least 1')
+    if hours > max_hours:
+        raise ValueError(f'hours_per_week must be at most {max_hours}, the number of periods in the week')
+    
+    return {
+        'staff_id': staff[0],
+        'department': staff[1],
+        'course_code': str(row['course_code']).strip(),
+        'course_name': str(row['course_name']).strip(),
+        'batch': str(row.get('batch') or '').strip(),
+        'hours': hours,
+        'min_capacity': min_capacity,
+        'facilities': parse_facilities(row.get('facilities')),
+    }
+
+def generation_groups(requirements, sessions):
+    """Session indexes per department, departments sharing a batch merged"""
+    parent = {}
+    
+    def find(department):
+        parent.setdefault(department, department)
+        while parent[department] != department:
+            parent[department] = parent[parent[department]]
+            department = parent[department]
+        return department
+    
+    batch_department = {}
+    for requirement in requirements:
+        department = find(requirement['department'] or '')
+        batch = requirement['batch'].lower()
+        if batch:
+            other = batch_department.setdefault(batch, department)
+            parent[find(other)] = department
+    
+    groups = {}
+    for s, session in enumerate(sessions):
+        groups.setdefault(find(requirements[session[0]]['department'] or ''), []).append(s)
+    return list(groups.values())
+
+def build_generation_problem(requirements, days, periods):
+    """Solver input from the requirements, active classrooms and the current timetable"""
+    slots = [(day, start, end) for day in days for start, end in periods]
+    slots_by_day = {}
+    for p, (day, start, end) in enumerate(slots):
+        slots_by_day.setdefault(day.lower(), []).append((p, start, end))
+    
+    classrooms = db.session.query(
+        Classroom.id, Classroom.room_number, Classroom.capacity, Classroom.facilities
+    ).filter(Classroom.is_active == True).order_by(Classroom.id).all()
+    rooms = [
+        (TimetableOccupancyIndex.text_key(number), capacity or 0, parse_facilities(facilities))
+        for _, number, capacity, facilities in classrooms
+    ]
+    
+    # Existing entries stay put; the periods they overlap are taken
+    busy = set()
+    existing = db.session.query(
+        Timetable.staff_id, Timetable.day, Timetable.start_minute, Timetable.end_minute, Timetable.room, Timetable.batch
+    ).filter(Timetable.start_minute.isnot(None))
+    for staff_id, day, start, end, room, batch in existing:
+        for p, slot_start, slot_end in slots_by_day.get(TimetableOccupancyIndex.day_key(day), ()):
+            if overlaps(start, end, slot_start, slot_end):
+                busy.add(('staff', staff_id, p))
+                busy.add(('room', TimetableOccupancyIndex.text_key(room), p))
+                if batch:
+                    busy.add(('batch', TimetableOccupancyIndex.text_key(batch), p))
+    
+    sessions = [
+        (index, requirement['staff_id'], requirement['batch'].lower() or None,
+         requirement['min_capacity'], requirement['facilities'])
+        for index, requirement in enumerate(requirements)
+        for _ in range(requirement['hours'])
+    ]
+    problem = {'periods': slots, 'rooms': rooms, 'sessions': sessions, 'busy': busy}
+    return problem, classrooms
+
+def prepare_generation(data):
+    """Check a generation request; returns (settings, errors) or raises ValueError.
+
+    `errors` lists the requirements that are invalid. Run when the request
+    is queued and again in the job, as staff may have changed in between.
+    """
+    config = current_app.config
+    try:
+        days = [str(day).strip().capitalize() for day in data.get('days') or config['TIMETABLE_DAYS']]
+        invalid_days = [day for day in days if day not in WEEKDAYS]
+        if invalid_days:
+            raise ValueError(f'Invalid day: {invalid_days[0]}')
+        periods = sorted(set(parse_time_slot(period) for period in data.get('periods') or config['TIMETABLE_PERIODS']))
+        time_limit = min(float(data.get('time_limit') or config['TIMETABLE_SOLVER_TIME_LIMIT']),
+                         config['TIMETABLE_SOLVER_MAX_TIME_LIMIT'])
+        if not time_limit > 0:
+            raise ValueError('time_limit must be a positive number of seconds')
+        seed = int(data.get('seed') or 0)
+    except TypeError as e:
+        raise ValueError(str(e))
+    
+    rows = data.get('requirements')
+    if not isinstance(rows, list) or not rows:
+        raise ValueError('Missing required field: requirements')
+    
+    staff_rows = db.session.query(Staff.id, Staff.employee_id, Staff.department).filter(Staff.is_active == True).all()
+    staff_by_employee = {employee_id: (staff_id, department) for staff_id, employee_id, department in staff_rows}
+    staff_by_id = {staff_id: (staff_id, department) for staff_id, _, department in staff_rows}
+    
+    requirements = []
+    errors = []
+    for index, row in enumerate(rows):
+        try:
+            requirements.append(parse_requirement(row, staff_by_employee, staff_by_id, len(days) * len(periods)))
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+    if errors:
+        return None, errors[:IMPORT_MAX_REPORTED_ERRORS]
+    total_hours = sum(requirement['hours'] for requirement in requirements)
+    if total_hours > config['TIMETABLE_MAX_SESSIONS']:
+        raise ValueError(
+            f"Requirements add up to {total_hours} class hours, more than the limit of {config['TIMETABLE_MAX_SESSIONS']}"
+        )
+    return {
+        'days': days, 'periods': periods, 'time_limit': time_limit, 'seed': seed, 'requirements': requirements,
+        'dry_run': bool(data.get('dry_run')), 'allow_partial': bool(data.get('allow_partial')),
+    }, []
+
+@api.route('/api/admin/timetable/generate', methods=['POST'])
+@admin_required
+def generate_timetable():
+    """Queue the placement of course requirements into a clash-free weekly timetable.
+
+    Each requirement has course_code, course_name, employee_id (or
+    staff_id), batch, hours_per_week, min_capacity and facilities. Existing
+    entries are kept and worked around. Optional: days, periods,
+    time_limit (seconds), seed, dry_run=true to only return the proposal,
+    allow_partial=true to save even if some hours could not be placed.
+    The solver runs as a background job; follow it at
+    /api/admin/timetable/generate/jobs/<job_id>.
+    """
+    data = request.json or {}
+    try:
+        _, errors = prepare_generation(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if errors:
+        return jsonify({'error': 'Invalid requirements', 'errors': errors}), 400
+    
+    job = TimetableJob(params=data, max_attempts=current_app.config['TIMETABLE_GENERATION_MAX_ATTEMPTS'])
+    db.session.add(job)
+    db.session.commit()
+    if generation_workers.running:
+        generation_workers.notify()
+    else:
+        generation_workers.run_pending()
+        job = db.session.get(TimetableJob, job.id)
+    return jsonify({'message': 'Timetable generation queued', 'job_id': job.id, 'status': job.status}), 202
+
+def run_generation_job(job):
+    """Solve and save a queued generation request; the report becomes the job result.
+
+    Requests that cannot be met finish with an `error` in the report and
+    nothing saved. A timetable changed while the solver ran raises, so the
+    job is retried against the new timetable.
+    """
+    try:
+        settings, errors = prepare_generation(job.params or {})
+    except ValueError as e:
+        return {'error': str(e)}
+    if errors:
+        return {'error': 'Invalid requirements', 'errors': errors}
+    requirements = settings['requirements']
+    
+    problem, classrooms = build_generation_problem(requirements, settings['days'], settings['periods'])
+    if not classrooms:
+        return {'error': 'No active classrooms to schedule into'}
+    groups = generation_groups(requirements, problem['sessions'])
+    processes = current_app.config['TIMETABLE_SOLVER_PROCESSES'] or os.cpu_count() or 1
+    # Nothing is written while the solver runs; don't hold a connection meanwhile
+    db.session.rollback()
+    try:
+        result = solver.solve_groups(problem, groups, settings['time_limit'], processes=processes, seed=settings['seed'])
+    except solver.TimeLimitExceeded as e:
+        return {'error': f"{e}; raise time_limit or split the requirements", 'sessions': len(problem['sessions'])}
+    
+    entries = []
+    for s, (p, r) in sorted(result['placed'].items()):
+        requirement = requirements[problem['sessions'][s][0]]
+        day, start, end = problem['periods'][p]
+        classroom_id, room_number = classrooms[r][:2]
+        entries.append({
+            'staff_id': requirement['staff_id'],
+            'course_code': requirement['course_code'],
+            'course_name': requirement['course_name'],
+            'day': day,
+            'time_slot': format_time_slot(start, end),
+            'start_minute': start,
+            'end_minute': end,
+            'room': room_number,
+            'classroom_id': classroom_id,
+            'batch': requirement['batch'],
+        })
+    
+    unplaced = {}
+    for s in result['unplaced']:
+        index = problem['sessions'][s][0]
+        unplaced[index] = unplaced.get(index, 0) + 1
+    report = {
+        'dry_run': settings['dry_run'],
+        'sessions': len(problem['sessions']),
+        'placed': len(entries),
+        'unplaced': [
+            {'index': index, 'course_code': requirements[index]['course_code'],
+             'batch': requirements[index]['batch'], 'hours': hours}
+            for index, hours in sorted(unplaced.items())
+        ],
+        'groups': len(groups),
+        'seconds': result['seconds'],
+        'created': 0,
+    }
+    
+    if report['dry_run']:
+        report['entries'] = entries
+        return report
+    if unplaced and not settings['allow_partial']:
+        return dict(report, error='Some hours could not be placed; nothing was saved')
+    
+    # Entries added while the solver ran would not have been worked around
+    occupancy.sync(data_version('timetable', lock=True))
+    for entry in entries:
+        if occupancy.conflicts_for(entry['day'], entry['start_minute'], entry['end_minute'],
+                                   staff_id=entry['staff_id'], room=entry['room'], batch=entry['batch']):
+            db.session.rollback()
+            raise RuntimeError('The timetable changed during generation')
+    
+    try:
+        created_at = datetime.utcnow()
+        for i in range(0, len(entries), IMPORT_CHUNK_SIZE):
+            db.session.execute(db.insert(Timetable), [
+                dict(entry, created_at=created_at) for entry in entries[i:i + IMPORT_CHUNK_SIZE]
+            ])
+        db.session.commit()
+    finally:
+        occupancy.invalidate()
+    
+    report['created'] = len(entries)
+    return report
+
+generation_workers = JobWorkerPool(db, TimetableJob, run_generation_job)
+
+@api.route('/api/admin/timetable/generate/jobs/<int:job_id>', methods=['GET'])
+@admin_required
+def get_generation_job(job_id):
+    job = db.session.get(TimetableJob, job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job': job.to_dict()}), 200
+
+@api.route('/api/admin/timetable/<int:timetable_id>', methods=['PUT'])
+@admin_required
+def update_timetable_entry(timetable_id):
+    data = request.json
+    try:
+        day = parse_day(data['day']) if 'day' in data else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    version = data_version('timetable', lock=True)
+    timetable_entry = db.session.get(Timetable, timetable_id)
+    
+    if not timetable_entry:
+        return jsonify({'error': 'Timetable entry not found'}), 404
+    
+    timetable_entry.staff_id = data.get('staff_id', timetable_entry.staff_id)
+    timetable_entry.course_code = data.get('course_code', timetable_entry.course_code)
+    timetable_entry.course_name = data.get('course_name', timetable_entry.course_name)
+    timetable_entry.day = day or timetable_entry.day
+    if 'time_slot' in data:
+        try:
+            timetable_entry.set_time_slot(data['time_slot'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    timetable_entry.room = data.get('room', timetable_entry.room)
+    timetable_entry.classroom_id = data.get('classroom_id', timetable_entry.classroom_id)
+    timetable_entry.batch = data.get('batch', timetable_entry.batch)
+    
+    occupancy.sync(version)
+    conflict_response = check_timetable_conflicts(timetable_entry)
+    if conflict_response:
+        db.session.rollback()
+        return conflict_response
+    
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Timetable conflict: the staff member already has this slot'}), 409
+    occupancy.record(timetable_entry, version)
+    return jsonify({'message': 'Timetable entry updated successfully'}), 200
 
-@app.route('/api/admin/leave/pending', methods=['GET'])
+@api.route('/api/admin/timetable/<int:timetable_id>', methods=['DELETE'])
+@admin_required
+def delete_timetable_entry(timetable_id):
+    version = data_version('timetable', lock=True)
+    timetable_entry = db.session.get(Timetable, timetable_id)
+    if not timetable_entry:
+        return jsonify({'error': 'Timetable entry not found'}), 404
+    
+    db.session.delete(timetable_entry)
+    db.session.commit()
+    occupancy.discard(timetable_id, version)
+    return jsonify({'message': 'Timetable entry deleted successfully'}), 200
+
+@api.route('/api/admin/timetable/busy', methods=['GET'])
+@admin_required
+def get_busy_at():
+    """Classes running on a day at a point in time (?time=10:15) or during a slot (?time_slot=10:00-11:00)"""
+    day = request.args.get('day')
+    if not day:
+        return jsonify({'error': 'Missing required parameter: day'}), 400
+    
+    try:
+        if request.args.get('time_slot'):
+            start, end = parse_time_slot(request.args['time_slot'])
+        else:
+            start = parse_time(request.args.get('time'))
+            end = start + 1
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    occupancy.sync(data_version('timetable'))
+    entry_ids = occupancy.entries_between(day, start, end)
+    entries = Timetable.query.filter(Timetable.id.in_(entry_ids)).all() if entry_ids else []
+    return jsonify({
+        'timetable': [describe_timetable_entry(t) for t in sorted(entries, key=lambda t: (t.start_minute, t.id))]
+    }), 200
+
+# Live Occupancy
+@api.route('/api/admin/occupancy/live', methods=['GET'])
+def get_live_occupancy():
+    """Classes running right now (or ?at=HH:MM today) and who is teaching them.
+
+    Open to admins, and to display screens sending "Authorization: Bearer
+    <LIVE_OCCUPANCY_TOKEN>" when a token is configured. Filters: staff_id
+    (the teacher actually taking the class), room.
+    """
+    token = current_app.config.get('LIVE_OCCUPANCY_TOKEN')
+    if not (token and request.headers.get('Authorization') == f'Bearer {token}') and session.get('user_type') != 'admin':
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    try:
+        if request.args.get('at'):
+            minute = parse_time(request.args['at'])
+        else:
+            now = datetime.now()
+            minute = now.hour * 60 + now.minute
+        staff_id = request.args.get('staff_id', type=int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    room = TimetableOccupancyIndex.text_key(request.args.get('room'))
+    if minute >= MINUTES_PER_DAY:
+        return jsonify({'error': 'Time out of range'}), 400
+    
+    payload, body = live_occupancy.at(minute)
+    if not staff_id and not room:
+        return Response(body, mimetype='application/json')
+    classes = [
+        cls for cls in payload['classes']
+        if (not staff_id or cls['staff_id'] == staff_id) and (not room or TimetableOccupancyIndex.text_key(cls['room']) == room)
+    ]
+    return jsonify(dict(payload, classes=classes)), 200
+
+# Staff Timetable Route
+@api.route('/api/staff/timetable', methods=['GET'])
+@staff_required
+def get_staff_timetable():
+    staff_id = session['user_id']
+    timetable = Timetable.query.filter_by(staff_id=staff_id).options(db.joinedload(Timetable.classroom)).all()
+    return jsonify({
+        'timetable': [{
+            'id': t.id,
+            'course_code': t.course_code,
+            'course_name': t.course_name,
+            'day': t.day,
+            'time_slot': t.time_slot,
+            'room': t.room,
+            'batch': t.batch,
+            'classroom': t.classroom.to_dict() if t.classroom else None
+        } for t in timetable]
+    }), 200
+
+# Staff Calendar Feeds
+class CalendarFeedCache:
+    """Rendered iCalendar feeds per staff member, with their ETag.
+
+    Renderings are kept in memory, so a calendar client polling an
+    unchanged feed gets its 304 after a single indexed token lookup. Tokens
+    are checked against the database on every request, so a reset URL or a
+    deactivated account stops working at once in every worker process.
+    Commits touching a staff member's timetable entries or substitutions
+    drop that member's rendering (see the session hooks below); the TTL
+    bounds how long changes made by other worker processes take to appear.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._feeds = {}    # staff_id -> (body, etag, last_modified, rendered_at)
+
+    def staff_for_token(self, token):
+        return db.session.query(Staff.id).filter(Staff.calendar_token == token, Staff.is_active == True).scalar()
+
+    def get(self, staff_id):
+        with self._lock:
+            feed = self._feeds.get(staff_id)
+        if feed and time.monotonic() - feed[3] <= self.ttl:
+            return feed
+        body = render_staff_calendar(staff_id)
+        etag = hashlib.sha1(body.encode('utf-8')).hexdigest()
+        last_modified = feed[2] if feed and feed[1] == etag else datetime.utcnow().replace(microsecond=0)
+        # Hashed before DTSTAMP is filled in, so re-rendering unchanged data keeps the ETag
+        body = body.replace(CALENDAR_STAMP_PLACEHOLDER, last_modified.strftime('%Y%m%dT%H%M%SZ'))
+        feed = (body, etag, last_modified, time.monotonic())
+        with self._lock:
+            self._feeds[staff_id] = feed
+        return feed
+
+    def invalidate(self, staff_ids=None):
+        """Drop the renderings of the given staff, or of everyone"""
+        with self._lock:
+            if staff_ids is None:
+                self._feeds.clear()
+            else:
+                for staff_id in staff_ids:
+                    self._feeds.pop(staff_id, None)
+
+calendar_feeds = CalendarFeedCache()
+
+# Rendered as DTSTAMP and replaced with the feed's Last-Modified time
+CALENDAR_STAMP = datetime(1970, 1, 1)
+CALENDAR_STAMP_PLACEHOLDER = '19700101T000000Z'
+
+def leave_dates_on(leave_date, end_date, weekday):
+    """Dates within a leave that fall on the given weekday name"""
+    dates = []
+    day = leave_date
+    while day <= (end_date or leave_date):
+        if day.strftime('%A').lower() == weekday.lower():
+            dates.append(day)
+        day += timedelta(days=1)
+    return dates
+
+def render_staff_calendar(staff_id):
+    """iCalendar text with a weekly event per class and one-off substitution duties"""
+    staff = Staff.query.get(staff_id)
+    timezone = current_app.config.get('CALENDAR_TIMEZONE')
+    calendar = ical.Calendar(f'{staff.name} - Timetable', timezone=timezone)
+    stamp = CALENDAR_STAMP
+    
+    entries = Timetable.query.filter_by(staff_id=staff_id).all()
+    # Classes handed to a substitute are excluded from the weekly series
+    handed_over = {}
+    for entry_id, leave_date, end_date, day in db.session.query(
+        ClassRescheduling.original_timetable_id, Leave.leave_date, Leave.end_date, Timetable.day
+    ).join(Leave, ClassRescheduling.leave_id == Leave.id).join(
+        Timetable, ClassRescheduling.original_timetable_id == Timetable.id
+    ).filter(ClassRescheduling.original_staff_id == staff_id):
+        handed_over.setdefault(entry_id, []).extend(leave_dates_on(leave_date, end_date, day))
+    
+    for entry in entries:
+        if entry.start_minute is None or entry.day.lower() not in ical.WEEKDAY_CODES:
+            continue
+        created = (entry.created_at or datetime.utcnow()).date()
+        first = created + timedelta(days=(WEEKDAY_INDEX[entry.day.lower()] - created.weekday()) % 7)
+        start = datetime.combine(first, datetime.min.time()) + timedelta(minutes=entry.start_minute)
+        end = datetime.combine(first, datetime.min.time()) + timedelta(minutes=entry.end_minute)
+        exdates = [
+            datetime.combine(day, datetime.min.time()) + timedelta(minutes=entry.start_minute)
+            for day in handed_over.get(entry.id, ())
+        ]
+        calendar.add_event(
+            f'timetable-{entry.id}@college-scheduling', start, end,
+            f'{entry.course_code} {entry.course_name}', stamp,
+            location=entry.room, description=f'Batch {entry.batch}' if entry.batch else None,
+            weekly_on=entry.day, exdates=exdates
+        )
+    
+    original_staff = db.aliased(Staff)
+    duties = db.session.query(
+        ClassRescheduling.id, Timetable.course_code, Timetable.course_name, Timetable.day, Timetable.start_minute,
+        Timetable.end_minute, Timetable.room, Timetable.batch, original_staff.name, Leave.leave_date, Leave.end_date
+    ).join(Timetable, ClassRescheduling.original_timetable_id == Timetable.id).join(
+        Leave, ClassRescheduling.leave_id == Leave.id
+    ).join(original_staff, ClassRescheduling.original_staff_id == original_staff.id).filter(
+        ClassRescheduling.assigned_staff_id == staff_id
+    )
+    for (record_id, course_code, course_name, day, start_minute, end_minute, room, batch,
+         original_name, leave_date, end_date) in duties:
+        if start_minute is None:
+            continue
+        for duty_date in leave_dates_on(leave_date, end_date, day):
+            start = datetime.combine(duty_date, datetime.min.time()) + timedelta(minutes=start_minute)
+            calendar.add_event(
+                f'substitution-{record_id}-{duty_date:%Y%m%d}@college-scheduling',
+                start, start + timedelta(minutes=end_minute - start_minute),
+                f'Substitution: {course_code} {course_name}', stamp,
+                location=room, description=f'Covering for {original_name}' + (f', batch {batch}' if batch else '')
+            )
+    return calendar.render()
+
+# Changes are the ids of staff whose feeds must be rendered again
+def collect_calendar_changes(session, changes):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Timetable):
+            columns = ('staff_id',)
+        elif isinstance(obj, ClassRescheduling):
+            columns = ('original_staff_id', 'assigned_staff_id')
+        else:
+            continue
+        for column in columns:
+            changes.items.append(getattr(obj, column))
+            previous = _previous_value(obj, column)
+            if previous is not UNKNOWN:
+                changes.items.append(previous)
+
+def collect_bulk_calendar_changes(orm_execute_state, changes):
+    params = orm_execute_state.parameters
+    if orm_execute_state.is_insert and orm_execute_state.bind_mapper.class_ is ClassRescheduling and isinstance(params, list):
+        for row in params:
+            changes.items.extend((row.get('original_staff_id'), row.get('assigned_staff_id')))
+    else:
+        changes.stale = True
+
+def apply_calendar_changes(session, changes):
+    if changes.stale:
+        calendar_feeds.invalidate()
+    else:
+        calendar_feeds.invalidate(set(changes.items))
+
+track_changes(db.session, 'calendar_changes', (Timetable, ClassRescheduling, Leave),
+              collect_calendar_changes, apply_calendar_changes, collect_bulk_calendar_changes)
+
+@api.route('/api/staff/calendar', methods=['GET'])
+@staff_required
+def get_calendar_feed_url():
+    """The staff member's private iCal feed URL, created on first use"""
+    staff = Staff.query.get(session['user_id'])
+    if not staff.calendar_token:
+        staff.calendar_token = secrets.token_urlsafe(32)
+        db.session.commit()
+    return jsonify({'feed_url': url_for('api.staff_calendar_feed', token=staff.calendar_token, _external=True)}), 200
+
+@api.route('/api/staff/calendar/reset', methods=['POST'])
+@staff_required
+def reset_calendar_feed_url():
+    """Replace the feed URL, e.g. after it was shared by mistake"""
+    staff = Staff.query.get(session['user_id'])
+    staff.calendar_token = secrets.token_urlsafe(32)
+    db.session.commit()
+    return jsonify({'feed_url': url_for('api.staff_calendar_feed', token=staff.calendar_token, _external=True)}), 200
+
+@api.route('/calendar/<token>.ics', methods=['GET'])
+def staff_calendar_feed(token):
+    """Timetable and substitution duties as iCalendar, for calendar apps.
+
+    Answers 304 Not Modified when If-None-Match or If-Modified-Since show
+    the client already has the current feed.
+    """
+    staff_id = calendar_feeds.staff_for_token(token)
+    if staff_id is None:
+        return jsonify({'error': 'Calendar not found'}), 404
+    body, etag, last_modified, _ = calendar_feeds.get(staff_id)
+    
+    response = Response(body, mimetype='text/calendar')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.max_age = 300
+    return response.make_conditional(request)
+
+# Staff Notifications
+NOTIFICATION_PAGE_SIZE = 50
+NOTIFICATION_REPLAY_LIMIT = 200
+NOTIFICATION_RETRY_MS = 5000  # browser reconnect delay, sent as the SSE retry field
+
+def substitution_notice(entry, leave, original_staff_name):
+    return {
+        'timetable_id': entry.id,
+        'course_code': entry.course_code,
+        'course_name': entry.course_name,
+        'day': entry.day,
+        'time_slot': entry.time_slot,
+        'room': entry.room,
+        'batch': entry.batch,
+        'leave_id': leave.id,
+        'leave_date': leave.leave_date.strftime('%Y-%m-%d'),
+        'end_date': leave.last_date.strftime('%Y-%m-%d'),
+        'original_staff': original_staff_name
+    }
+
+def leave_notice(leave):
+    return {
+        'leave_id': leave.id,
+        'leave_date': leave.leave_date.strftime('%Y-%m-%d'),
+        'end_date': leave.last_date.strftime('%Y-%m-%d'),
+        'leave_type': leave.leave_type,
+        'status': leave.status
+    }
+
+def notify_staff(staff_id, kind, payload):
+    """Queue a notification in the current transaction; it is streamed once committed"""
+    db.session.add(Notification(staff_id=staff_id, kind=kind, payload=payload))
+
+def fetch_notifications(after_id, limit):
+    try:
+        rows = Notification.query.filter(Notification.id > after_id).order_by(Notification.id).limit(limit).all()
+        return [(n.id, n.staff_id, n.to_dict()) for n in rows]
+    finally:
+        db.session.close()  # don't hold a pooled connection between polls
+
+def latest_notification_id():
+    try:
+        return db.session.query(db.func.max(Notification.id)).scalar()
+    finally:
+        db.session.close()
+
+notification_broker = NotificationBroker(fetch_notifications, latest_notification_id)
+
+def collect_notifications(session, changes):
+    changes.items.extend(obj.id for obj in session.new if isinstance(obj, Notification))
+
+def collect_bulk_notifications(orm_execute_state, changes):
+    if orm_execute_state.is_insert:
+        changes.stale = True  # new rows, ids unknown; the broker fetches them anyway
+
+def publish_notifications(session, changes):
+    notification_broker.notify()
+
+track_changes(db.session, 'notification_changes', (Notification,),
+              collect_notifications, publish_notifications, collect_bulk_notifications)
+
+def sse_event(notification):
+    return f"id: {notification['id']}\nevent: {notification['kind']}\ndata: {json.dumps(notification)}\n\n"
+
+@api.route('/api/staff/notifications', methods=['GET'])
+@staff_required
+def get_staff_notifications():
+    """Latest notifications, newest first; `since` returns only newer ones"""
+    limit = max(1, min(request.args.get('limit', NOTIFICATION_PAGE_SIZE, type=int), NOTIFICATION_REPLAY_LIMIT))
+    query = Notification.query.filter(Notification.staff_id == session['user_id'])
+    since = request.args.get('since', type=int)
+    if since is not None:
+        query = query.filter(Notification.id > since)
+    notifications = [n.to_dict() for n in query.order_by(Notification.id.desc()).limit(limit)]
+    last_id = notifications[0]['id'] if notifications else db.session.query(db.func.max(Notification.id)).filter(
+        Notification.staff_id == session['user_id']
+    ).scalar()
+    return jsonify({'notifications': notifications, 'last_id': last_id or since or 0}), 200
+
+def serve_streams_only():
+    """Refuse everything but notification streams (NOTIFICATION_STREAMS_ONLY)"""
+    if request.endpoint != 'api.stream_staff_notifications':
+        return jsonify({'error': 'This server only serves notification streams'}), 404
+
+@api.route('/api/staff/notifications/stream', methods=['GET'])
+@staff_required
+def stream_staff_notifications():
+    """Server-Sent Events with the staff member's new notifications.
+
+    The browser's EventSource reconnects with Last-Event-ID (or pass
+    ?since=<id> the first time) and gets what it missed replayed first.
+    The stream holds no database connection while it waits, so a worker
+    with an async worker class can keep thousands of them open.
+    """
+    staff_id = session['user_id']
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID must be a notification id'}), 400
+    
+    # Subscribe before reading the table so nothing committed in between is lost
+    subscription = notification_broker.subscribe(staff_id)
+    try:
+        mine = Notification.query.filter(Notification.staff_id == staff_id)
+        if last_id is None:
+            last_id = db.session.query(db.func.max(Notification.id)).filter(Notification.staff_id == staff_id).scalar() or 0
+            missed = []
+        else:
+            missed = [n.to_dict() for n in mine.filter(Notification.id > last_id).order_by(Notification.id).limit(NOTIFICATION_REPLAY_LIMIT)]
+    except Exception:
+        notification_broker.unsubscribe(subscription)
+        raise
+    finally:
+        db.session.close()
+    heartbeat = current_app.config['NOTIFICATION_HEARTBEAT']
+    lifetime = current_app.config['NOTIFICATION_STREAM_LIFETIME']
+    
+    def generate():
+        sent = last_id
+        try:
+            yield f'retry: {NOTIFICATION_RETRY_MS}\n\n'
+            for notification in missed:
+                yield sse_event(notification)
+                sent = notification['id']
+            if len(missed) == NOTIFICATION_REPLAY_LIMIT:
+                return  # far behind: the reconnect replays the next page
+            closes_at = time.monotonic() + lifetime
+            while not subscription.closed or not subscription.queue.empty():
+                remaining = closes_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                item = subscription.get(min(heartbeat, remaining))
+                if item is None:
+                    yield ': keep-alive\n\n'  # also how a closed connection is noticed
+                elif item[0] > sent:
+                    yield sse_event(item[1])
+                    sent = item[0]
+        finally:
+            notification_broker.unsubscribe(subscription)
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+    return response
+
+# Leave Management Routes
+@api.route('/api/staff/leave/apply', methods=['POST'])
+@staff_required
+def apply_leave():
+    data = request.json
+    staff_id = session['user_id']
+    
+    start = data.get('start_date') or data.get('leave_date')
+    if not start or not data.get('leave_type'):
+        return jsonify({'error': 'Leave date and type are required'}), 400
+    
+    try:
+        start_date = parse_date(start).date()
+        end_date = parse_date(data['end_date']).date() if data.get('end_date') else start_date
+    except (ValueError, OverflowError):
+        return jsonify({'error': 'Invalid leave date'}), 400
+    
+    if end_date < start_date:
+        return jsonify({'error': 'End date cannot be before start date'}), 400
+    
+    leave = Leave(
+        staff_id=staff_id,
+        leave_date=start_date,
+        end_date=end_date if end_date != start_date else None,
+        leave_type=data.get('leave_type'),
+        reason=data.get('reason', '')
+    )
+    db.session.add(leave)
+    db.session.commit()
+    
+    # Auto-reschedule classes in the background
+    job = enqueue_rescheduling(leave.id)
+    
+    return jsonify({'message': 'Leave applied successfully', 'leave_id': leave.id, 'job_id': job.id}), 201
+
+def enqueue_rescheduling(leave_id, auto_mode=False, strategy=None):
+    """Queue a rescheduling job, reusing one that is still waiting for this leave"""
+    job = RescheduleJob.query.filter(
+        RescheduleJob.leave_id == leave_id,
+        RescheduleJob.status.in_(ACTIVE_STATUSES)
+    ).order_by(RescheduleJob.id.desc()).first()
+    
+    if not job:
+        job = RescheduleJob(
+            leave_id=leave_id,
+            auto_mode=auto_mode,
+            strategy=strategy,
+            max_attempts=current_app.config['RESCHEDULING_MAX_ATTEMPTS']
+        )
+        db.session.add(job)
+        db.session.commit()
+    
+    if reschedule_workers.running:
+        reschedule_workers.notify()
+    else:
+        reschedule_workers.run_pending()
+        job = RescheduleJob.query.get(job.id)
+    return job
+
+def run_reschedule_job(job):
+    assigned = reschedule_classes_for_leaves([job.leave_id], auto_mode=job.auto_mode, strategy=job.strategy)
+    return {'assigned': assigned}
+
+reschedule_workers = JobWorkerPool(db, RescheduleJob, run_reschedule_job)
+
+@api.route('/api/rescheduling/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def get_reschedule_job(job_id):
+    job = RescheduleJob.query.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    # Staff can only follow jobs for their own leave
+    if session.get('user_type') == 'staff' and job.leave.staff_id != session['user_id']:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify({'job': job.to_dict()}), 200
+
+def reschedule_classes_for_leave(leave_id, auto_mode=False, strategy=None):
+    return reschedule_classes_for_leaves([leave_id], auto_mode=auto_mode, strategy=strategy) > 0
+
+def reschedule_classes_for_leaves(leave_ids, auto_mode=False, strategy=None):
+    """Assign substitutes for every uncovered class of the given leaves in one pass"""
+    # Plan and write under the timetable write lock: the busy slots and existing
+    # substitutions read below stay true until the assignments commit
+    occupancy.sync(data_version('timetable', lock=True))
+    leaves = Leave.query.filter(Leave.id.in_(leave_ids)).all()
+    if not leaves:
+        db.session.rollback()
+        return 0
+    strategy = strategy or current_app.config.get('RESCHEDULING_STRATEGY', BALANCED)
+    
+    # All classes of the absent staff on any weekday covered by their leave
+    absent_ids = {leave.staff_id for leave in leaves}
+    classes_by_staff = {}
+    for entry in Timetable.query.filter(Timetable.staff_id.in_(absent_ids)):
+        classes_by_staff.setdefault(entry.staff_id, []).append(entry)
+    
+    # Skip classes already rescheduled for their leave
+    already_done = set(db.session.query(ClassRescheduling.original_timetable_id, ClassRescheduling.leave_id).filter(
+        ClassRescheduling.leave_id.in_(leave_ids)
+    ))
+    pending = []
+    for leave in leaves:
+        weekdays = leave.weekdays()
+        for entry in classes_by_staff.get(leave.staff_id, []):
+            if entry.day.lower() in weekdays and (entry.id, leave.id) not in already_done:
+                pending.append((leave, entry))
+    if not pending:
+        db.session.rollback()
+        return 0
+    
+    # Candidate substitutes: active staff not on leave themselves during this period
+    window_start = min(leave.leave_date for leave in leaves)
+    window_end = max(leave.last_date for leave in leaves)
+    overlapping = db.and_(
+        Leave.id.notin_(leave_ids),
+        Leave.status != 'rejected',
+        Leave.leave_date <= window_end,
+        Leave.last_date >= window_start
+    )
+    away = {staff_id for (staff_id,) in db.session.query(Leave.staff_id).filter(overlapping)}
+    departments = {}
+    candidates = set()
+    for staff_id, department, is_active in db.session.query(Staff.id, Staff.department, Staff.is_active):
+        departments[staff_id] = department
+        if is_active:
+            candidates.add(staff_id)
+    candidates -= away | absent_ids
+    
+    # Substitutions already taken on by other staff during overlapping leaves
+    covering = IntervalIndex()
+    substitution_counts = {}
+    cover_rows = db.session.query(
+        ClassRescheduling.assigned_staff_id, Timetable.day, Timetable.start_minute, Timetable.end_minute
+    ).join(
+        Timetable, ClassRescheduling.original_timetable_id == Timetable.id
+    ).join(Leave, ClassRescheduling.leave_id == Leave.id).filter(
+        db.or_(overlapping, Leave.id.in_(leave_ids))
+    )
+    for staff_id, day, start, end in cover_rows:
+        if start is not None:
+            covering.add(TimetableOccupancyIndex.day_key(day), start, end, staff_id)
+        substitution_counts[staff_id] = substitution_counts.get(staff_id, 0) + 1
+    
+    # Classes with overlapping slots on the same day need different substitutes
+    slots = overlapping_slot_groups(entry for _, entry in pending)
+    
+    requests = []
+    for index, (leave, entry) in enumerate(pending):
+        if entry.start_minute is None:
+            continue
+        busy = occupancy.busy_staff(entry.day, entry.start_minute, entry.end_minute)
+        busy.update(staff_id for _, _, staff_id in covering.overlapping(
+            TimetableOccupancyIndex.day_key(entry.day), entry.start_minute, entry.end_minute
+        ))
+        requests.append(SubstituteRequest(
+            key=index,
+            slot=slots[entry.id],
+            free=candidates - busy,
+            department=departments.get(leave.staff_id),
+            course_code=entry.course_code
+        ))
+    
+    profiles = {}
+    if strategy == BALANCED:
+        weekly_load = dict(db.session.query(Timetable.staff_id, db.func.count(Timetable.id)).group_by(Timetable.staff_id))
+        courses = {}
+        course_codes = {entry.course_code for _, entry in pending}
+        for staff_id, course_code in db.session.query(Timetable.staff_id, Timetable.course_code).filter(
+            Timetable.course_code.in_(course_codes)
+        ).distinct():
+            courses.setdefault(staff_id, set()).add(course_code)
+        for staff_id in candidates:
+            profiles[staff_id] = CandidateProfile(
+                department=departments.get(staff_id),
+                courses=courses.get(staff_id, set()),
+                weekly_load=weekly_load.get(staff_id, 0),
+                substitutions=substitution_counts.get(staff_id, 0)
+            )
+    
+    picks = SubstitutePlanner(profiles, strategy=strategy).plan(requests)
+    
+    reason = 'Auto-assigned due to leave' if auto_mode else 'Manual assignment'
+    now = datetime.utcnow()
+    assignments = [{
+        'original_timetable_id': entry.id,
+        'original_staff_id': leave.staff_id,
+        'assigned_staff_id': picks[index],
+        'leave_id': leave.id,
+        'reason': reason,
+        'created_at': now
+    } for index, (leave, entry) in enumerate(pending) if index in picks]
+    
+    if assignments:
+        db.session.execute(db.insert(ClassRescheduling), assignments)
+        # Each substitute hears about the class once this transaction commits
+        names = dict(db.session.query(Staff.id, Staff.name).filter(Staff.id.in_(absent_ids)))
+        db.session.execute(db.insert(Notification), [{
+            'staff_id': picks[index],
+            'kind': 'substitution_assigned',
+            'payload': substitution_notice(entry, leave, names.get(leave.staff_id)),
+            'created_at': now
+        } for index, (leave, entry) in enumerate(pending) if index in picks])
+    db.session.commit()
+    return len(assignments)
+
+def overlapping_slot_groups(entries):
+    """Map timetable id -> (day, group) where a group is a run of overlapping slots"""
+    by_day = {}
+    for entry in entries:
+        if entry.start_minute is not None:
+            by_day.setdefault(TimetableOccupancyIndex.day_key(entry.day), []).append(entry)
+    
+    groups = {}
+    for day, day_entries in by_day.items():
+        group, group_end = -1, None
+        for entry in sorted(day_entries, key=lambda e: e.start_minute):
+            if group_end is None or entry.start_minute >= group_end:
+                group += 1
+                group_end = entry.end_minute
+            else:
+                group_end = max(group_end, entry.end_minute)
+            groups[entry.id] = (day, group)
+    return groups
+
+def find_available_staff(timetable_entry):
+    """Find an available staff member without conflicts for the given time slot"""
+    active_ids = {staff_id for (staff_id,) in db.session.query(Staff.id).filter(Staff.is_active == True)}
+    
+    if timetable_entry.start_minute is None:
+        return None
+    
+    # Anyone teaching during an overlapping slot is busy
+    occupancy.sync(data_version('timetable'))
+    busy = occupancy.busy_staff(timetable_entry.day, timetable_entry.start_minute, timetable_entry.end_minute)
+    candidates = active_ids - busy - {timetable_entry.staff_id}
+    
+    if not candidates:
+        return None
+    return Staff.query.get(min(candidates))
+
+@api.route('/api/admin/leave/pending', methods=['GET'])
 @admin_required
 def get_pending_leaves():
-    pending_leaves = Leave.query.filter_by(status='pending').all()
+    pending_leaves = Leave.query.filter_by(status='pending').options(db.joinedload(Leave.staff)).all()
     return jsonify({
         'leaves': [{
             'id': l.id,
             'staff_id': l.staff_id,
             'staff_name': l.staff.name,
             'leave_date': l.leave_date.strftime('%Y-%m-%d'),
+            'end_date': l.last_date.strftime('%Y-%m-%d'),
             'leave_type': l.leave_type,
             'reason': l.reason,
             'applied_at': l.applied_at.strftime('%Y-%m-%d %H:%M:%S')
         } for l in pending_leaves]
     }), 200
 
-@app.route('/api/admin/leave/<int:leave_id>/approve', methods=['POST'])
+@api.route('/api/admin/leave/<int:leave_id>/approve', methods=['POST'])
 @admin_required
 def approve_leave(leave_id):
     try:
@@ -549,20 +2640,22 @@ def approve_leave(leave_id):
         
         leave.status = 'approved'
         leave.approved_by = session['user_id']
+        notify_staff(leave.staff_id, 'leave_approved', leave_notice(leave))
         db.session.commit()
         
-        # Auto-reschedule classes when leave is approved
-        reschedule_classes_for_leave(leave_id)
+        # Auto-reschedule classes in the background when leave is approved
+        job = enqueue_rescheduling(leave_id)
         
         return jsonify({
             'message': 'Leave approved successfully',
-            'leave_id': leave_id
+            'leave_id': leave_id,
+            'job_id': job.id
         }), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/leave/<int:leave_id>/reject', methods=['POST'])
+@api.route('/api/admin/leave/<int:leave_id>/reject', methods=['POST'])
 @admin_required
 def reject_leave(leave_id):
     try:
@@ -572,10 +2665,18 @@ def reject_leave(leave_id):
         
         leave.status = 'rejected'
         leave.approved_by = session['user_id']
+        notify_staff(leave.staff_id, 'leave_rejected', leave_notice(leave))
         
-        # Remove all rescheduling records for this leave
+        # Remove all rescheduling records for this leave and tell the substitutes
         reschedulings = ClassRescheduling.query.filter_by(leave_id=leave_id).all()
+        entries = {t.id: t for t in Timetable.query.filter(
+            Timetable.id.in_({r.original_timetable_id for r in reschedulings})
+        )} if reschedulings else {}
         for rescheduling in reschedulings:
+            entry = entries.get(rescheduling.original_timetable_id)
+            if entry:
+                notify_staff(rescheduling.assigned_staff_id, 'substitution_removed',
+                             substitution_notice(entry, leave, leave.staff.name))
             db.session.delete(rescheduling)
         
         db.session.commit()
@@ -588,122 +2689,774 @@ def reject_leave(leave_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/rescheduling/<int:rescheduling_id>/override', methods=['POST'])
+@api.route('/api/admin/rescheduling/<int:rescheduling_id>/override', methods=['POST'])
 @admin_required
 def override_rescheduling(rescheduling_id):
-    data = request.json
-    rescheduling = ClassRescheduling.query.get(rescheduling_id)
+    data = request.get_json(silent=True) or {}
+    rescheduling = db.session.get(ClassRescheduling, rescheduling_id)
     if not rescheduling:
         return jsonify({'error': 'Rescheduling record not found'}), 404
     
-    rescheduling.assigned_staff_id = data.get('assigned_staff_id')
+    assigned_staff_id = data.get('assigned_staff_id')
+    if not isinstance(assigned_staff_id, int) or isinstance(assigned_staff_id, bool):
+        return jsonify({'error': 'assigned_staff_id must be a staff id'}), 400
+    assigned_staff = db.session.get(Staff, assigned_staff_id)
+    if not assigned_staff:
+        return jsonify({'error': 'Staff not found'}), 404
+    if not assigned_staff.is_active:
+        return jsonify({'error': 'Staff member is not active'}), 400
+    
+    previous_staff_id = rescheduling.assigned_staff_id
+    rescheduling.assigned_staff_id = assigned_staff_id
+    if assigned_staff_id != previous_staff_id:
+        # The class itself may have been deleted since; there is nothing to tell then
+        entry = db.session.get(Timetable, rescheduling.original_timetable_id)
+        if entry:
+            notice = substitution_notice(entry, rescheduling.leave, rescheduling.leave.staff.name)
+            notify_staff(previous_staff_id, 'substitution_removed', notice)
+            notify_staff(assigned_staff_id, 'substitution_assigned', notice)
     db.session.commit()
     return jsonify({'message': 'Rescheduling overridden successfully'}), 200
 
-@app.route('/api/admin/leave/<int:leave_id>/auto-reschedule', methods=['POST'])
+@api.route('/api/admin/leave/<int:leave_id>/auto-reschedule', methods=['POST'])
 @admin_required
 def auto_reschedule_leave(leave_id):
-    """Automatically reschedule all classes for the leave"""
-    try:
-        reschedule_classes_for_leave(leave_id, auto_mode=True)
-        return jsonify({'message': 'Classes auto-rescheduled successfully'}), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    """Queue automatic rescheduling of all classes for the leave"""
+    strategy = (request.get_json(silent=True) or {}).get('strategy') or request.args.get('strategy')
+    if strategy and strategy not in STRATEGIES:
+        return jsonify({'error': f'Unknown strategy, expected one of: {", ".join(STRATEGIES)}'}), 400
+    if not Leave.query.get(leave_id):
+        return jsonify({'error': 'Leave not found'}), 404
+    
+    # Same queue as apply/approve, which reuses a job still waiting for this leave
+    job = enqueue_rescheduling(leave_id, auto_mode=True, strategy=strategy)
+    return jsonify({'message': 'Auto-rescheduling queued', 'leave_id': leave_id, 'job_id': job.id}), 202
 
 # Dashboard Statistics Routes
-@app.route('/api/admin/stats/staff-count', methods=['GET'])
+@api.route('/api/admin/stats/staff-count', methods=['GET'])
 @admin_required
 def get_staff_count():
-    total_staff = Staff.query.count()
-    active_staff = Staff.query.filter_by(is_active=True).count()
+    stats = dashboard_stats.snapshot()
+    return jsonify({'total_staff': stats['total_staff'], 'active_staff': stats['active_staff']}), 200
+
+@api.route('/api/admin/stats/dashboard', methods=['GET'])
+@admin_required
+def get_dashboard_stats():
+    """Staff per department, leave counts, staff on leave per day and substitutions, from memory"""
+    try:
+        days = min(max(int(request.args.get('days', 7)), 1), 60)
+    except ValueError:
+        return jsonify({'error': 'Invalid days'}), 400
+    return jsonify(dashboard_stats.snapshot(days)), 200
+
+@api.route('/api/admin/stats/refresh', methods=['POST'])
+@admin_required
+def refresh_dashboard_stats():
+    """Drop the cached counters, e.g. after editing the database by hand"""
+    dashboard_stats.invalidate()
+    return jsonify(dashboard_stats.snapshot()), 200
+
+REPORT_PAGE_SIZE = 100
+REPORT_MAX_PAGE_SIZE = 1000
+
+def report_page_args(default_limit=REPORT_PAGE_SIZE):
+    """Read the limit, cursor and from/to date range shared by the report endpoints.
+
+    Reports are ordered newest first; cursor is the id of the last row of
+    the previous page. Raises ValueError on malformed parameters.
+    """
+    args = request.args
+    limit = min(max(int(args.get('limit', default_limit)), 1), REPORT_MAX_PAGE_SIZE)
+    cursor = int(args['cursor']) if args.get('cursor') else None
+    date_from = parse_date(args['from']).date() if args.get('from') else None
+    date_to = parse_date(args['to']).date() if args.get('to') else None
+    return limit, cursor, date_from, date_to
+
+def filter_datetime_range(query, column, date_from, date_to):
+    if date_from:
+        query = query.filter(column >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        query = query.filter(column < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    return query
+
+def fetch_page(query, id_column, limit, cursor):
+    """Run a newest-first keyset query, returning (rows, next_cursor)"""
+    if cursor:
+        query = query.filter(id_column < cursor)
+    rows = query.order_by(id_column.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1][0]
+    return rows, None
+
+def login_activity_query():
+    return db.session.query(
+        LoginLog.id, LoginLog.user_type, LoginLog.login_time, LoginLog.logout_time,
+        LoginLog.ip_address, LoginLog.status, LoginLog.admin_id, LoginLog.staff_id, Admin.name, Staff.name
+    ).outerjoin(Admin, LoginLog.admin_id == Admin.id).outerjoin(Staff, LoginLog.staff_id == Staff.id)
+
+def login_activity_row(row):
+    """Format a login_activity_query() row; archives store the same shape"""
+    log_id, user_type, login_time, logout_time, ip_address, status, admin_id, staff_id, admin_name, staff_name = row
+    user_name = ''
+    if user_type == 'admin':
+        user_name = admin_name or 'Unknown Admin'
+    elif user_type == 'staff':
+        user_name = staff_name or 'Unknown Staff'
     
-    return jsonify({'total_staff': total_staff, 'active_staff': active_staff}), 200
+    return {
+        'id': log_id,
+        'user_name': user_name,
+        'user_type': user_type,
+        'admin_id': admin_id,
+        'staff_id': staff_id,
+        'login_time': login_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'logout_time': logout_time.strftime('%Y-%m-%d %H:%M:%S') if logout_time else None,
+        'ip_address': ip_address,
+        'status': status
+    }
 
-@app.route('/api/admin/stats/login-activity', methods=['GET'])
+@api.route('/api/admin/stats/login-activity', methods=['GET'])
 @admin_required
 def get_login_activity():
     try:
-        logs = LoginLog.query.order_by(LoginLog.login_time.desc()).limit(50).all()
-        
-        log_data = []
-        for log in logs:
-            user_name = ''
-            if log.user_type == 'admin' and log.admin_id:
-                admin = Admin.query.get(log.admin_id)
-                user_name = admin.name if admin else 'Unknown Admin'
-            elif log.user_type == 'staff' and log.staff_id:
-                staff = Staff.query.get(log.staff_id)
-                user_name = staff.name if staff else 'Unknown Staff'
-            
-            log_data.append({
-                'id': log.id,
-                'user_name': user_name,
-                'user_type': log.user_type,
-                'login_time': log.login_time.strftime('%Y-%m-%d %H:%M:%S'),
-                'logout_time': log.logout_time.strftime('%Y-%m-%d %H:%M:%S') if log.logout_time else None,
-                'ip_address': log.ip_address,
-                'status': log.status
-            })
+        try:
+            limit, cursor, date_from, date_to = report_page_args(default_limit=50)
+        except (ValueError, OverflowError):
+            return jsonify({'error': 'Invalid limit, cursor or date range'}), 400
         
-        return jsonify({'logs': log_data}), 200
+        query = login_activity_query()
+        if request.args.get('user_type'):
+            query = query.filter(LoginLog.user_type == request.args['user_type'])
+        query = filter_datetime_range(query, LoginLog.login_time, date_from, date_to)
+        logs, next_cursor = fetch_page(query, LoginLog.id, limit, cursor)
+        
+        return jsonify({'logs': [login_activity_row(log) for log in logs], 'next_cursor': next_cursor}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/leave-presence', methods=['GET'])
+# Login log retention
+def login_log_archive():
+    root = current_app.config.get('LOGIN_LOG_ARCHIVE_DIR') or os.path.join(current_app.instance_path, 'archive')
+    return NDJSONArchive(root, 'login_log')
+
+def archive_login_logs(cutoff, batch_size=None):
+    """Move login log rows older than cutoff into the archive, batch by batch.
+
+    Each batch is written to its daily partitions and fsynced before its
+    rows are deleted, so a crash can repeat a batch but never lose one.
+    Returns the number of rows archived.
+    """
+    batch_size = batch_size or current_app.config['LOGIN_LOG_ARCHIVE_BATCH']
+    archive = login_log_archive()
+    archived = 0
+    while True:
+        rows = login_activity_query().filter(LoginLog.login_time < cutoff).order_by(LoginLog.id).limit(batch_size).all()
+        if not rows:
+            return archived
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(row[2].date(), []).append(login_activity_row(row))
+        for day, day_rows in by_day.items():
+            archive.append(day, day_rows)
+        
+        ids = [row[0] for row in rows]
+        LoginLog.query.filter(LoginLog.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        archived += len(rows)
+
+def iter_login_activity(date_from=None, date_to=None, user_type=None, include_archived=True):
+    """Yield login activity newest first: the live table, then the archive"""
+    query = filter_datetime_range(login_activity_query(), LoginLog.login_time, date_from, date_to)
+    if user_type:
+        query = query.filter(LoginLog.user_type == user_type)
+    for row in query.order_by(LoginLog.login_time.desc()).yield_per(1000):
+        yield login_activity_row(row)
+    if not include_archived:
+        return
+    for row in login_log_archive().iter_rows(date_from, date_to, newest_first=True):
+        if not user_type or row['user_type'] == user_type:
+            yield row
+
+@api.route('/api/admin/stats/login-activity/history', methods=['GET'])
+@admin_required
+def stream_login_history():
+    """Stream login activity as NDJSON, including archived days.
+
+    Query parameters: from, to (dates), user_type, archived=0 to skip the
+    archive. Only the archive partitions inside from..to are read.
+    """
+    try:
+        date_from = parse_date(request.args['from']).date() if request.args.get('from') else None
+        date_to = parse_date(request.args['to']).date() if request.args.get('to') else None
+    except (ValueError, OverflowError):
+        return jsonify({'error': 'Invalid date range'}), 400
+    include_archived = request.args.get('archived', '1') not in ('0', 'false')
+    rows = iter_login_activity(date_from, date_to, request.args.get('user_type'), include_archived)
+    lines = (json.dumps(row) + '\n' for row in rows)
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+@api.route('/api/admin/leave-presence', methods=['GET'])
 @admin_required
 def get_leave_presence():
     try:
-        staff_id = request.args.get('staff_id')
+        try:
+            limit, cursor, date_from, date_to = report_page_args()
+            staff_id = request.args.get('staff_id', type=int)
+        except (ValueError, OverflowError):
+            return jsonify({'error': 'Invalid limit, cursor or date range'}), 400
+        
+        query = db.session.query(
+            Leave.id, Leave.staff_id, Leave.leave_date, Leave.last_date, Leave.leave_type, Leave.status, Staff.name
+        ).outerjoin(Staff, Leave.staff_id == Staff.id)
         
         if staff_id:
-            leaves = Leave.query.filter_by(staff_id=int(staff_id)).all()
-        else:
-            leaves = Leave.query.all()
+            query = query.filter(Leave.staff_id == staff_id)
+        if request.args.get('status'):
+            query = query.filter(Leave.status == request.args['status'])
+        # Leaves overlapping the requested range
+        if date_from:
+            query = query.filter(Leave.last_date >= date_from)
+        if date_to:
+            query = query.filter(Leave.leave_date <= date_to)
+        leaves, next_cursor = fetch_page(query, Leave.id, limit, cursor)
         
         leave_data = []
-        for leave in leaves:
-            staff = Staff.query.get(leave.staff_id)
+        for leave_id, leave_staff_id, leave_date, last_date, leave_type, status, staff_name in leaves:
             leave_data.append({
-                'id': leave.id,
-                'staff_name': staff.name if staff else 'Unknown',
-                'staff_id': leave.staff_id,
-                'leave_date': leave.leave_date.strftime('%Y-%m-%d'),
-                'leave_type': leave.leave_type,
-                'status': leave.status
+                'id': leave_id,
+                'staff_name': staff_name or 'Unknown',
+                'staff_id': leave_staff_id,
+                'leave_date': leave_date.strftime('%Y-%m-%d'),
+                'end_date': last_date.strftime('%Y-%m-%d'),
+                'leave_type': leave_type,
+                'status': status
             })
         
-        return jsonify({'leaves': leave_data}), 200
+        return jsonify({'leaves': leave_data, 'next_cursor': next_cursor}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/rescheduling', methods=['GET'])
+@api.route('/api/admin/rescheduling', methods=['GET'])
 @admin_required
 def get_rescheduling_records():
     try:
-        records = ClassRescheduling.query.order_by(ClassRescheduling.created_at.desc()).all()
+        try:
+            limit, cursor, date_from, date_to = report_page_args()
+        except (ValueError, OverflowError):
+            return jsonify({'error': 'Invalid limit, cursor or date range'}), 400
+        
+        original_staff = db.aliased(Staff)
+        assigned_staff = db.aliased(Staff)
+        query = db.session.query(
+            ClassRescheduling.id, ClassRescheduling.reason, ClassRescheduling.created_at,
+            ClassRescheduling.original_timetable_id, ClassRescheduling.original_staff_id, ClassRescheduling.assigned_staff_id,
+            original_staff.name, assigned_staff.name, Timetable.course_code, Timetable.course_name
+        ).outerjoin(
+            original_staff, ClassRescheduling.original_staff_id == original_staff.id
+        ).outerjoin(
+            assigned_staff, ClassRescheduling.assigned_staff_id == assigned_staff.id
+        ).outerjoin(
+            Timetable, ClassRescheduling.original_timetable_id == Timetable.id
+        )
+        
+        if request.args.get('leave_id'):
+            query = query.filter(ClassRescheduling.leave_id == request.args.get('leave_id', type=int))
+        query = filter_datetime_range(query, ClassRescheduling.created_at, date_from, date_to)
+        
+        total = query.order_by(None).count()
+        records, next_cursor = fetch_page(query, ClassRescheduling.id, limit, cursor)
         
         record_data = []
-        for record in records:
-            original_staff = Staff.query.get(record.original_staff_id)
-            assigned_staff = Staff.query.get(record.assigned_staff_id)
-            timetable = Timetable.query.get(record.original_timetable_id)
-            
+        for (record_id, reason, created_at, timetable_id, original_id, assigned_id,
+             original_name, assigned_name, course_code, course_name) in records:
             record_data.append({
-                'id': record.id,
-                'original_staff_name': original_staff.name if original_staff else 'Unknown',
-                'assigned_staff_name': assigned_staff.name if assigned_staff else 'Unknown',
-                'course_code': timetable.course_code if timetable else 'Unknown',
-                'course_name': timetable.course_name if timetable else 'Unknown',
-                'reason': record.reason,
-                'created_at': record.created_at.strftime('%Y-%m-%d %H:%M:%S')
+                'id': record_id,
+                'original_timetable_id': timetable_id,
+                'original_staff_id': original_id,
+                'assigned_staff_id': assigned_id,
+                'original_staff_name': original_name or 'Unknown',
+                'assigned_staff_name': assigned_name or 'Unknown',
+                'course_code': course_code or 'Unknown',
+                'course_name': course_name or 'Unknown',
+                'reason': reason,
+                'created_at': created_at.strftime('%Y-%m-%d %H:%M:%S')
             })
         
-        return jsonify({'records': record_data}), 200
+        return jsonify({'records': record_data, 'total': total, 'next_cursor': next_cursor}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Leave Analytics
+WEEKDAY_INDEX = {name: i for i, name in enumerate(('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday'))}
+ANALYTICS_GROUPS = ('department', 'month', 'leave_type')
+analytics_cache = analytics.PeriodCache()
+
+def compute_leave_analytics(date_from, date_to, group_by, status, top):
+    """Leave trends, substitution load and coverage for leaves overlapping the period.
+
+    Each source is read with one query into columnar buffers; all grouping
+    happens on those columns (see analytics.py).
+    """
+    # Plain Core execution: rows stay tuples, no ORM result processing
+    connection = db.session.connection()
+    leave_rows = connection.execute(db.session.query(
+        Leave.id, Leave.staff_id, Staff.department, Leave.leave_type, Leave.status, Leave.leave_date, Leave.end_date
+    ).join(Staff, Leave.staff_id == Staff.id).filter(
+        Leave.leave_date <= date_to, Leave.last_date >= date_from
+    ).statement).all()
+    substitutions = db.session.query(ClassRescheduling.leave_id, ClassRescheduling.assigned_staff_id).join(
+        Leave, ClassRescheduling.leave_id == Leave.id
+    ).filter(Leave.leave_date <= date_to, Leave.last_date >= date_from).subquery()
+    substitution_rows = connection.execute(db.session.query(
+        substitutions.c.leave_id, substitutions.c.assigned_staff_id, db.func.count()
+    ).group_by(substitutions.c.leave_id, substitutions.c.assigned_staff_id).statement).all()
+    # One substitution covers its class on every leave day, so count it per weekday;
+    # joined to Staff like leave_rows so leaves of deleted staff are left out of both
+    covered_rows = connection.execute(db.session.query(
+        ClassRescheduling.leave_id, Timetable.day, db.func.count()
+    ).join(Leave, ClassRescheduling.leave_id == Leave.id).join(
+        Staff, Leave.staff_id == Staff.id
+    ).join(
+        Timetable, ClassRescheduling.original_timetable_id == Timetable.id
+    ).filter(Leave.leave_date <= date_to, Leave.last_date >= date_from).group_by(
+        ClassRescheduling.leave_id, Timetable.day
+    ).statement).all()
+    weekly_rows = connection.execute(db.session.query(Timetable.staff_id, Timetable.day, db.func.count(Timetable.id)).group_by(
+        Timetable.staff_id, Timetable.day
+    ).statement).all()
+    
+    # Columns, with the leave span clipped to the period as date ordinals
+    first_day, last_day = date_from.toordinal(), date_to.toordinal()
+    leave_ids = [row[0] for row in leave_rows]
+    starts = analytics.as_array(max(row[5].toordinal(), first_day) for row in leave_rows)
+    ends = analytics.as_array(min((row[6] or row[5]).toordinal(), last_day) for row in leave_rows)
+    days = analytics.as_array(end - start + 1 for start, end in zip(starts, ends))
+    staff_codes, staff_ids = analytics.encode([row[1] for row in leave_rows])
+    columns = {
+        'department': analytics.encode([row[2] for row in leave_rows]),
+        'month': analytics.encode([row[5].year * 12 + row[5].month - 1 for row in leave_rows]),
+        'leave_type': analytics.encode([(row[3] or '').lower() for row in leave_rows]),
+    }
+    status_codes, statuses = analytics.encode([row[4] for row in leave_rows])
+    selected = None
+    if status != 'all':
+        wanted = statuses.index(status) if status in statuses else -1
+        selected = analytics.as_array(1 if code == wanted else 0 for code in status_codes)
+    approved_code = statuses.index('approved') if 'approved' in statuses else -1
+    approved = analytics.as_array(1 if code == approved_code else 0 for code in status_codes)
+    
+    # Leave trends grouped by the requested columns
+    keys = [columns[name][0] for name in group_by]
+    sizes = [max(len(columns[name][1]), 1) for name in group_by]
+    counts = analytics.group_sum(keys, sizes, mask=selected)
+    day_totals = analytics.group_sum(keys, sizes, weights=days, mask=selected)
+    trends = []
+    def label(name, code):
+        value = columns[name][1][code]
+        return f'{value // 12}-{value % 12 + 1:02d}' if name == 'month' else value
+    
+    for group in sorted(counts):
+        row = {name: label(name, code) for name, code in zip(group_by, group)}
+        row.update(leaves=int(counts[group]), days=int(day_totals.get(group, 0)))
+        trends.append(row)
+    
+    # Coverage: classes missed on approved leave days vs those with a substitute
+    weekly = [[0] * 7 for _ in staff_ids]
+    staff_position = {staff_id: i for i, staff_id in enumerate(staff_ids)}
+    for staff_id, day, count in weekly_rows:
+        if staff_id in staff_position and (day or '').lower() in WEEKDAY_INDEX:
+            weekly[staff_position[staff_id]][WEEKDAY_INDEX[day.lower()]] += count
+    leave_weekdays = analytics.weekday_counts(starts, ends)
+    needed = analytics.dot_rows(leave_weekdays, weekly, staff_codes)
+    
+    # Covered the same way: substituted classes per weekday times their dates in the period
+    leave_position = {leave_id: i for i, leave_id in enumerate(leave_ids)}
+    covered_weekly = [[0] * 7 for _ in leave_ids]
+    for leave_id, day, count in covered_rows:
+        if leave_id in leave_position and (day or '').lower() in WEEKDAY_INDEX:
+            covered_weekly[leave_position[leave_id]][WEEKDAY_INDEX[day.lower()]] += count
+    covered = analytics.dot_rows(leave_weekdays, covered_weekly, analytics.as_array(range(len(leave_ids))))
+    
+    substitute_ids, substitute_counts = [], analytics.as_array(())
+    for leave_id, assigned_staff_id, count in substitution_rows:
+        substitute_ids.append(assigned_staff_id)
+        substitute_counts.append(count)
+    
+    coverage_keys = [columns['department'][0], columns['month'][0]]
+    coverage_sizes = [max(len(columns['department'][1]), 1), max(len(columns['month'][1]), 1)]
+    needed_totals = analytics.group_sum(coverage_keys, coverage_sizes, weights=needed, mask=approved)
+    covered_totals = analytics.group_sum(coverage_keys, coverage_sizes, weights=covered, mask=approved)
+    coverage = []
+    for group in sorted(set(needed_totals) | set(covered_totals)):
+        classes, substituted = int(needed_totals.get(group, 0)), int(covered_totals.get(group, 0))
+        coverage.append({
+            'department': columns['department'][1][group[0]],
+            'month': label('month', group[1]),
+            'classes_missed': classes,
+            'classes_covered': substituted,
+            'coverage_rate': round(substituted / classes, 4) if classes else None
+        })
+    
+    # Substitution load per teacher
+    substitute_codes, substitutes = analytics.encode(substitute_ids)
+    load = analytics.group_sum([substitute_codes], [max(len(substitutes), 1)], weights=substitute_counts)
+    busiest = sorted(load.items(), key=lambda item: (-item[1], substitutes[item[0][0]]))[:top]
+    top_ids = [substitutes[group[0]] for group, _ in busiest]
+    names = dict(db.session.query(Staff.id, Staff.name).filter(Staff.id.in_(top_ids)).all()) if top_ids else {}
+    weekly_classes = {}
+    for staff_id, day, count in weekly_rows:
+        weekly_classes[staff_id] = weekly_classes.get(staff_id, 0) + count
+    substitution_load = [{
+        'staff_id': substitutes[group[0]],
+        'staff_name': names.get(substitutes[group[0]], 'Unknown'),
+        'substitutions': int(total),
+        'weekly_classes': weekly_classes.get(substitutes[group[0]], 0)
+    } for group, total in busiest]
+    
+    return {
+        'from': date_from.isoformat(),
+        'to': date_to.isoformat(),
+        'leaves_scanned': len(leave_rows),
+        'leave_trends': trends,
+        'coverage': coverage,
+        'substitution_load': substitution_load,
+        'engine': analytics.ENGINE
+    }
+
+@api.route('/api/admin/analytics/leave', methods=['GET'])
+@admin_required
+def get_leave_analytics():
+    """Leave trends, coverage rates and substitution load for a period.
+
+    Query parameters: from, to (default: the last 12 months),
+    group=department,month,leave_type (any subset, in order),
+    status=approved|pending|rejected|all (trends only), top (default 20).
+    Results are cached per period and options.
+    """
+    try:
+        date_to = parse_date(request.args['to']).date() if request.args.get('to') else date.today()
+        date_from = parse_date(request.args['from']).date() if request.args.get('from') else date_to - timedelta(days=365)
+        top = min(max(int(request.args.get('top', 20)), 1), 500)
+    except (ValueError, OverflowError):
+        return jsonify({'error': 'Invalid date range or top'}), 400
+    if date_from > date_to:
+        return jsonify({'error': 'from must not be after to'}), 400
+    
+    group_by = tuple(g.strip() for g in request.args.get('group', ','.join(ANALYTICS_GROUPS)).split(',') if g.strip())
+    if not group_by or any(g not in ANALYTICS_GROUPS for g in group_by):
+        return jsonify({'error': f'group must be a list of: {", ".join(ANALYTICS_GROUPS)}'}), 400
+    status = request.args.get('status', 'approved')
+    if status not in ('approved', 'pending', 'rejected', 'all'):
+        return jsonify({'error': 'Invalid status'}), 400
+    
+    try:
+        started = time.perf_counter()
+        result, cached = analytics_cache.get(
+            (date_from, date_to, group_by, status, top),
+            lambda: compute_leave_analytics(date_from, date_to, group_by, status, top)
+        )
+        return jsonify(dict(result, cached=cached, elapsed_ms=round((time.perf_counter() - started) * 1000, 2))), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Data Exports
+EXPORT_CHUNK_ROWS = 500
+EXPORT_FETCH_SIZE = 1000
+
+def csv_safe(value):
+    """Keep spreadsheet apps from evaluating cells that look like formulas"""
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@', '\t', '\r'):
+        return "'" + value
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+def stream_csv(header, rows, bom=False):
+    """Yield CSV text in chunks of EXPORT_CHUNK_ROWS rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if bom:
+        buffer.write('\ufeff')  # lets Excel detect UTF-8
+    writer.writerow(header)
+    for n, row in enumerate(rows, start=1):
+        writer.writerow([csv_safe(value) for value in row])
+        if n % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def stream_query(query):
+    """Rows from a server-side cursor, fetched EXPORT_FETCH_SIZE at a time"""
+    return query.execution_options(stream_results=True, yield_per=EXPORT_FETCH_SIZE)
+
+def export_timetable(args):
+    query = db.session.query(
+        Timetable.id, Timetable.staff_id, Staff.employee_id, Staff.name, Staff.department,
+        Timetable.course_code, Timetable.course_name, Timetable.day, Timetable.time_slot,
+        Timetable.room, Timetable.batch
+    ).join(Staff, Timetable.staff_id == Staff.id)
+    query = filter_timetable(query, args).order_by(Timetable.id)
+    header = ['id', 'staff_id', 'employee_id', 'staff_name', 'department', 'course_code',
+              'course_name', 'day', 'time_slot', 'room', 'batch']
+    return header, stream_query(query)
+
+def export_leave(args, date_from, date_to):
+    query = db.session.query(
+        Leave.id, Leave.staff_id, Staff.employee_id, Staff.name, Staff.department, Leave.leave_date,
+        Leave.last_date, Leave.leave_type, Leave.status, Leave.reason, Leave.applied_at
+    ).join(Staff, Leave.staff_id == Staff.id)
+    if args.get('status'):
+        query = query.filter(Leave.status == args['status'])
+    if args.get('staff_id'):
+        query = query.filter(Leave.staff_id == args.get('staff_id', type=int))
+    if args.get('department'):
+        query = query.filter(Staff.department == args['department'])
+    if date_from:
+        query = query.filter(Leave.last_date >= date_from)
+    if date_to:
+        query = query.filter(Leave.leave_date <= date_to)
+    header = ['id', 'staff_id', 'employee_id', 'staff_name', 'department', 'start_date', 'end_date',
+              'leave_type', 'status', 'reason', 'applied_at']
+    return header, stream_query(query.order_by(Leave.id))
+
+def export_rescheduling(args, date_from, date_to):
+    original_staff = db.aliased(Staff)
+    assigned_staff = db.aliased(Staff)
+    query = db.session.query(
+        ClassRescheduling.id, ClassRescheduling.leave_id, Timetable.course_code, Timetable.course_name,
+        Timetable.day, Timetable.time_slot, Timetable.room, original_staff.name, assigned_staff.name,
+        ClassRescheduling.reason, ClassRescheduling.created_at
+    ).outerjoin(Timetable, ClassRescheduling.original_timetable_id == Timetable.id).outerjoin(
+        original_staff, ClassRescheduling.original_staff_id == original_staff.id
+    ).outerjoin(assigned_staff, ClassRescheduling.assigned_staff_id == assigned_staff.id)
+    if args.get('leave_id'):
+        query = query.filter(ClassRescheduling.leave_id == args.get('leave_id', type=int))
+    query = filter_datetime_range(query, ClassRescheduling.created_at, date_from, date_to)
+    header = ['id', 'leave_id', 'course_code', 'course_name', 'day', 'time_slot', 'room',
+              'original_staff_name', 'assigned_staff_name', 'reason', 'created_at']
+    return header, stream_query(query.order_by(ClassRescheduling.id))
+
+LOGIN_EXPORT_COLUMNS = ['id', 'user_type', 'user_name', 'admin_id', 'staff_id', 'login_time',
+                        'logout_time', 'ip_address', 'status']
+
+def export_login_log(args, date_from, date_to):
+    include_archived = args.get('archived', '0') in ('1', 'true')
+    rows = iter_login_activity(date_from, date_to, args.get('user_type'), include_archived)
+    return LOGIN_EXPORT_COLUMNS, ([row[column] for column in LOGIN_EXPORT_COLUMNS] for row in rows)
+
+EXPORTS = {
+    'timetable': lambda args, date_from, date_to: export_timetable(args),
+    'leave': export_leave,
+    'rescheduling': export_rescheduling,
+    'login-log': export_login_log,
+}
+
+@api.route('/api/admin/export/<dataset>.csv', methods=['GET'])
+@admin_required
+def export_csv(dataset):
+    """Stream a dataset as CSV without building it in memory.
+
+    Datasets: timetable (same filters as the timetable list), leave (status,
+    staff_id, department, from, to), rescheduling (leave_id, from, to) and
+    login-log (user_type, from, to, archived=1 to include archived days).
+    bom=1 prefixes a byte order mark for Excel.
+    """
+    export = EXPORTS.get(dataset)
+    if not export:
+        return jsonify({'error': f'Unknown export, expected one of: {", ".join(EXPORTS)}'}), 404
+    try:
+        date_from = parse_date(request.args['from']).date() if request.args.get('from') else None
+        date_to = parse_date(request.args['to']).date() if request.args.get('to') else None
+    except (ValueError, OverflowError):
+        return jsonify({'error': 'Invalid date range'}), 400
+    
+    header, rows = export(request.args, date_from, date_to)
+    chunks = stream_csv(header, rows, bom=request.args.get('bom') in ('1', 'true'))
+    filename = f'{dataset}-{date.today().isoformat()}.csv'
+    return Response(stream_with_context(chunks), mimetype='text/csv', headers={
+        'Content-Disposition': f'attachment; filename="{filename}"'
+    })
+
+# Change Feed
+# Dashboards keep local copies of these tables and catch up with the changes
+# after their cursor. Append-only logs (logins, notifications, jobs) have
+# their own cursored endpoints and stay out of the feed.
+CHANGE_FEED_MODELS = {model.__tablename__: model for model in (
+    Admin, Staff, Classroom, ClassroomFacility, Timetable, Leave, ClassRescheduling, Attendance
+)}
+CHANGE_FEED_HIDDEN = {'password_hash', 'calendar_token'}
+CHANGE_FEED_PAGE_SIZE = 500
+CHANGE_FEED_MAX_PAGE_SIZE = 5000
+
+@event.listens_for(db.session, 'before_commit')
+def write_change_log(session):
+    """Insert the transaction's (entity, entity_id, op) changes as its last writes.
+
+    Change ids are assigned here rather than at each flush, so on databases
+    with concurrent writers the change log lock is held from this insert to
+    the commit instead of for the whole transaction.
+    """
+    if session.in_nested_transaction():
+        return  # a savepoint; the outer commit writes them
+    session.flush()  # before_commit runs ahead of the final flush
+    changes = session.info.pop('feed_changes', None)
+    if changes and changes.items:
+        lock_change_log(session)
+        now = datetime.utcnow()
+        session.connection().execute(ChangeLog.__table__.insert(), [
+            {'entity': entity, 'entity_id': entity_id, 'op': op, 'changed_at': now}
+            for entity, entity_id, op in changes.items
+        ])
+
+def feed_entity(obj):
+    entity = getattr(obj, '__tablename__', None)
+    return entity if type(obj) is CHANGE_FEED_MODELS.get(entity) else None
+
+def collect_feed_changes(session, changes):
+    for op, objects in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            entity = feed_entity(obj)
+            if entity and (op != 'update' or session.is_modified(obj, include_collections=False)):
+                changes.items.append((entity, obj.id, op))
+
+def collect_bulk_feed_changes(orm_execute_state, changes):
+    mapper = orm_execute_state.bind_mapper
+    entity = mapper.class_.__tablename__
+    statement = orm_execute_state.statement
+    params = orm_execute_state.parameters
+    if orm_execute_state.is_insert and params and not statement.returning_column_descriptions:
+        result = orm_execute_state.invoke_statement(statement=statement.returning(mapper.class_.id)).freeze()
+        changes.items.extend((entity, row[0], 'insert') for row in result())
+        return result()
+    if orm_execute_state.is_update and isinstance(params, list) and all('id' in row for row in params):
+        changes.items.extend((entity, row['id'], 'update') for row in params)  # bulk UPDATE by primary key
+    else:
+        changes.items.append((entity, None, 'reload'))  # rows picked by a WHERE clause
+    return None
+
+# Registered after the other caches on purpose: for bulk INSERTs its
+# do_orm_execute hook runs the statement itself, with RETURNING, to learn
+# the new ids. write_change_log inserts the changes, so nothing runs after commit.
+track_changes(db.session, 'feed_changes', CHANGE_FEED_MODELS.values(),
+              collect_feed_changes, collect_bulk=collect_bulk_feed_changes)
+
+def change_feed_data(obj):
+    data = {}
+    for prop in sa_inspect(obj).mapper.column_attrs:
+        if prop.key in CHANGE_FEED_HIDDEN:
+            continue
+        value = getattr(obj, prop.key)
+        if isinstance(value, datetime):
+            value = value.strftime('%Y-%m-%d %H:%M:%S')
+        elif isinstance(value, date):
+            value = value.strftime('%Y-%m-%d')
+        data[prop.key] = value
+    return data
+
+def read_changes(cursor, entities, limit):
+    """Changes after the cursor as (changes, next_cursor, has_more).
+
+    Several changes to one record in the page collapse into one, carrying
+    the record as it is now; a record that no longer exists is reported
+    deleted. Change ids become visible in order (see lock_change_log), so
+    a cursor never skips a late commit.
+    """
+    latest = db.session.query(db.func.max(ChangeLog.id)).scalar() or 0
+    query = ChangeLog.query.filter(ChangeLog.id > cursor, ChangeLog.id <= latest)
+    if entities:
+        query = query.filter(ChangeLog.entity.in_(entities))
+    rows = query.order_by(ChangeLog.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = rows[-1].id if has_more else max(latest, cursor)
+    
+    # Last change per record wins; an insert followed by updates stays an insert
+    changes = {}
+    for row in rows:
+        key = (row.entity, row.entity_id)
+        previous = changes.pop(key, None)
+        op = 'insert' if previous == 'insert' and row.op == 'update' else row.op
+        changes[key] = op
+    
+    ids_by_entity = {}
+    for (entity, entity_id), op in changes.items():
+        if op in ('insert', 'update'):
+            ids_by_entity.setdefault(entity, []).append(entity_id)
+    records = {}
+    for entity, ids in ids_by_entity.items():
+        model = CHANGE_FEED_MODELS[entity]
+        for obj in model.query.filter(model.id.in_(ids)):
+            records[(entity, obj.id)] = change_feed_data(obj)
+    
+    result = []
+    for (entity, entity_id), op in changes.items():
+        if op == 'reload':
+            result.append({'entity': entity, 'op': 'reload'})
+        elif op == 'delete' or (entity, entity_id) not in records:
+            result.append({'entity': entity, 'id': entity_id, 'op': 'delete'})
+        else:
+            result.append({'entity': entity, 'id': entity_id, 'op': op, 'data': records[(entity, entity_id)]})
+    return result, next_cursor, has_more
+
+@api.route('/api/admin/changes', methods=['GET'])
+@admin_required
+def get_changes():
+    """Inserts, updates and deletes after `cursor`, oldest first.
+
+    Without a cursor only the current cursor is returned: load the tables
+    in full, then poll with it. `entities` limits the feed to some tables.
+    """
+    entities = [e.strip() for e in request.args.get('entities', '').split(',') if e.strip()]
+    unknown = [e for e in entities if e not in CHANGE_FEED_MODELS]
+    if unknown:
+        return jsonify({'error': f'Unknown entities: {", ".join(unknown)}', 'entities': sorted(CHANGE_FEED_MODELS)}), 400
+    limit = max(1, min(request.args.get('limit', CHANGE_FEED_PAGE_SIZE, type=int), CHANGE_FEED_MAX_PAGE_SIZE))
+    cursor = request.args.get('cursor')
+    if cursor is None:
+        latest = db.session.query(db.func.max(ChangeLog.id)).scalar() or 0
+        return jsonify({'cursor': latest, 'changes': [], 'has_more': False}), 200
+    try:
+        cursor = int(cursor)
+    except ValueError:
+        return jsonify({'error': 'cursor must be an integer'}), 400
+    
+    changes, next_cursor, has_more = read_changes(cursor, entities, limit)
+    return jsonify({'cursor': next_cursor, 'changes': changes, 'has_more': has_more}), 200
+
+def compact_change_log(cutoff, batch_size=None):
+    """Drop change log rows older than cutoff that a later row supersedes.
+
+    A later change to the same record, or a later reload of its table,
+    makes a row redundant: a client behind it still sees that later change
+    and reads the record as it is now. Every cursor stays valid. Returns
+    the number of rows removed.
+    """
+    batch_size = batch_size or current_app.config['CHANGE_LOG_COMPACT_BATCH']
+    log = ChangeLog.__table__
+    later = log.alias('later')
+    superseded = db.exists().where(
+        later.c.entity == log.c.entity,
+        later.c.id > log.c.id,
+        db.or_(later.c.entity_id == log.c.entity_id, later.c.entity_id.is_(None))
+    )
+    last_id = db.session.query(db.func.max(ChangeLog.id)).filter(ChangeLog.changed_at < cutoff).scalar()
+    start = db.session.query(db.func.min(ChangeLog.id)).scalar()
+    removed = 0
+    if last_id is None:
+        return removed
+    while start <= last_id:
+        end = min(start + batch_size - 1, last_id)
+        removed += db.session.execute(
+            log.delete().where(log.c.id.between(start, end), superseded)
+        ).rowcount
+        db.session.commit()
+        start = end + 1
+    return removed
+
 # Classroom Management API
-@app.route('/api/admin/classrooms', methods=['GET'])
+@api.route('/api/admin/classrooms', methods=['GET'])
 @admin_required
 def get_classrooms():
     try:
@@ -714,7 +3467,48 @@ def get_classrooms():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/classrooms', methods=['POST'])
+@api.route('/api/admin/classrooms/available', methods=['GET'])
+@admin_required
+def find_free_classrooms():
+    """Classrooms free on a day for a time slot, smallest adequate room first.
+
+    Query parameters: day, time_slot (e.g. 11:00-12:30), capacity,
+    facilities (comma separated, all required), building (preferred), limit.
+    """
+    day = (request.args.get('day') or '').strip().capitalize()
+    if day not in WEEKDAYS:
+        return jsonify({'error': 'Missing or invalid parameter: day'}), 400
+    try:
+        start, end = parse_time_slot(request.args.get('time_slot'))
+        capacity = int(request.args.get('capacity') or 0)
+        limit = max(1, min(int(request.args.get('limit') or 20), 200))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    tags = parse_facilities(request.args.get('facilities', ''))
+    
+    sync_room_availability()
+    rooms, total = room_availability.search(
+        day, start, end, capacity=capacity, tags=tags, building=request.args.get('building'), limit=limit
+    )
+    return jsonify({
+        'day': day,
+        'time_slot': format_time_slot(start, end),
+        'total': total,
+        'classrooms': [
+            dict(room, free_from=format_minutes(room['free_from']), free_until=format_minutes(room['free_until']))
+            for room in rooms
+        ]
+    }), 200
+
+@api.route('/api/admin/classrooms/facilities', methods=['GET'])
+@admin_required
+def get_classroom_facilities():
+    """Facility tags in use, with the number of active rooms having each"""
+    sync_room_availability()
+    counts = room_availability.tag_counts()
+    return jsonify({'facilities': [{'tag': tag, 'rooms': counts[tag]} for tag in sorted(counts)]}), 200
+
+@api.route('/api/admin/classrooms', methods=['POST'])
 @admin_required
 def create_classroom():
     try:
@@ -735,9 +3529,9 @@ def create_classroom():
             room_name=data['room_name'],
             capacity=int(data['capacity']),
             floor=data.get('floor', ''),
-            building=data.get('building', ''),
-            facilities=data.get('facilities', '')
+            building=data.get('building', '')
         )
+        classroom.set_facilities(data.get('facilities', ''))
         db.session.add(classroom)
         db.session.commit()
         
@@ -749,7 +3543,7 @@ def create_classroom():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/classrooms/<int:classroom_id>', methods=['PUT'])
+@api.route('/api/admin/classrooms/<int:classroom_id>', methods=['PUT'])
 @admin_required
 def update_classroom(classroom_id):
     try:
@@ -770,7 +3564,7 @@ def update_classroom(classroom_id):
         if 'building' in data:
             classroom.building = data['building']
         if 'facilities' in data:
-            classroom.facilities = data['facilities']
+            classroom.set_facilities(data['facilities'])
         
         db.session.commit()
         return jsonify({
@@ -781,7 +3575,7 @@ def update_classroom(classroom_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/classrooms/<int:classroom_id>', methods=['DELETE'])
+@api.route('/api/admin/classrooms/<int:classroom_id>', methods=['DELETE'])
 @admin_required
 def delete_classroom(classroom_id):
     try:
@@ -798,7 +3592,7 @@ def delete_classroom(classroom_id):
         return jsonify({'error': str(e)}), 500
 
 # Staff Leave History Route
-@app.route('/api/staff/leave-history', methods=['GET'])
+@api.route('/api/staff/leave-history', methods=['GET'])
 @staff_required
 def get_staff_leave_history():
     try:
@@ -810,6 +3604,7 @@ def get_staff_leave_history():
             leave_data.append({
                 'id': leave.id,
                 'leave_date': leave.leave_date.strftime('%Y-%m-%d'),
+                'end_date': leave.last_date.strftime('%Y-%m-%d'),
                 'leave_type': leave.leave_type,
                 'reason': leave.reason,
                 'status': leave.status,
@@ -820,15 +3615,143 @@ def get_staff_leave_history():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/')
+def ensure_schema():
+    """Create missing tables and apply pending schema migrations"""
+    return migrations.upgrade(db.engine, db.metadata)
+
+@api.cli.command('upgrade-db')
+@click.option('--status', is_flag=True, help='List pending migrations without applying them.')
+def upgrade_db_command(status):
+    """Apply pending schema migrations to the configured database."""
+    if status:
+        pending = migrations.pending_migrations(db.engine)
+        for version, description in pending:
+            click.echo(f'{version}: {description}')
+        click.echo(f'{len(pending)} pending migration(s)')
+        return
+    applied = ensure_schema()
+    click.echo(f'Applied migrations: {", ".join(map(str, applied))}' if applied else 'Database is up to date')
+
+# Monitoring
+@api.route('/api/admin/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics, summed over the worker processes when METRICS_DIR is set.
+
+    Open to admins, and to scrapers sending "Authorization: Bearer <METRICS_TOKEN>"
+    when a token is configured.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    if not (token and request.headers.get('Authorization') == f'Bearer {token}') and session.get('user_type') != 'admin':
+        return jsonify({'error': 'Admin access required'}), 403
+    return Response(request_metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/api/admin/metrics/slow-requests', methods=['GET'])
+@admin_required
+def get_slow_requests():
+    """Most recent requests over SLOW_REQUEST_MS with their slowest statements"""
+    return jsonify({
+        'threshold_ms': request_metrics.slow_request_ms,
+        'requests': request_metrics.slow_requests()
+    }), 200
+
+@api.cli.command('archive-login-logs')
+@click.option('--days', type=int, default=None, help='Keep this many days in the table (default: LOGIN_LOG_RETENTION_DAYS).')
+@click.option('--batch-size', type=int, default=None, help='Rows moved per transaction.')
+def archive_login_logs_command(days, batch_size):
+    """Move old login log rows into the compressed archive."""
+    days = days if days is not None else current_app.config['LOGIN_LOG_RETENTION_DAYS']
+    cutoff = datetime.combine(datetime.utcnow().date() - timedelta(days=days), datetime.min.time())
+    archived = archive_login_logs(cutoff, batch_size)
+    click.echo(f'Archived {archived} login log row(s) from before {cutoff:%Y-%m-%d} to {login_log_archive().directory}')
+
+@api.cli.command('compact-change-log')
+@click.option('--days', type=int, default=None, help='Only compact changes older than this (default: CHANGE_LOG_COMPACT_AFTER_DAYS).')
+@click.option('--batch-size', type=int, default=None, help='Change log ids scanned per transaction.')
+def compact_change_log_command(days, batch_size):
+    """Remove change log rows superseded by later changes."""
+    days = days if days is not None else current_app.config['CHANGE_LOG_COMPACT_AFTER_DAYS']
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    removed = compact_change_log(cutoff, batch_size)
+    click.echo(f'Removed {removed} superseded change log row(s) from before {cutoff:%Y-%m-%d %H:%M}')
+
+@api.route('/')
 def home():
     return send_from_directory('public', 'index.html')
 
-@app.route('/<path:filename>')
+@api.route('/<path:filename>')
 def serve_static(filename):
     return send_from_directory('public', filename)
 
+# Database connection tuning
+def configure_sqlite(engine, pragmas):
+    """Run the configured PRAGMA statements on every new SQLite connection"""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+    
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+def create_app(config_name=None, overrides=None):
+    """Build the application with settings from config.py.
+
+    The configuration is picked by name, else from FLASK_CONFIG or FLASK_ENV
+    ('development', 'production', 'testing'), defaulting to development.
+    `overrides` is a dict of settings applied on top of it.
+    """
+    config_name = config_name or os.environ.get('FLASK_CONFIG') or os.environ.get('FLASK_ENV') or 'default'
+    
+    # Initialize Flask app with static folder configuration
+    app = Flask(__name__, static_folder='public', static_url_path='')
+    app.config.from_object(configs.get(config_name, configs['default']))
+    app.config.update(overrides or {})
+    if not (app.debug or app.testing) and app.config['SECRET_KEY'] == DEFAULT_SECRET_KEY:
+        app.logger.warning('SECRET_KEY is not set; sessions are signed with the development key')
+    
+    db.init_app(app)
+    with app.app_context():
+        configure_sqlite(db.engine, app.config.get('SQLITE_PRAGMAS'))
+    CORS(app, supports_credentials=True)
+    app.register_blueprint(api)
+    if app.config['NOTIFICATION_STREAMS_ONLY']:
+        app.before_request(serve_streams_only)
+    if app.config['METRICS_ENABLED']:
+        request_metrics.init_app(
+            app, db, slow_request_ms=app.config['SLOW_REQUEST_MS'], directory=app.config.get('METRICS_DIR')
+        )
+    
+    reschedule_workers.init_app(app, workers=app.config['RESCHEDULING_WORKERS'])
+    generation_workers.init_app(app, workers=app.config['TIMETABLE_GENERATION_WORKERS'])
+    login_events.init_app(
+        app,
+        max_events=app.config['LOGIN_LOG_FLUSH_EVENTS'],
+        flush_interval=app.config['LOGIN_LOG_FLUSH_MS'] / 1000,
+        enabled=app.config['LOGIN_LOG_BUFFERED']
+    )
+    occupancy.invalidate()
+    dashboard_stats.ttl = app.config['STATS_CACHE_TTL']
+    dashboard_stats.invalidate()
+    analytics_cache.ttl = app.config['ANALYTICS_CACHE_TTL']
+    analytics_cache.clear()
+    calendar_feeds.ttl = app.config['CALENDAR_CACHE_TTL']
+    calendar_feeds.invalidate()
+    room_availability.invalidate()
+    live_occupancy.ttl = app.config['LIVE_OCCUPANCY_TTL']
+    live_occupancy.invalidate()
+    notification_broker.init_app(
+        app,
+        poll_interval=app.config['NOTIFICATION_POLL_INTERVAL'],
+        max_queue=app.config['NOTIFICATION_QUEUE_SIZE']
+    )
+    return app
+
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
-        db.create_all()
-    app.run(debug=True, host='0.0.0.0', port=5000)
+        ensure_schema()
+    reschedule_workers.start()
+    generation_workers.start()
+    app.run(debug=app.debug, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,91 @@
+"""
+Date-partitioned, gzip-compressed NDJSON archives.
+
+Rows moved out of a hot table are appended to one file per day:
+
+    <root>/<name>/2026/10/2026-10-18.ndjson.gz
+
+Each append writes a new gzip member, which readers see as one continuous
+stream, so archiving in batches never rewrites a file. Reads only open the
+partitions inside the requested date range and yield rows one at a time.
+A batch that was written but not deleted from the database (a crash in
+between) is archived again on the next run; readers skip the repeated ids.
+"""
+
+import gzip
+import json
+import os
+from datetime import date, datetime
+
+SUFFIX = '.ndjson.gz'
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Cannot archive value of type {type(value).__name__}')
+
+
+class NDJSONArchive:
+    """Append-only archive of dict rows partitioned by day"""
+
+    def __init__(self, root, name):
+        self.directory = os.path.join(root, name)
+
+    def path_for(self, day):
+        return os.path.join(self.directory, f'{day:%Y}', f'{day:%m}', f'{day.isoformat()}{SUFFIX}')
+
+    def append(self, day, rows):
+        """Append rows to the partition of the given day and fsync it"""
+        path = self.path_for(day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='ab') as out:
+                for row in rows:
+                    out.write(json.dumps(row, default=_json_default, separators=(',', ':')).encode())
+                    out.write(b'\n')
+            raw.flush()
+            os.fsync(raw.fileno())
+        return path
+
+    def partitions(self, date_from=None, date_to=None):
+        """Yield (day, path) for existing partitions in the range, oldest first"""
+        if not os.path.isdir(self.directory):
+            return
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if not filename.endswith(SUFFIX):
+                    continue
+                try:
+                    day = date.fromisoformat(filename[:-len(SUFFIX)])
+                except ValueError:
+                    continue
+                if (date_from and day < date_from) or (date_to and day > date_to):
+                    continue
+                yield day, os.path.join(dirpath, filename)
+
+    def iter_rows(self, date_from=None, date_to=None, newest_first=False):
+        """Stream rows from the partitions in [date_from, date_to]"""
+        partitions = list(self.partitions(date_from, date_to))
+        if newest_first:
+            partitions.reverse()
+        for day, path in partitions:
+            rows = self._read(path)
+            # Only one day is held in memory when reading backwards
+            yield from (reversed(list(rows)) if newest_first else rows)
+
+    def _read(self, path):
+        seen = set()
+        with gzip.open(path, 'rt', encoding='utf-8') as lines:
+            for line in lines:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                if row.get('id') in seen:
+                    continue
+                seen.add(row.get('id'))
+                yield row
+
+    def days(self):
+        return [day for day, _ in self.partitions()]
@@ -0,0 +1,172 @@
+"""
+Substitute assignment engine used by class rescheduling.
+
+Classes that need cover are grouped by time slot. Within a slot every class
+needs a different substitute, so the slot is solved as a min-cost bipartite
+matching (Hungarian algorithm) between classes and free staff. Slots are
+solved one after another and each pick is added to the substitute's load,
+which spreads substitutions across the faculty instead of always handing
+them to the lowest staff ids.
+"""
+
+from collections import namedtuple
+
+BALANCED = 'balanced'
+FIRST_FIT = 'first_fit'
+STRATEGIES = (BALANCED, FIRST_FIT)
+
+# Cost weights for the balanced strategy
+DEFAULT_WEIGHTS = {
+    'weekly_load': 1.0,       # per class the candidate already teaches each week
+    'substitutions': 3.0,     # per substitution already assigned in the period
+    'other_department': 4.0,  # candidate is not in the absent teacher's department
+    'other_course': 6.0,      # candidate does not teach the course themselves
+}
+
+# Cost of leaving a class uncovered; larger than any real assignment
+UNASSIGNED_COST = 1e9
+
+# A class needing cover. `key` identifies it in the result, `free` holds the
+# ids of staff who could take it.
+SubstituteRequest = namedtuple('SubstituteRequest', 'key slot free department course_code')
+
+# What the cost function knows about a possible substitute
+CandidateProfile = namedtuple('CandidateProfile', 'department courses weekly_load substitutions')
+
+
+class SubstitutePlanner:
+    """Picks a substitute for every request using the configured strategy"""
+
+    def __init__(self, profiles, strategy=BALANCED, weights=None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Unknown rescheduling strategy: {strategy}')
+        self.strategy = strategy
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.profiles = profiles
+        self.extra_substitutions = {}
+
+    def cost(self, request, staff_id):
+        profile = self.profiles.get(staff_id)
+        if profile is None:
+            return self.weights['other_department'] + self.weights['other_course']
+        weights = self.weights
+        substitutions = profile.substitutions + self.extra_substitutions.get(staff_id, 0)
+        cost = weights['weekly_load'] * profile.weekly_load + weights['substitutions'] * substitutions
+        if profile.department != request.department:
+            cost += weights['other_department']
+        if request.course_code not in profile.courses:
+            cost += weights['other_course']
+        return cost
+
+    def plan(self, requests):
+        """Return {request.key: staff_id} for every request that could be covered"""
+        by_slot = {}
+        for req in requests:
+            by_slot.setdefault(req.slot, []).append(req)
+
+        result = {}
+        for slot in sorted(by_slot):
+            slot_requests = by_slot[slot]
+            if self.strategy == FIRST_FIT:
+                picks = self._first_fit(slot_requests)
+            else:
+                picks = self._balanced(slot_requests)
+            for req, staff_id in picks:
+                result[req.key] = staff_id
+                self.extra_substitutions[staff_id] = self.extra_substitutions.get(staff_id, 0) + 1
+        return result
+
+    def _first_fit(self, slot_requests):
+        taken = set()
+        picks = []
+        for req in slot_requests:
+            free = req.free - taken
+            if free:
+                staff_id = min(free)
+                taken.add(staff_id)
+                picks.append((req, staff_id))
+        return picks
+
+    def _balanced(self, slot_requests):
+        n = len(slot_requests)
+        costs = [{staff_id: self.cost(req, staff_id) for staff_id in req.free} for req in slot_requests]
+
+        # Some optimal matching only uses each row's n cheapest columns, so the
+        # hundreds of free staff shrink to a handful of columns per slot.
+        columns = set()
+        for row in costs:
+            columns.update(sorted(row, key=lambda staff_id: (row[staff_id], staff_id))[:n])
+        columns = sorted(columns)
+        if not columns:
+            return []
+
+        # Pad with one "uncovered" column per row so every row can be matched
+        width = len(columns) + n
+        matrix = []
+        for i, row in enumerate(costs):
+            line = [row.get(staff_id, UNASSIGNED_COST * 2) for staff_id in columns]
+            line.extend(UNASSIGNED_COST if j == i else UNASSIGNED_COST * 2 for j in range(n))
+            matrix.append(line)
+
+        picks = []
+        for i, j in enumerate(hungarian(matrix, width)):
+            if j < len(columns) and columns[j] in costs[i]:
+                picks.append((slot_requests[i], columns[j]))
+        return picks
+
+
+def hungarian(matrix, width):
+    """Minimum-cost assignment of each row to a distinct column.
+
+    `matrix` is a list of n rows with `width` >= n costs each. Returns the
+    chosen column index for every row. Runs in O(n^2 * width).
+    """
+    n = len(matrix)
+    inf = float('inf')
+    u = [0.0] * (n + 1)
+    v = [0.0] * (width + 1)
+    owner = [0] * (width + 1)  # owner[j] = row matched to column j (1-based, 0 = none)
+    way = [0] * (width + 1)
+
+    for i in range(1, n + 1):
+        owner[0] = i
+        j0 = 0
+        minv = [inf] * (width + 1)
+        used = [False] * (width + 1)
+        while True:
+            used[j0] = True
+            i0 = owner[j0]
+            row = matrix[i0 - 1]
+            ui0 = u[i0]
+            delta = inf
+            j1 = 0
+            for j in range(1, width + 1):
+                if not used[j]:
+                    cur = row[j - 1] - ui0 - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(width + 1):
+                if used[j]:
+                    u[owner[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if owner[j0] == 0:
+                break
+        while True:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+            if j0 == 0:
+                break
+
+    assignment = [0] * n
+    for j in range(1, width + 1):
+        if owner[j]:
+            assignment[owner[j] - 1] = j - 1
+    return assignment
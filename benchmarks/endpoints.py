@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Endpoint benchmark suite.
+
+Seeds a fresh database with benchmarks/seed_data.py, then drives the real
+routes through the Flask test client: logins, timetable listings, leave
+apply/approve (including the rescheduling they trigger) and the reports.
+For each scenario it reports p50/p95/p99 latency and SQL statements per
+request, and compares them with a stored baseline.
+
+    python benchmarks/endpoints.py                   # run and compare
+    python benchmarks/endpoints.py --save-baseline   # store this run as the baseline
+    python benchmarks/endpoints.py --check           # exit 1 on a regression
+
+Latency baselines are only meaningful on the machine that recorded them;
+query counts are exact and are also held to the fixed QUERY_BUDGETS.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from seed_data import PASSWORD, generate
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+END_DATE = date(2026, 6, 1)  # fixed "today" of the generated history
+
+# Most SQL statements a single request may issue, whatever the data size.
+# Report and listing endpoints must not grow with the number of rows.
+QUERY_BUDGETS = {
+    'timetable_list': 2,
+    'timetable_filtered': 2,
+    'staff_timetable': 3,
+    'staff_count': 5,  # the first call loads the stats cache, later ones run none
+    'login_activity': 2,
+    'leave_presence': 3,
+    'rescheduling_records': 3,
+    'pending_leaves': 3,
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class Bench:
+    def __init__(self, app, db, iterations, seed):
+        self.app = app
+        self.iterations = iterations
+        self.rng = random.Random(seed)
+        self.queries = 0
+        self.results = {}
+        with app.app_context():
+            event.listen(db.engine, 'after_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.queries += 1
+
+    def client(self, user_type='admin', n=0):
+        client = self.app.test_client()
+        email = f'admin{n}@college.edu' if user_type == 'admin' else f'staff{n}@college.edu'
+        response = client.post(f'/api/{user_type}/login', json={'email': email, 'password': PASSWORD})
+        assert response.status_code == 200, response.json
+        return client
+
+    def measure(self, name, request, iterations=None, expect=(200,)):
+        """Call request(i) repeatedly; records latency and statement count of each call"""
+        latencies, queries = [], []
+        for i in range(iterations or self.iterations):
+            self.queries = 0
+            started = time.perf_counter()
+            response = request(i)
+            latencies.append(time.perf_counter() - started)
+            queries.append(self.queries)
+            if response.status_code not in expect:
+                raise AssertionError(f'{name}: HTTP {response.status_code} {response.get_data(as_text=True)[:200]}')
+        latencies.sort()
+        self.results[name] = {
+            'n': len(latencies),
+            **{f'p{pct}_ms': round(percentile(latencies, pct) * 1000, 3) for pct in PERCENTILES},
+            'queries_mean': round(statistics.mean(queries), 2),
+            'queries_max': max(queries),
+        }
+
+    def run(self):
+        rng = self.rng
+        admin = self.client('admin')
+        staff_clients = [self.client('staff', n) for n in range(10)]
+        login_iterations = max(5, self.iterations // 10)  # password hashing dominates
+
+        self.measure('admin_login', lambda i: self.app.test_client().post(
+            '/api/admin/login', json={'email': 'admin0@college.edu', 'password': PASSWORD}), login_iterations)
+        self.measure('staff_login', lambda i: self.app.test_client().post(
+            '/api/staff/login', json={'email': f'staff{i}@college.edu', 'password': PASSWORD}), login_iterations)
+
+        days = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday')
+        self.measure('timetable_list', lambda i: admin.get('/api/admin/timetable?limit=500'))
+        self.measure('timetable_filtered', lambda i: admin.get(
+            f'/api/admin/timetable?day={days[i % len(days)]}&department=CS&limit=200'))
+        self.measure('staff_timetable', lambda i: staff_clients[i % len(staff_clients)].get('/api/staff/timetable'))
+
+        def apply_leave(i):
+            day = END_DATE + timedelta(days=rng.randint(1, 60))
+            return staff_clients[i % len(staff_clients)].post('/api/staff/leave/apply', json={
+                'start_date': day.isoformat(), 'leave_type': 'sick', 'reason': 'benchmark'})
+        self.measure('apply_leave', apply_leave, expect=(201,))
+
+        from app import Leave
+        with self.app.app_context():
+            pending = [leave_id for leave_id, in Leave.query.with_entities(Leave.id).filter_by(status='pending')]
+        self.measure('approve_leave', lambda i: admin.post(f'/api/admin/leave/{pending[i]}/approve'),
+                     min(self.iterations, len(pending)))
+
+        self.measure('pending_leaves', lambda i: admin.get('/api/admin/leave/pending'))
+        self.measure('staff_count', lambda i: admin.get('/api/admin/stats/staff-count'))
+        self.measure('login_activity', lambda i: admin.get('/api/admin/stats/login-activity'))
+        self.measure('leave_presence', lambda i: admin.get(
+            f'/api/admin/leave-presence?from={END_DATE - timedelta(days=30)}&to={END_DATE}'))
+        self.measure('rescheduling_records', lambda i: admin.get('/api/admin/rescheduling?limit=100'))
+        return self.results
+
+
+def compare(results, baseline, tolerance):
+    """Print the results next to the baseline; returns a list of regressions"""
+    regressions = []
+    header = f'{"scenario":<22}{"n":>5}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"queries":>9}{"max":>5}  vs baseline'
+    print(header)
+    print('-' * len(header))
+    for name, result in results.items():
+        notes = []
+        base = baseline.get(name)
+        if base:
+            for key in ('p50_ms', 'p95_ms'):
+                if base[key]:
+                    change = (result[key] - base[key]) / base[key]
+                    notes.append(f'{key[:3]} {change:+.0%}')
+                    if change > tolerance:
+                        regressions.append(f'{name}: {key} {base[key]} -> {result[key]}')
+            if result['queries_max'] > base['queries_max']:
+                notes.append(f'queries {base["queries_max"]} -> {result["queries_max"]}')
+                regressions.append(f'{name}: queries per request {base["queries_max"]} -> {result["queries_max"]}')
+        budget = QUERY_BUDGETS.get(name)
+        if budget is not None and result['queries_max'] > budget:
+            notes.append(f'over budget of {budget} queries')
+            regressions.append(f'{name}: {result["queries_max"]} queries, budget {budget}')
+        print(f'{name:<22}{result["n"]:>5}{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}'
+              f'{result["p99_ms"]:>10.2f}{result["queries_mean"]:>9g}{result["queries_max"]:>5}  {", ".join(notes)}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the API routes on synthetic data.')
+    parser.add_argument('--scale', default='small', help='seed_data scale (tiny, small, college)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed latency increase (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    from app import create_app, db, ensure_schema
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app('development', {
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(tmp, "bench.db")}',
+            'RESCHEDULING_WORKERS': 0,
+            'LOGIN_LOG_BUFFERED': False,
+            'METRICS_ENABLED': False,
+            'TESTING': True,
+        })
+        with app.app_context():
+            ensure_schema()
+            generate(args.scale, args.seed, end=END_DATE)
+        results = Bench(app, db, args.iterations, args.seed).run()
+        with app.app_context():
+            db.engine.dispose()
+
+    stored = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+    key = f'{args.scale}/{args.iterations}'
+    regressions = compare(results, stored.get(key, {}), args.tolerance)
+
+    if args.save_baseline:
+        stored[key] = results
+        with open(args.baseline, 'w') as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Saved baseline {key} to {args.baseline}')
+    elif regressions:
+        print('\nRegressions:\n  ' + '\n  '.join(regressions))
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Seeded synthetic data at college scale.
+
+Fills every table with data shaped like a real college: departments of
+staff, a clash-free weekly timetable (no staff, room or batch double
+booked), and years of leave, rescheduling and login history. The same seed
+always produces the same data, so benchmark runs are comparable.
+
+    python benchmarks/seed_data.py --scale college --database sqlite:////tmp/college.db
+
+Every generated account uses the password "password".
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+
+from intervals import format_time_slot
+from rooms import parse_facilities
+
+PASSWORD = 'password'
+
+# staff, classes per staff per week, years of history, logins per staff per year
+SCALES = {
+    'tiny': {'staff': 60, 'classes': 12, 'years': 1, 'logins': 20},
+    'small': {'staff': 400, 'classes': 14, 'years': 1, 'logins': 40},
+    'college': {'staff': 2500, 'classes': 16, 'years': 3, 'logins': 60},
+}
+
+DEPARTMENTS = ('CS', 'EE', 'ME', 'CE', 'IT', 'MATH', 'PHY', 'CHEM', 'BIO', 'MBA')
+POSITIONS = ('Lecturer', 'Assistant Professor', 'Associate Professor', 'Professor')
+LEAVE_TYPES = ('sick', 'casual', 'emergency')
+DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday')
+# Eight one-hour periods from 08:00
+SLOTS = [(start, start + 60) for start in range(8 * 60, 16 * 60, 60)]
+BATCH_SIZE = 5000
+
+
+def _insert(db, model, rows):
+    for i in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(db.insert(model), rows[i:i + BATCH_SIZE])
+    db.session.commit()
+
+
+def generate(scale='small', seed=42, end=None, log=print):
+    """Populate the database of the current app context; returns row counts"""
+    from app import db, Admin, Staff, Classroom, ClassroomFacility, Timetable, Leave, ClassRescheduling, LoginLog
+
+    params = SCALES[scale]
+    rng = random.Random(seed)
+    end = end or date.today()
+    start = end - timedelta(days=365 * params['years'])
+    password_hash = generate_password_hash(PASSWORD)
+    counts = {}
+    started = time.perf_counter()
+
+    admins = [{'email': f'admin{i}@college.edu', 'name': f'Admin {i}', 'password_hash': password_hash}
+              for i in range(3)]
+    _insert(db, Admin, admins)
+    counts['admin'] = len(admins)
+
+    staff = []
+    for i in range(params['staff']):
+        staff.append({
+            'employee_id': f'EMP{i:05d}',
+            'email': f'staff{i}@college.edu',
+            'password_hash': password_hash,
+            'name': f'Staff {i}',
+            'department': DEPARTMENTS[i % len(DEPARTMENTS)],
+            'phone': f'9{rng.randint(100000000, 999999999)}',
+            'position': rng.choice(POSITIONS),
+            'is_active': rng.random() > 0.02,
+        })
+    _insert(db, Staff, staff)
+    counts['staff'] = len(staff)
+    staff_ids = list(range(1, len(staff) + 1))
+
+    # Enough rooms for ~80% utilisation over the week
+    periods = len(DAYS) * len(SLOTS)
+    room_count = max(10, int(len(staff) * params['classes'] / periods / 0.8))
+    rooms = [{
+        'room_number': f'{chr(65 + i % 8)}{100 + i}',
+        'room_name': f'Room {i}',
+        'capacity': rng.choice((30, 40, 60, 90, 120)),
+        'floor': str(i % 5),
+        'building': f'Block {chr(65 + i % 8)}',
+        'facilities': ', '.join(rng.sample(('Projector', 'AC', 'Whiteboard', 'Smart Board', 'Lab'), 2)),
+    } for i in range(room_count)]
+    _insert(db, Classroom, rooms)
+    counts['classroom'] = len(rooms)
+    _insert(db, ClassroomFacility, [
+        {'classroom_id': room_id, 'tag': tag}
+        for room_id, room in enumerate(rooms, start=1)
+        for tag in sorted(parse_facilities(room['facilities']))
+    ])
+
+    # Each department teaches its own batches; a batch has ~one class per period
+    timetable = []
+    busy = set()  # ('staff'|'room'|'batch', value, day, slot)
+    for staff_id in staff_ids:
+        department = staff[staff_id - 1]['department']
+        courses = [f'{department}{rng.randint(100, 499)}' for _ in range(3)]
+        periods_free = [(day, slot) for day in DAYS for slot in range(len(SLOTS))]
+        rng.shuffle(periods_free)
+        placed = 0
+        for day, slot in periods_free:
+            if placed == params['classes']:
+                break
+            room = rng.randrange(room_count)
+            batch = f'{department}-{rng.randint(1, 4)}{chr(65 + rng.randrange(max(1, len(staff) // 60)))}'
+            keys = (('room', room, day, slot), ('batch', batch, day, slot))
+            if any(key in busy for key in keys):
+                continue
+            busy.update(keys)
+            course = rng.choice(courses)
+            slot_start, slot_end = SLOTS[slot]
+            timetable.append({
+                'staff_id': staff_id,
+                'course_code': course,
+                'course_name': f'Course {course}',
+                'day': day,
+                'time_slot': format_time_slot(slot_start, slot_end),
+                'start_minute': slot_start,
+                'end_minute': slot_end,
+                'room': rooms[room]['room_number'],
+                'classroom_id': room + 1,
+                'batch': batch,
+            })
+            placed += 1
+    _insert(db, Timetable, timetable)
+    counts['timetable'] = len(timetable)
+
+    by_staff_day = {}
+    for entry_id, entry in enumerate(timetable, start=1):
+        by_staff_day.setdefault((entry['staff_id'], entry['day']), []).append(entry_id)
+
+    # About eight leave requests per staff per year
+    leaves = []
+    reschedules = []
+    span = (end - start).days
+    for staff_id in staff_ids:
+        for _ in range(8 * params['years']):
+            first = start + timedelta(days=rng.randrange(span))
+            length = rng.choice((1, 1, 1, 1, 2, 3))
+            last = first + timedelta(days=length - 1)
+            age = (end - first).days
+            status = 'pending' if age < 7 and rng.random() < 0.7 else rng.choice(('approved',) * 9 + ('rejected',))
+            applied = datetime.combine(first, datetime.min.time()) - timedelta(days=rng.randint(0, 10), hours=rng.randint(0, 12))
+            leaves.append({
+                'staff_id': staff_id,
+                'leave_date': first,
+                'end_date': last if length > 1 else None,
+                'leave_type': rng.choice(LEAVE_TYPES),
+                'reason': '',
+                'status': status,
+                'applied_at': applied,
+                'approved_by': 1 if status != 'pending' else None,
+            })
+            if status == 'rejected':
+                continue
+            leave_id = len(leaves)
+            for offset in range(length):
+                day_name = (first + timedelta(days=offset)).strftime('%A')
+                for entry_id in by_staff_day.get((staff_id, day_name), ()):
+                    substitute = rng.choice(staff_ids)
+                    if substitute == staff_id:
+                        continue
+                    reschedules.append({
+                        'original_timetable_id': entry_id,
+                        'original_staff_id': staff_id,
+                        'assigned_staff_id': substitute,
+                        'leave_id': leave_id,
+                        'reason': 'Auto-rescheduled due to leave',
+                        'created_at': applied + timedelta(minutes=1),
+                    })
+    leaves.sort(key=lambda leave: leave['applied_at'])
+    _insert(db, Leave, leaves)
+    _insert(db, ClassRescheduling, reschedules)
+    counts['leave'] = len(leaves)
+    counts['class_rescheduling'] = len(reschedules)
+
+    # Logins on working days, most in the morning rush
+    logins = []
+    for staff_id in staff_ids:
+        for _ in range(params['logins'] * params['years']):
+            day = start + timedelta(days=rng.randrange(span))
+            login_time = datetime.combine(day, datetime.min.time()) + timedelta(
+                minutes=int(rng.gauss(8 * 60 + 50, 40)) % (24 * 60))
+            logins.append({
+                'staff_id': staff_id,
+                'user_type': 'staff',
+                'ip_address': f'10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}',
+                'login_time': login_time,
+                'logout_time': login_time + timedelta(hours=rng.uniform(0.2, 8)),
+                'status': 'logged_out',
+            })
+    logins.sort(key=lambda row: row['login_time'])
+    _insert(db, LoginLog, logins)
+    counts['login_log'] = len(logins)
+
+    log(f'Generated {scale} data set (seed {seed}) in {time.perf_counter() - started:.1f}s: '
+        + ', '.join(f'{count} {table}' for table, count in counts.items()))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill a database with synthetic college data.')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', help='SQLAlchemy URL (default: the configured database)')
+    args = parser.parse_args()
+
+    from app import create_app, db, ensure_schema, Staff
+
+    overrides = {'RESCHEDULING_WORKERS': 0}
+    if args.database:
+        overrides['SQLALCHEMY_DATABASE_URI'] = args.database
+    app = create_app(overrides=overrides)
+    with app.app_context():
+        ensure_schema()
+        if db.session.query(Staff.id).first():
+            sys.exit('The database already has staff; use an empty database.')
+        generate(args.scale, args.seed)
+
+
+if __name__ == '__main__':
+    main()
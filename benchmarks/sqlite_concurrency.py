@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+SQLite read/write throughput with several worker processes.
+
+Runs the same mixed workload twice against a fresh database file: once with
+SQLite's default rollback journal and once with the SQLITE_PRAGMAS from
+config.py (WAL, synchronous=NORMAL, busy_timeout, mmap, cache size). Each
+worker process builds its own app, like a gunicorn worker, and loops over
+the two hottest statements: a staff timetable read and a LoginLog insert.
+
+    python benchmarks/sqlite_concurrency.py --workers 4 --seconds 10
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.exc import OperationalError
+
+from config import Config
+
+STAFF = 200
+CLASSES_PER_STAFF = 20
+DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday')
+
+MODES = {
+    'default journal': {'journal_mode': 'DELETE'},
+    'tuned (config.py)': Config.SQLITE_PRAGMAS,
+}
+
+
+def make_app(path, pragmas):
+    from app import create_app
+    return create_app('development', {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'SQLITE_PRAGMAS': pragmas,
+        'RESCHEDULING_WORKERS': 0,
+    })
+
+
+def seed(path, pragmas):
+    from app import db, ensure_schema, Staff, Timetable
+
+    app = make_app(path, pragmas)
+    with app.app_context():
+        ensure_schema()
+        db.session.execute(db.insert(Staff), [{
+            'employee_id': f'B{i}', 'email': f'bench{i}@college.edu', 'name': f'Bench {i}',
+            'department': 'CS', 'position': 'Lecturer', 'password_hash': 'x'
+        } for i in range(STAFF)])
+        rows = []
+        for staff_id in range(1, STAFF + 1):
+            for n in range(CLASSES_PER_STAFF):
+                start = 8 * 60 + (n % 8) * 60
+                rows.append({
+                    'staff_id': staff_id, 'course_code': f'C{n}', 'course_name': 'Course',
+                    'day': DAYS[n % len(DAYS)], 'time_slot': f'{start // 60:02d}:00-{start // 60 + 1:02d}:00',
+                    'start_minute': start, 'end_minute': start + 60, 'room': f'R{n}', 'batch': f'B{n}'
+                })
+        db.session.execute(db.insert(Timetable), rows)
+        db.session.commit()
+        db.engine.dispose()
+
+
+def worker(path, pragmas, seconds, write_ratio, results):
+    from app import db, LoginLog, Timetable
+
+    app = make_app(path, pragmas)
+    reads = writes = locked = 0
+    latencies = []
+    rng = random.Random(os.getpid())
+    with app.app_context():
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            staff_id = rng.randint(1, STAFF)
+            started = time.perf_counter()
+            try:
+                if rng.random() < write_ratio:
+                    db.session.add(LoginLog(staff_id=staff_id, user_type='staff', ip_address='127.0.0.1'))
+                    db.session.commit()
+                    writes += 1
+                else:
+                    Timetable.query.filter_by(staff_id=staff_id).order_by(Timetable.day, Timetable.start_minute).all()
+                    db.session.rollback()
+                    reads += 1
+            except OperationalError as e:
+                db.session.rollback()
+                if 'locked' not in str(e):
+                    raise
+                locked += 1
+            latencies.append(time.perf_counter() - started)
+        db.engine.dispose()
+    results.put((reads, writes, locked, latencies))
+
+
+def run(mode, pragmas, workers, seconds, write_ratio):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        seed(path, pragmas)
+        results = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=worker, args=(path, pragmas, seconds, write_ratio, results))
+            for _ in range(workers)
+        ]
+        for proc in procs:
+            proc.start()
+        totals = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+
+    reads = sum(t[0] for t in totals)
+    writes = sum(t[1] for t in totals)
+    locked = sum(t[2] for t in totals)
+    latencies = sorted(l for t in totals for l in t[3])
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0
+    print(f'{mode:<20} {reads / seconds:>10.0f} {writes / seconds:>10.0f} {locked:>8} {p99:>9.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='share of operations that write')
+    args = parser.parse_args()
+
+    print(f'{args.workers} workers, {args.seconds:g}s per run, {args.write_ratio:.0%} writes')
+    print(f'{"mode":<20} {"reads/s":>10} {"writes/s":>10} {"locked":>8} {"p99 ms":>9}')
+    for mode, pragmas in MODES.items():
+        run(mode, pragmas, args.workers, args.seconds, args.write_ratio)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+In-process write-behind buffer.
+
+Small, frequent writes (login and logout events) are collected in memory
+and handed to a flush function in batches, so hundreds of requests share
+one transaction instead of each taking the database write lock. A batch is
+flushed once it holds `max_events` items or `flush_interval` seconds after
+its first item arrived, whichever comes first. Items still buffered when a
+process dies without stop() are lost, so only use it for data that can
+tolerate that.
+"""
+
+import atexit
+import os
+import threading
+import time
+
+
+class WriteBehindBuffer:
+    """Batches items for `flush_func(items)`, which runs inside an app context.
+
+    When disabled (or before init_app) every add() is flushed immediately on
+    the calling thread, which keeps tests and scripts synchronous.
+    """
+
+    def __init__(self, flush_func, max_events=100, flush_interval=0.5, enabled=True):
+        self.app = None
+        self.flush_func = flush_func
+        self.max_events = max_events
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self._items = []
+        self._first_at = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.stop)
+
+    def init_app(self, app, max_events=None, flush_interval=None, enabled=None):
+        self.app = app
+        if max_events is not None:
+            self.max_events = max_events
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+        if enabled is not None:
+            self.enabled = enabled
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, item):
+        if not self.enabled or self.app is None:
+            self._write([item])
+            return
+        with self._lock:
+            self._items.append(item)
+            first = self._first_at is None
+            if first:
+                self._first_at = time.monotonic()
+            full = len(self._items) >= self.max_events
+        self._ensure_thread()
+        if first or full:
+            # Wake the flush thread to start the timer or flush a full batch
+            self._wakeup.set()
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of items"""
+        with self._flush_lock:
+            with self._lock:
+                items, self._items, self._first_at = self._items, [], None
+            if items:
+                with self.app.app_context():
+                    self._write(items)
+            return len(items)
+
+    def stop(self, timeout=10):
+        """Stop the flush thread and drain the buffer"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self._thread = None
+        if self._items and self.app is not None:
+            self.flush()
+
+    def _write(self, items):
+        self.flush_func(items)
+
+    def _ensure_thread(self):
+        # Threads don't survive fork(), so a forked worker starts its own
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            first_at = self._first_at
+            if first_at is None:
+                timeout = None
+            else:
+                timeout = max(0.0, first_at + self.flush_interval - time.monotonic())
+            if timeout is None or timeout > 0:
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            first_at = self._first_at
+            if first_at is None:
+                continue
+            if len(self._items) >= self.max_events or time.monotonic() >= first_at + self.flush_interval:
+                try:
+                    self.flush()
+                except Exception:
+                    self.app.logger.exception('Write-behind flush failed')
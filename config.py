@@ -1,9 +1,11 @@
 import os
 from datetime import timedelta
 
+DEFAULT_SECRET_KEY = 'dev-secret-key-change-in-production'
+
 class Config:
     """Base configuration"""
-    SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
+    SECRET_KEY = os.environ.get('SECRET_KEY') or DEFAULT_SECRET_KEY
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     PERMANENT_SESSION_LIFETIME = timedelta(hours=8)
     SESSION_COOKIE_HTTPONLY = True
@@ -14,6 +16,100 @@ class Config:
     if not db_path:
         db_path = 'sqlite:///college_management.db'
     SQLALCHEMY_DATABASE_URI = db_path
+    
+    # Connection pool, per process (gunicorn runs one pool per worker)
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': 30,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+    }
+    
+    # Applied to every new SQLite connection (ignored for other databases).
+    # WAL lets readers run while a writer commits, busy_timeout makes
+    # writers wait for the lock instead of failing with "database is locked".
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # negative means KiB, so 64 MiB
+    }
+    
+    # Substitute assignment: 'balanced' (min-cost matching) or 'first_fit'
+    RESCHEDULING_STRATEGY = os.environ.get('RESCHEDULING_STRATEGY', 'balanced')
+    # Background rescheduling threads per process, 0 runs jobs inline
+    RESCHEDULING_WORKERS = int(os.environ.get('RESCHEDULING_WORKERS', 2))
+    RESCHEDULING_MAX_ATTEMPTS = 3
+    
+    # Login/logout events are written in batches of up to N events or after
+    # M milliseconds; unbuffered writes go straight to the database
+    LOGIN_LOG_BUFFERED = True
+    LOGIN_LOG_FLUSH_EVENTS = int(os.environ.get('LOGIN_LOG_FLUSH_EVENTS', 200))
+    LOGIN_LOG_FLUSH_MS = int(os.environ.get('LOGIN_LOG_FLUSH_MS', 500))
+    
+    # Rows older than this move to gzip NDJSON files under the archive
+    # directory (instance/archive by default), see `flask archive-login-logs`
+    LOGIN_LOG_RETENTION_DAYS = int(os.environ.get('LOGIN_LOG_RETENTION_DAYS', 90))
+    LOGIN_LOG_ARCHIVE_DIR = os.environ.get('LOGIN_LOG_ARCHIVE_DIR')
+    LOGIN_LOG_ARCHIVE_BATCH = 1000
+    
+    # Dashboard counters are served from memory and reloaded at least this
+    # often (seconds), which bounds staleness across worker processes
+    STATS_CACHE_TTL = int(os.environ.get('STATS_CACHE_TTL', 60))
+    # Leave analytics results per period; leave/substitution writes clear them
+    ANALYTICS_CACHE_TTL = int(os.environ.get('ANALYTICS_CACHE_TTL', 300))
+    
+    # Staff iCal feeds: rendered feeds are reused for this long (seconds);
+    # set a timezone name such as 'Asia/Kolkata' to stamp event times with it
+    CALENDAR_CACHE_TTL = int(os.environ.get('CALENDAR_CACHE_TTL', 300))
+    CALENDAR_TIMEZONE = os.environ.get('CALENDAR_TIMEZONE')
+    
+    # "Happening now" view: today's snapshot is fully rebuilt at least this
+    # often (seconds); display screens can authenticate with the token
+    LIVE_OCCUPANCY_TTL = int(os.environ.get('LIVE_OCCUPANCY_TTL', 60))
+    LIVE_OCCUPANCY_TOKEN = os.environ.get('LIVE_OCCUPANCY_TOKEN')
+    
+    # Staff notification streams (Server-Sent Events): how often each worker
+    # checks for new notifications (seconds), the keep-alive comment interval,
+    # how long a stream stays open before the browser reconnects, and how far
+    # a stream may fall behind before it is dropped
+    NOTIFICATION_POLL_INTERVAL = float(os.environ.get('NOTIFICATION_POLL_INTERVAL', 1.0))
+    NOTIFICATION_HEARTBEAT = int(os.environ.get('NOTIFICATION_HEARTBEAT', 25))
+    NOTIFICATION_STREAM_LIFETIME = int(os.environ.get('NOTIFICATION_STREAM_LIFETIME', 3600))
+    NOTIFICATION_QUEUE_SIZE = 100
+    # Set on the gevent service that serves only the streams (gunicorn.conf.py)
+    NOTIFICATION_STREAMS_ONLY = os.environ.get('NOTIFICATION_STREAMS_ONLY') == '1'
+    
+    # Change feed (/api/admin/changes): `flask compact-change-log` drops rows
+    # older than this many days that a later change to the same record supersedes
+    CHANGE_LOG_COMPACT_AFTER_DAYS = int(os.environ.get('CHANGE_LOG_COMPACT_AFTER_DAYS', 7))
+    CHANGE_LOG_COMPACT_BATCH = 5000
+    
+    # Timetable generator: the teaching week it fills, its default and
+    # largest time budget (seconds) and solver processes (0 uses every CPU).
+    # Generation runs as a background job on this many threads per process
+    # (0 runs it inline), and requests are limited to this many class hours
+    TIMETABLE_DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday')
+    TIMETABLE_PERIODS = (
+        '09:00-10:00', '10:00-11:00', '11:00-12:00', '12:00-13:00',
+        '14:00-15:00', '15:00-16:00', '16:00-17:00',
+    )
+    TIMETABLE_SOLVER_TIME_LIMIT = int(os.environ.get('TIMETABLE_SOLVER_TIME_LIMIT', 30))
+    TIMETABLE_SOLVER_MAX_TIME_LIMIT = 300
+    TIMETABLE_MAX_SESSIONS = 10000
+    TIMETABLE_SOLVER_PROCESSES = int(os.environ.get('TIMETABLE_SOLVER_PROCESSES', 0))
+    TIMETABLE_GENERATION_WORKERS = int(os.environ.get('TIMETABLE_GENERATION_WORKERS', 1))
+    TIMETABLE_GENERATION_MAX_ATTEMPTS = 2  # a retry when the timetable changed while solving
+    
+    # Request latency and SQL metrics at /api/admin/metrics (Prometheus format)
+    METRICS_ENABLED = True
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # lets a scraper in without an admin session
+    # Where each worker process writes its totals so any worker can report
+    # them all; unset keeps numbers per process (gunicorn.conf.py sets one)
+    METRICS_DIR = os.environ.get('METRICS_DIR')
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -24,11 +120,21 @@ class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     SESSION_COOKIE_SECURE = True
+    SQLALCHEMY_ENGINE_OPTIONS = dict(
+        Config.SQLALCHEMY_ENGINE_OPTIONS,
+        pool_size=int(os.environ.get('DB_POOL_SIZE', 3)),
+        max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 5)),
+    )
 
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}  # in-memory SQLite uses a single static connection
+    RESCHEDULING_WORKERS = 0
+    LOGIN_LOG_BUFFERED = False
+    TIMETABLE_SOLVER_PROCESSES = 1
+    TIMETABLE_GENERATION_WORKERS = 0
 
 config = {
     'development': DevelopmentConfig,
@@ -0,0 +1,84 @@
+"""
+Gunicorn settings: several worker processes sharing one database.
+
+The app is loaded once in the master (preload_app) and forked into the
+workers. Database connections and background threads must not cross a
+fork, so the master only runs the schema upgrade and then drops its
+connections, and every worker opens its own pool and starts its own job
+threads (rescheduling, timetable generation) after the fork.
+
+Workers are gthread workers: each request gets a thread of its own, so a
+slow request or a wait on the SQLite write lock only holds up that thread.
+
+Staff notification streams are long-lived requests that spend nearly all
+their time waiting, and each one would tie up a thread. They can be served
+by a second gunicorn service with GUNICORN_WORKER_CLASS=gevent, which keeps
+thousands of them open as greenlets. The proxy sends only
+/api/staff/notifications/stream there (see DEPLOYMENT.md). That service
+answers nothing else and runs no job threads, so nothing CPU-bound or
+blocking runs on its event loop.
+"""
+
+import multiprocessing
+import os
+import tempfile
+
+# Workers share request metrics through per-process files (see metrics.py);
+# set before the app is loaded so config.py picks it up
+os.environ.setdefault('METRICS_DIR', os.path.join(
+    tempfile.gettempdir(), f"college-scheduling-metrics-{os.environ.get('PORT', 5000)}"
+))
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+streams_only = worker_class == 'gevent'
+if streams_only:
+    # The app is preloaded before the workers patch the standard library,
+    # so patch now or its locks, events and queues would block the event loop
+    from gevent import monkey
+    monkey.patch_all()
+    os.environ.setdefault('NOTIFICATION_STREAMS_ONLY', '1')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))  # per gthread worker
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 2000))  # per gevent worker
+preload_app = True
+timeout = 60  # timetable generation runs as a background job, not in the request
+graceful_timeout = 30
+accesslog = '-'
+
+
+def when_ready(server):
+    from app import db, ensure_schema, request_metrics
+    from wsgi import app
+
+    request_metrics.clear_directory()  # numbers from a previous run of the server
+    with app.app_context():
+        applied = ensure_schema()
+        if applied:
+            server.log.info('Applied migrations: %s', applied)
+        db.engine.dispose()
+
+
+def post_fork(server, worker):
+    from app import db, generation_workers, reschedule_workers
+    from wsgi import app
+
+    with app.app_context():
+        # Forget any connections inherited from the master without closing
+        # them, they still belong to the parent process
+        db.engine.dispose(close=False)
+    if not streams_only:
+        # Jobs are claimed from the database, the web service's workers run them all
+        reschedule_workers.start()
+        generation_workers.start()
+
+
+def worker_exit(server, worker):
+    from app import generation_workers, login_events, notification_broker, request_metrics, reschedule_workers
+
+    reschedule_workers.stop()
+    generation_workers.stop()
+    login_events.stop()
+    notification_broker.stop()
+    request_metrics.stop()
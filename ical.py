@@ -0,0 +1,84 @@
+"""
+Minimal iCalendar (RFC 5545) writer for the staff calendar feeds.
+
+Only what the feeds need: VEVENTs with weekly recurrence rules, excluded
+dates and one-off events. Times are written as local times, either
+floating or with a TZID when a timezone name is configured.
+"""
+
+WEEKDAY_CODES = {
+    'monday': 'MO', 'tuesday': 'TU', 'wednesday': 'WE', 'thursday': 'TH',
+    'friday': 'FR', 'saturday': 'SA', 'sunday': 'SU',
+}
+
+
+def escape_text(value):
+    return (str(value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold(line):
+    """Split a content line into 75-octet pieces joined by CRLF + space"""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line
+    parts = []
+    while len(data) > 75:
+        cut = 75 if not parts else 74
+        # Don't split inside a multi-byte UTF-8 sequence
+        while cut > 0 and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(data[:cut].decode('utf-8'))
+        data = data[cut:]
+    parts.append(data.decode('utf-8'))
+    return '\r\n '.join(parts)
+
+
+class Calendar:
+    def __init__(self, name, timezone=None, product_id='-//College Scheduling System//Timetable//EN'):
+        self.name = name
+        self.timezone = timezone
+        self.product_id = product_id
+        self.events = []
+
+    def _time(self, prop, value):
+        text = value.strftime('%Y%m%dT%H%M%S')
+        return f'{prop};TZID={self.timezone}:{text}' if self.timezone else f'{prop}:{text}'
+
+    def add_event(self, uid, start, end, summary, stamp, location=None, description=None,
+                  weekly_on=None, exdates=()):
+        """Add an event; weekly_on (a weekday name) makes it repeat every week"""
+        lines = [
+            'BEGIN:VEVENT',
+            f'UID:{uid}',
+            f'DTSTAMP:{stamp.strftime("%Y%m%dT%H%M%SZ")}',
+            self._time('DTSTART', start),
+            self._time('DTEND', end),
+            f'SUMMARY:{escape_text(summary)}',
+        ]
+        if location:
+            lines.append(f'LOCATION:{escape_text(location)}')
+        if description:
+            lines.append(f'DESCRIPTION:{escape_text(description)}')
+        if weekly_on:
+            lines.append(f'RRULE:FREQ=WEEKLY;BYDAY={WEEKDAY_CODES[weekly_on.lower()]}')
+        for exdate in sorted(exdates):
+            lines.append(self._time('EXDATE', exdate))
+        lines.append('END:VEVENT')
+        self.events.append(lines)
+
+    def render(self):
+        lines = [
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            f'PRODID:{self.product_id}',
+            'CALSCALE:GREGORIAN',
+            'METHOD:PUBLISH',
+            f'X-WR-CALNAME:{escape_text(self.name)}',
+        ]
+        if self.timezone:
+            lines.append(f'X-WR-TIMEZONE:{self.timezone}')
+        for event in self.events:
+            lines.extend(event)
+        lines.append('END:VCALENDAR')
+        return '\r\n'.join(fold(line) for line in lines) + '\r\n'
@@ -0,0 +1,142 @@
+"""
+Time slot parsing and an in-memory interval index.
+
+Timetable slots are stored as integer minutes since midnight
+([start_minute, end_minute), end exclusive). IntervalIndex keeps one sorted
+list of intervals per key, so overlap and point-in-time lookups cost a
+binary search plus the number of matches instead of a scan.
+"""
+
+import re
+from bisect import bisect_left, bisect_right, insort
+
+MINUTES_PER_DAY = 24 * 60
+
+_TIME = r'(\d{1,2})(?:[:.](\d{2}))?\s*([ap]\.?m\.?)?'
+_SLOT_RE = re.compile(rf'^\s*{_TIME}\s*(?:-|–|—|to)\s*{_TIME}\s*$', re.IGNORECASE)
+
+
+def _to_minutes(hours, minutes, meridiem):
+    hours = int(hours)
+    minutes = int(minutes or 0)
+    if meridiem:
+        if not 1 <= hours <= 12:
+            raise ValueError('Hour out of range for 12-hour time')
+        hours = hours % 12 + (12 if meridiem.lower().startswith('p') else 0)
+    if hours > 24 or minutes > 59 or (hours == 24 and minutes):
+        raise ValueError('Time out of range')
+    return hours * 60 + minutes
+
+
+def parse_time_slot(text):
+    """Parse "09:00-10:30" (also "9-10:30", "9:00 am to 10:30 am") into minutes.
+
+    Raises ValueError if the slot can't be parsed or doesn't end after it starts.
+    """
+    match = _SLOT_RE.match(text or '')
+    if not match:
+        raise ValueError(f'Invalid time slot: {text!r}, expected HH:MM-HH:MM')
+    start_h, start_m, start_ampm, end_h, end_m, end_ampm = match.groups()
+    end = _to_minutes(end_h, end_m, end_ampm)
+    start = _to_minutes(start_h, start_m, start_ampm)
+    if end_ampm and not start_ampm and 1 <= int(start_h) <= 12:
+        # "10-11 am" shares the meridiem, "11-1 pm" starts in the morning
+        start = _to_minutes(start_h, start_m, end_ampm)
+        if start >= end:
+            start = _to_minutes(start_h, start_m, 'am')
+    if end <= start:
+        raise ValueError(f'Invalid time slot: {text!r}, end must be after start')
+    return start, end
+
+
+def parse_time(text):
+    """Parse "10:15" into minutes since midnight"""
+    match = re.match(rf'^\s*{_TIME}\s*$', text or '', re.IGNORECASE)
+    if not match:
+        raise ValueError(f'Invalid time: {text!r}, expected HH:MM')
+    return _to_minutes(*match.groups())
+
+
+def format_minutes(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def format_time_slot(start, end):
+    return f'{format_minutes(start)}-{format_minutes(end)}'
+
+
+def overlaps(a_start, a_end, b_start, b_end):
+    return a_start < b_end and b_start < a_end
+
+
+class IntervalIndex:
+    """Half-open intervals grouped by key, each carrying an item id.
+
+    Each key keeps its intervals sorted by start together with the longest
+    interval length, which bounds how far left an overlapping interval can
+    start. Removal does not shrink that bound, it only makes later lookups
+    look a little further left.
+    """
+
+    def __init__(self):
+        self._intervals = {}  # key -> sorted [(start, end, item)]
+        self._longest = {}    # key -> longest interval length seen
+
+    def add(self, key, start, end, item):
+        insort(self._intervals.setdefault(key, []), (start, end, item))
+        self._longest[key] = max(self._longest.get(key, 0), end - start)
+
+    def remove(self, key, start, end, item):
+        intervals = self._intervals.get(key)
+        if not intervals:
+            return
+        i = bisect_left(intervals, (start, end, item))
+        if i < len(intervals) and intervals[i] == (start, end, item):
+            del intervals[i]
+            if not intervals:
+                del self._intervals[key]
+                del self._longest[key]
+
+    def overlapping(self, key, start, end):
+        """Yield (start, end, item) for intervals overlapping [start, end)"""
+        intervals = self._intervals.get(key)
+        if not intervals:
+            return
+        lo = bisect_right(intervals, (start - self._longest[key],))
+        hi = bisect_left(intervals, (end,))
+        for i in range(lo, hi):
+            interval = intervals[i]
+            if interval[1] > start:
+                yield interval
+
+    def at(self, key, minute):
+        """Yield intervals containing the given minute"""
+        return self.overlapping(key, minute, minute + 1)
+
+    def overlapping_groups(self, key):
+        """Yield lists of items whose intervals under key overlap in a chain.
+
+        A single sweep over the already sorted list, so checking every key
+        is linear in the number of intervals.
+        """
+        group, group_end = [], None
+        for start, end, item in self._intervals.get(key, ()):
+            if group_end is not None and start < group_end:
+                group.append(item)
+                group_end = max(group_end, end)
+                continue
+            if len(group) > 1:
+                yield group
+            group, group_end = [item], end
+        if len(group) > 1:
+            yield group
+
+    def items(self, key):
+        return [item for _, _, item in self._intervals.get(key, ())]
+
+    def keys(self):
+        return self._intervals.keys()
+
+    def clear(self):
+        self._intervals.clear()
+        self._longest.clear()
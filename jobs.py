@@ -0,0 +1,151 @@
+"""
+Local background job queue backed by a database table.
+
+Jobs are rows in the table of the model passed to JobWorkerPool. Workers
+claim a queued row with a conditional UPDATE, so several threads (or
+several server processes sharing the same database) never run the same
+job twice. Failed jobs are retried with exponential backoff until
+max_attempts is reached.
+"""
+
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+class JobWorkerPool:
+    """Runs queued jobs on a pool of daemon threads.
+
+    `model` needs the columns status, attempts, max_attempts, result, error,
+    available_at, started_at and finished_at. `handler(job)` does the work
+    and returns a JSON-serializable result; it runs inside an app context.
+    """
+
+    def __init__(self, db, model, handler, workers=2, poll_interval=2.0,
+                 retry_delay=5.0, stale_after=timedelta(minutes=10)):
+        self.app = None
+        self.db = db
+        self.model = model
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.stale_after = stale_after
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def init_app(self, app, workers=None):
+        self.app = app
+        if workers is not None:
+            self.workers = workers
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        """Start the worker threads; call after forking, threads don't survive fork()"""
+        if self.running or self.workers <= 0:
+            return
+        self._stopping.clear()
+        with self.app.app_context():
+            self.requeue_stale()
+        self._threads = [
+            threading.Thread(target=self._work, name=f'job-worker-{n}', daemon=True)
+            for n in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=10):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """Wake idle workers after a job was queued"""
+        self._wakeup.set()
+
+    def requeue_stale(self):
+        """Put back jobs left running by a worker that died"""
+        model = self.model
+        cutoff = datetime.utcnow() - self.stale_after
+        model.query.filter(model.status == RUNNING, model.started_at < cutoff).update(
+            {'status': QUEUED, 'available_at': datetime.utcnow()}, synchronize_session=False
+        )
+        self.db.session.commit()
+
+    def claim(self):
+        """Atomically move the oldest due job from queued to running"""
+        model = self.model
+        session = self.db.session
+        while True:
+            job_id = session.query(model.id).filter(
+                model.status == QUEUED, model.available_at <= datetime.utcnow()
+            ).order_by(model.id).limit(1).scalar()
+            if job_id is None:
+                session.rollback()
+                return None
+            claimed = model.query.filter(model.id == job_id, model.status == QUEUED).update({
+                'status': RUNNING,
+                'attempts': model.attempts + 1,
+                'started_at': datetime.utcnow()
+            }, synchronize_session=False)
+            session.commit()
+            if claimed:
+                return session.get(model, job_id)
+
+    def run(self, job):
+        """Run one claimed job and record the outcome"""
+        session = self.db.session
+        try:
+            result = self.handler(job)
+        except Exception as e:
+            session.rollback()
+            job = session.get(self.model, job.id)
+            job.error = f'{type(e).__name__}: {e}'
+            if job.attempts < job.max_attempts:
+                job.status = QUEUED
+                job.available_at = datetime.utcnow() + timedelta(seconds=self.retry_delay * 2 ** (job.attempts - 1))
+            else:
+                job.status = FAILED
+                job.finished_at = datetime.utcnow()
+                self.app.logger.error('Job %s failed permanently:\n%s', job.id, traceback.format_exc())
+        else:
+            job.status = DONE
+            job.result = result
+            job.error = None
+            job.finished_at = datetime.utcnow()
+        session.commit()
+        return job
+
+    def run_pending(self):
+        """Drain the queue on the calling thread; used when no workers run"""
+        processed = 0
+        while True:
+            job = self.claim()
+            if job is None:
+                return processed
+            self.run(job)
+            processed += 1
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    processed = self.run_pending()
+            except Exception:
+                self.app.logger.exception('Job worker error')
+                processed = 0
+            if not processed:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
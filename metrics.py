@@ -0,0 +1,331 @@
+"""
+Per-endpoint request latency and SQL query metrics.
+
+RequestMetrics times every request and, through SQLAlchemy cursor events,
+counts the statements each request runs and the time spent in them. The
+totals are kept per endpoint in memory and rendered in the Prometheus text
+exposition format. Requests slower than the configured threshold are
+logged with their slowest statements.
+
+Each worker process keeps its own numbers in memory. With a metrics
+directory configured (gunicorn.conf.py sets one), every process also
+writes its cumulative totals to its own file there about once a second and
+when it exits, and a scrape adds up all the files. Files of workers that
+have exited are kept, so counters never go backwards when gunicorn
+replaces a worker; the directory is cleared when the server starts.
+"""
+
+import atexit
+import glob
+import heapq
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds of the statements-per-request histogram buckets
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+SLOWEST_STATEMENTS = 3
+STATEMENT_PREVIEW = 200
+
+
+class _RequestStats:
+    __slots__ = ('started', 'queries', 'query_time', 'slowest', '_query_started')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self.slowest = []  # min-heap of (duration, statement)
+        self._query_started = None
+
+
+class _EndpointStats:
+    __slots__ = ('requests', 'errors', 'latency_sum', 'latency_buckets', 'queries', 'query_time',
+                 'query_buckets', 'slow')
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.queries = 0
+        self.query_time = 0.0
+        self.query_buckets = [0] * len(QUERY_COUNT_BUCKETS)
+        self.slow = 0
+
+
+def _observe(buckets, bounds, value):
+    for i, bound in enumerate(bounds):
+        if value <= bound:
+            buckets[i] += 1
+            return
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestMetrics:
+    """Collects metrics for an app and the engine of its SQLAlchemy db"""
+
+    def __init__(self, slow_request_ms=500, recent_slow=50, directory=None, write_interval=1.0):
+        self.slow_request_ms = slow_request_ms
+        self.endpoints = {}
+        self.recent_slow = deque(maxlen=recent_slow)
+        self.directory = directory
+        self.write_interval = write_interval
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._filename = None
+        atexit.register(self.stop)
+
+    def init_app(self, app, db, slow_request_ms=None, directory=None):
+        if slow_request_ms is not None:
+            self.slow_request_ms = slow_request_ms
+        if directory is not None:
+            self.directory = directory
+            os.makedirs(directory, exist_ok=True)
+        self.logger = app.logger
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(db.engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def reset(self):
+        with self._lock:
+            self.endpoints.clear()
+            self.recent_slow.clear()
+
+    def clear_directory(self):
+        """Remove every process's file, e.g. when the server (re)starts"""
+        for path in glob.glob(os.path.join(self.directory, '*.json')) if self.directory else ():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # Request hooks
+    def _before_request(self):
+        g._request_stats = _RequestStats()
+
+    def _after_request(self, response):
+        stats = g.pop('_request_stats', None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        endpoint = request.endpoint or 'unmatched'
+        slow = elapsed * 1000 >= self.slow_request_ms
+        if self.directory and self._pid != os.getpid():
+            self._start_process()
+
+        with self._lock:
+            totals = self.endpoints.get(endpoint)
+            if totals is None:
+                totals = self.endpoints[endpoint] = _EndpointStats()
+            totals.requests += 1
+            totals.latency_sum += elapsed
+            _observe(totals.latency_buckets, LATENCY_BUCKETS, elapsed)
+            totals.queries += stats.queries
+            totals.query_time += stats.query_time
+            _observe(totals.query_buckets, QUERY_COUNT_BUCKETS, stats.queries)
+            if response.status_code >= 500:
+                totals.errors += 1
+            if slow:
+                totals.slow += 1
+        if self.directory:
+            self._dirty.set()
+            self._ensure_writer()
+
+        if slow:
+            slowest = sorted(stats.slowest, reverse=True)
+            self.recent_slow.append({
+                'endpoint': endpoint,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'at': datetime.utcnow().isoformat(timespec='milliseconds'),
+                'ms': round(elapsed * 1000, 1),
+                'queries': stats.queries,
+                'query_ms': round(stats.query_time * 1000, 1),
+                'slowest': [{'ms': round(d * 1000, 1), 'sql': sql} for d, sql in slowest],
+            })
+            self.logger.warning(
+                'Slow request %s %s: %.0f ms, %d queries (%.0f ms)%s',
+                request.method, request.path, elapsed * 1000, stats.queries, stats.query_time * 1000,
+                ''.join(f'\n  {d * 1000:.1f} ms  {sql}' for d, sql in slowest)
+            )
+        return response
+
+    # SQLAlchemy cursor events; statements outside a request are ignored
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stats = g.get('_request_stats') if has_app_context() else None
+        if stats is not None:
+            stats._query_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stats = g.get('_request_stats') if has_app_context() else None
+        if stats is None or stats._query_started is None:
+            return
+        duration = time.perf_counter() - stats._query_started
+        stats._query_started = None
+        stats.queries += 1
+        stats.query_time += duration
+        entry = (duration, ' '.join(statement.split())[:STATEMENT_PREVIEW])
+        if len(stats.slowest) < SLOWEST_STATEMENTS:
+            heapq.heappush(stats.slowest, entry)
+        elif duration > stats.slowest[0][0]:
+            heapq.heapreplace(stats.slowest, entry)
+
+    # Per-process files
+    def _start_process(self):
+        """Start a file of our own; numbers inherited through a fork are the parent's"""
+        self.reset()
+        self._filename = f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json'  # never reuses a dead worker's file
+        self._pid = os.getpid()
+
+    def write(self):
+        """Write this process's totals to its file, replacing the previous ones atomically"""
+        if not self.directory or self._pid != os.getpid():
+            return
+        self._dirty.clear()
+        path = os.path.join(self.directory, self._filename)
+        with self._lock:
+            data = {
+                'endpoints': {name: _to_dict(stats) for name, stats in self.endpoints.items()},
+                'recent_slow': list(self.recent_slow),
+            }
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(data, f)
+        os.replace(temporary, path)
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='metrics-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._dirty.wait()
+            self._stopping.wait(self.write_interval)
+            try:
+                self.write()
+            except OSError:
+                self.logger.exception('Writing metrics failed')
+
+    def stop(self):
+        """Write the final totals, e.g. when a worker exits"""
+        self._stopping.set()
+        self._dirty.set()
+        try:
+            self.write()
+        except OSError:
+            pass
+
+    def _other_processes(self):
+        own = self._filename if self._pid == os.getpid() else None
+        for path in glob.glob(os.path.join(self.directory, '*.json')) if self.directory else ():
+            if os.path.basename(path) == own:
+                continue
+            try:
+                with open(path) as f:
+                    yield json.load(f)
+            except (OSError, ValueError):
+                continue
+
+    def collect(self):
+        """Totals per endpoint over all processes, this one read from memory"""
+        with self._lock:
+            totals = {name: _copy(stats) for name, stats in self.endpoints.items()}
+        for data in self._other_processes():
+            for name, values in data['endpoints'].items():
+                _add(totals.setdefault(name, _EndpointStats()), values)
+        return totals
+
+    def slow_requests(self):
+        """The most recent slow requests over all processes, newest first"""
+        with self._lock:
+            entries = list(self.recent_slow)
+        for data in self._other_processes():
+            entries.extend(data['recent_slow'])
+        entries.sort(key=lambda entry: entry.get('at', ''), reverse=True)
+        return entries[:self.recent_slow.maxlen]
+
+    # Exposition
+    def render_prometheus(self):
+        """Return all metrics in the Prometheus text format (version 0.0.4)"""
+        snapshot = sorted(self.collect().items())
+
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+
+        def histogram(name, help_text, bounds, get_buckets, get_sum):
+            samples = []
+            for endpoint, stats in snapshot:
+                label = f'endpoint="{_escape(endpoint)}"'
+                cumulative = 0
+                for bound, count in zip(bounds, get_buckets(stats)):
+                    cumulative += count
+                    samples.append(f'{name}_bucket{{{label},le="{bound:g}"}} {cumulative}')
+                samples.append(f'{name}_bucket{{{label},le="+Inf"}} {stats.requests}')
+                samples.append(f'{name}_sum{{{label}}} {get_sum(stats):.6f}')
+                samples.append(f'{name}_count{{{label}}} {stats.requests}')
+            family(name, 'histogram', help_text, samples)
+
+        def counter(name, help_text, get_value):
+            family(name, 'counter', help_text, [
+                f'{name}{{endpoint="{_escape(endpoint)}"}} {get_value(stats)}' for endpoint, stats in snapshot
+            ])
+
+        histogram('http_request_duration_seconds', 'Request latency by endpoint.',
+                  LATENCY_BUCKETS, lambda s: s.latency_buckets, lambda s: s.latency_sum)
+        histogram('http_request_sql_queries', 'SQL statements per request by endpoint.',
+                  QUERY_COUNT_BUCKETS, lambda s: s.query_buckets, lambda s: s.queries)
+        counter('http_request_sql_seconds_total', 'Time spent executing SQL by endpoint.',
+                lambda s: f'{s.query_time:.6f}')
+        counter('http_request_errors_total', 'Responses with a 5xx status by endpoint.', lambda s: s.errors)
+        counter('http_slow_requests_total', f'Requests slower than {self.slow_request_ms} ms by endpoint.',
+                lambda s: s.slow)
+        return '\n'.join(lines) + '\n'
+
+
+def _copy(stats):
+    copy = _EndpointStats()
+    for name in _EndpointStats.__slots__:
+        value = getattr(stats, name)
+        setattr(copy, name, list(value) if isinstance(value, list) else value)
+    return copy
+
+
+def _to_dict(stats):
+    return {name: getattr(stats, name) for name in _EndpointStats.__slots__}
+
+
+def _add(stats, values):
+    for name in _EndpointStats.__slots__:
+        value = values.get(name)
+        if isinstance(value, list):
+            setattr(stats, name, [a + b for a, b in zip(getattr(stats, name), value)])
+        elif value is not None:
+            setattr(stats, name, getattr(stats, name) + value)
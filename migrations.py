@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for an existing database.
+
+db.create_all() only creates missing tables, it never changes tables that
+already exist. Each migration below makes one such change, is safe to
+re-run (it checks the current schema first) and is recorded in the
+schema_migrations table once applied, so upgrading a live database never
+requires dropping it.
+
+Run pending migrations with:  flask --app app upgrade-db
+                          or:  python migrations.py
+"""
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from intervals import format_time_slot, parse_time_slot
+from rooms import parse_facilities
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register a migration function taking (conn, metadata)"""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+
+def _columns(conn, table):
+    return {column['name'] for column in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn, table, column, column_type):
+    if column not in _columns(conn, table):
+        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {column_type}'))
+        return True
+    return False
+
+
+def _create_indexes(conn, metadata, names):
+    """Create the named indexes as declared on the models, skipping existing ones"""
+    for table in metadata.tables.values():
+        for index in table.indexes:
+            if index.name in names:
+                index.create(conn, checkfirst=True)
+
+
+@migration(1, 'Add timetable.classroom_id')
+def add_timetable_classroom(conn, metadata):
+    _add_column(conn, 'timetable', 'classroom_id', 'INTEGER REFERENCES classroom (id)')
+
+
+@migration(2, 'Add leave.end_date for multi-day leave')
+def add_leave_end_date(conn, metadata):
+    _add_column(conn, 'leave', 'end_date', 'DATE')
+
+
+@migration(3, 'Store timetable slots as start/end minutes')
+def add_timetable_minutes(conn, metadata):
+    _add_column(conn, 'timetable', 'start_minute', 'INTEGER')
+    _add_column(conn, 'timetable', 'end_minute', 'INTEGER')
+
+    updates = []
+    rows = conn.execute(text('SELECT id, time_slot FROM timetable WHERE start_minute IS NULL'))
+    for entry_id, time_slot in rows:
+        try:
+            start, end = parse_time_slot(time_slot)
+        except ValueError:
+            logger.warning('Timetable entry %s has an unparseable time slot %r', entry_id, time_slot)
+            continue
+        updates.append({'id': entry_id, 'start': start, 'end': end, 'slot': format_time_slot(start, end)})
+    if updates:
+        conn.execute(text(
+            'UPDATE timetable SET start_minute = :start, end_minute = :end, time_slot = :slot WHERE id = :id'
+        ), updates)
+
+
+@migration(4, 'Add composite indexes for timetable, leave, rescheduling and login lookups')
+def add_hot_path_indexes(conn, metadata):
+    _create_indexes(conn, metadata, {
+        'ix_timetable_staff_day_slot',
+        'ix_timetable_day_start',
+        'ix_leave_status',
+        'ix_leave_staff_applied',
+        'ix_class_rescheduling_timetable_leave',
+        'ix_class_rescheduling_leave',
+        'ix_login_log_staff_status_time',
+        'ix_login_log_admin_status_time',
+        'ix_login_log_login_time',
+    })
+
+
+@migration(5, 'Add login_log.session_key for buffered login/logout writes')
+def add_login_log_session_key(conn, metadata):
+    _add_column(conn, 'login_log', 'session_key', 'VARCHAR(32)')
+    _create_indexes(conn, metadata, {'ix_login_log_session_key'})
+
+
+@migration(6, 'Add staff.calendar_token for iCal feeds')
+def add_staff_calendar_token(conn, metadata):
+    _add_column(conn, 'staff', 'calendar_token', 'VARCHAR(64)')
+    _create_indexes(conn, metadata, {'ix_staff_calendar_token'})
+
+
+@migration(7, 'Split classroom.facilities into indexed classroom_facility tags')
+def add_classroom_facility_tags(conn, metadata):
+    # The table itself is created by create_all; fill it from the text column
+    existing = set(conn.execute(text('SELECT classroom_id, tag FROM classroom_facility')))
+    rows = [
+        {'classroom_id': classroom_id, 'tag': tag}
+        for classroom_id, facilities in conn.execute(text('SELECT id, facilities FROM classroom'))
+        for tag in sorted(parse_facilities(facilities or ''))
+        if (classroom_id, tag) not in existing
+    ]
+    if rows:
+        conn.execute(text('INSERT INTO classroom_facility (classroom_id, tag) VALUES (:classroom_id, :tag)'), rows)
+
+
+@migration(8, 'Add cache_version rows and a unique index on timetable (day, staff_id, time_slot)')
+def add_timetable_unique_slot(conn, metadata):
+    # create_all made the table; seed the rows (writers lock 'timetable' before changing it)
+    existing = {name for (name,) in conn.execute(text('SELECT name FROM cache_version'))}
+    for name in ('timetable', 'classroom'):
+        if name not in existing:
+            conn.execute(text('INSERT INTO cache_version (name, version) VALUES (:name, 0)'), {'name': name})
+    duplicates = conn.execute(text(
+        'SELECT day, staff_id, time_slot FROM timetable '
+        'GROUP BY day, staff_id, time_slot HAVING COUNT(*) > 1'
+    )).fetchall()
+    if duplicates:
+        logger.warning(
+            'Timetable has %s double-booked (day, staff, slot) groups, e.g. %s; '
+            'resolve them (see /api/admin/timetable/conflicts) and upgrade again',
+            len(duplicates), tuple(duplicates[0])
+        )
+        return False
+    _create_indexes(conn, metadata, {'uq_timetable_day_staff_slot'})
+
+
+@migration(9, 'Make class_rescheduling (original_timetable_id, leave_id) unique')
+def add_class_rescheduling_unique(conn, metadata):
+    # Concurrent rescheduling runs could assign a class twice; keep the first assignment
+    removed = conn.execute(text(
+        'DELETE FROM class_rescheduling WHERE id NOT IN ('
+        'SELECT MIN(id) FROM class_rescheduling GROUP BY original_timetable_id, leave_id)'
+    )).rowcount
+    if removed:
+        logger.warning('Removed %s duplicate class rescheduling rows', removed)
+    # The unique index replaces the plain one from migration 4
+    if 'ix_class_rescheduling_timetable_leave' in {index['name'] for index in inspect(conn).get_indexes('class_rescheduling')}:
+        conn.execute(text('DROP INDEX ix_class_rescheduling_timetable_leave'))
+    _create_indexes(conn, metadata, {'uq_class_rescheduling_timetable_leave'})
+
+
+@migration(10, 'Add the cache_version row that serialises change log writers')
+def add_change_log_lock_row(conn, metadata):
+    # Locked just before commit by transactions writing the change log, on databases other than SQLite (see lock_change_log)
+    if not conn.execute(text("SELECT 1 FROM cache_version WHERE name = 'change_log'")).first():
+        conn.execute(text("INSERT INTO cache_version (name, version) VALUES ('change_log', 0)"))
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        'version INTEGER PRIMARY KEY, description VARCHAR(200), applied_at DATETIME)'
+    ))
+
+
+def applied_versions(engine):
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        return {row[0] for row in conn.execute(text('SELECT version FROM schema_migrations'))}
+
+
+def pending_migrations(engine):
+    applied = applied_versions(engine)
+    return [(version, description) for version, description, _ in MIGRATIONS if version not in applied]
+
+
+def upgrade(engine, metadata, target=None):
+    """Create missing tables, then apply pending migrations in order.
+
+    Each migration runs in its own transaction together with its
+    schema_migrations row. A migration that returns False could not be
+    applied yet (e.g. existing data must be fixed first); its changes so far
+    are kept but it is not recorded, and the later migrations are held back
+    so they never run before it. The next upgrade retries from there.
+    Returns the list of versions applied.
+    """
+    metadata.create_all(engine)
+    applied = applied_versions(engine)
+    done = []
+    for version, description, func in MIGRATIONS:
+        if version in applied or (target is not None and version > target):
+            continue
+        with engine.begin() as conn:
+            if func(conn, metadata) is False:
+                held_back = [v for v, _, _ in MIGRATIONS if v > version and (target is None or v <= target)]
+                logger.warning('Migration %s (%s) is not applied yet; holding back later migrations %s',
+                               version, description, held_back)
+                break
+            conn.execute(
+                text('INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)'),
+                {'v': version, 'd': description, 't': datetime.utcnow()}
+            )
+        logger.info('Applied migration %s: %s', version, description)
+        done.append(version)
+    return done
+
+
+if __name__ == '__main__':
+    from app import create_app, db
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    app = create_app()
+    with app.app_context():
+        applied = upgrade(db.engine, db.metadata)
+    print(f'Applied {len(applied)} migration(s)' if applied else 'Database is up to date')
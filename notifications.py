@@ -0,0 +1,150 @@
+"""
+Fan-out of per-staff notifications to Server-Sent Event streams.
+
+Notifications are rows in a table, written in the same transaction as the
+change they announce. Each worker process runs one NotificationBroker: a
+single background thread polls the table for rows newer than the last one
+it has seen and hands each row to the in-memory queues of the streams open
+for that staff member. However many streams are connected, a process runs
+one indexed query per poll interval, and none while nobody is connected.
+Commits in the same process wake the poller at once, so their events don't
+wait for the interval; other processes see them on their next poll.
+
+A stream that stops reading is dropped once its queue fills up; the
+browser reconnects with Last-Event-ID and the route replays what it missed
+from the table.
+"""
+
+import atexit
+import os
+import queue
+import threading
+
+
+class Subscription:
+    def __init__(self, staff_id, max_queue):
+        self.staff_id = staff_id
+        self.queue = queue.Queue(max_queue)
+        self.closed = False
+
+    def get(self, timeout):
+        """Next (id, event) for this stream, or None after `timeout` seconds"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class NotificationBroker:
+    """Polls `fetch_func(after_id, limit)` -> [(id, staff_id, event)] and fans rows out.
+
+    `latest_func()` returns the newest id when the first stream subscribes,
+    so a fresh process does not replay old rows.
+    """
+
+    def __init__(self, fetch_func, latest_func, poll_interval=1.0, max_queue=100, batch_size=500):
+        self.app = None
+        self.fetch_func = fetch_func
+        self.latest_func = latest_func
+        self.poll_interval = poll_interval
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self._subscribers = {}  # staff_id -> {Subscription}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.last_id = None
+        atexit.register(self.stop)
+
+    def init_app(self, app, poll_interval=None, max_queue=None):
+        self.stop()
+        self.app = app
+        self.last_id = None
+        if poll_interval is not None:
+            self.poll_interval = poll_interval
+        if max_queue is not None:
+            self.max_queue = max_queue
+
+    def subscribe(self, staff_id):
+        """Register a stream; call inside an app context, before replaying missed rows"""
+        if self.last_id is None:
+            # Read here rather than in the poller, so no row committed between
+            # the caller's replay and the poller's first query is lost
+            self.last_id = self.latest_func() or 0
+        subscription = Subscription(staff_id, self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(staff_id, set()).add(subscription)
+        self._ensure_thread()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.closed = True
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.staff_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.staff_id]
+
+    def connections(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def notify(self):
+        """Poll now, e.g. after committing new notifications"""
+        self._wakeup.set()
+
+    def publish(self, rows):
+        """Hand (id, staff_id, event) rows to the subscribed streams"""
+        with self._lock:
+            for row_id, staff_id, event in rows:
+                for subscription in list(self._subscribers.get(staff_id, ())):
+                    try:
+                        subscription.queue.put_nowait((row_id, event))
+                    except queue.Full:
+                        # Too slow to keep up; it reconnects and replays from the table
+                        subscription.closed = True
+                        self._subscribers[staff_id].discard(subscription)
+                if not self._subscribers.get(staff_id, True):
+                    del self._subscribers[staff_id]
+
+    # Poller thread, one per process
+    def _ensure_thread(self):
+        if self.app is None:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='notification-broker', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stopping.is_set():
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                with self._lock:
+                    idle = not self._subscribers
+                if idle:
+                    continue
+                try:
+                    rows = self.fetch_func(self.last_id, self.batch_size)
+                except Exception:
+                    self.app.logger.exception('Polling notifications failed')
+                    continue
+                if rows:
+                    self.last_id = rows[-1][0]
+                    self.publish(rows)
+                    if len(rows) == self.batch_size:
+                        self._wakeup.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout=5)
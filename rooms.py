@@ -0,0 +1,170 @@
+"""
+Weekly room occupancy bitmaps and facility tags for the free-room search.
+
+Each room's week is a Python int used as a bitmap with one bit per
+SLOT_MINUTES-minute slot (7 days x 288 slots = 2016 bits). A class sets
+the bits of the slots it touches, so a room is free for a requested slot
+when its bitmap ANDed with the slot's mask is zero: one integer operation
+per room. Facility tags map to sets of room ids and capacities are kept
+sorted, so candidates are narrowed by set intersection and bisection
+before any bitmap is looked at.
+"""
+
+import threading
+from bisect import bisect_left
+
+SLOT_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+DAY_MASK = (1 << SLOTS_PER_DAY) - 1
+DAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+DAY_INDEX = {day: i for i, day in enumerate(DAYS)}
+
+
+def parse_facilities(value):
+    """"Projector, AC" or ["Projector", "AC"] as a set of lowercase tags"""
+    items = value.split(',') if isinstance(value, str) else (value or [])
+    return frozenset(' '.join(str(item).split()).lower() for item in items if str(item).strip())
+
+
+def slot_mask(day_index, start, end):
+    """Bits of the slots overlapping [start, end) minutes on the given day"""
+    first = start // SLOT_MINUTES
+    last = -(-end // SLOT_MINUTES)  # slots are rounded outwards
+    return ((1 << (last - first)) - 1) << (day_index * SLOTS_PER_DAY + first)
+
+
+class RoomAvailabilityIndex:
+    """Per-room occupancy bitmaps plus tag and capacity indexes.
+
+    Filled by load() with the active rooms and the timetable entries, then
+    kept current entry by entry with set_entry() and remove_entry().
+    `version` labels the data it was loaded from, for the caller to compare.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.version = None
+        self._clear()
+
+    def _clear(self):
+        self.rooms = {}  # room_id -> dict of room details
+        self.by_number = {}  # lowercase room_number -> room_id
+        self.by_tag = {}  # tag -> {room_id}
+        self.by_capacity = []  # sorted [(capacity, room_id)]
+        self.bitmaps = {}  # room_id -> occupancy bitmap
+        self.room_entries = {}  # room_id -> {entry_id: mask}
+        self.entries = {}  # entry_id -> (room_id, mask)
+
+    def load(self, rooms, entries, version=None):
+        """rooms: (id, room_number, room_name, capacity, building, floor, tags);
+        entries: (entry_id, classroom_id, room, day, start_minute, end_minute)"""
+        with self._lock:
+            self._clear()
+            for room_id, number, name, capacity, building, floor, tags in rooms:
+                self.rooms[room_id] = {
+                    'id': room_id,
+                    'room_number': number,
+                    'room_name': name,
+                    'capacity': capacity or 0,
+                    'building': building or '',
+                    'floor': floor or '',
+                    'facilities': sorted(tags),
+                }
+                self.by_number[(number or '').strip().lower()] = room_id
+                for tag in tags:
+                    self.by_tag.setdefault(tag, set()).add(room_id)
+                self.by_capacity.append((capacity or 0, room_id))
+            self.by_capacity.sort()
+            for entry in entries:
+                self._set_entry(*entry)
+            self.loaded = True
+            self.version = version
+
+    def invalidate(self):
+        with self._lock:
+            self.loaded = False
+            self.version = None
+            self._clear()
+
+    def _room_for(self, classroom_id, room):
+        if classroom_id in self.rooms:
+            return classroom_id
+        return self.by_number.get((room or '').strip().lower())
+
+    def _remove_entry(self, entry_id):
+        previous = self.entries.pop(entry_id, None)
+        if previous is None:
+            return
+        room_id = previous[0]
+        masks = self.room_entries[room_id]
+        del masks[entry_id]
+        bitmap = 0
+        for mask in masks.values():  # classes may overlap, so rebuild the room
+            bitmap |= mask
+        self.bitmaps[room_id] = bitmap
+
+    def _set_entry(self, entry_id, classroom_id, room, day, start, end):
+        self._remove_entry(entry_id)
+        room_id = self._room_for(classroom_id, room)
+        day_index = DAY_INDEX.get((day or '').strip().lower())
+        if room_id is None or day_index is None or start is None or end is None:
+            return
+        mask = slot_mask(day_index, start, end)
+        self.entries[entry_id] = (room_id, mask)
+        self.room_entries.setdefault(room_id, {})[entry_id] = mask
+        self.bitmaps[room_id] = self.bitmaps.get(room_id, 0) | mask
+
+    def set_entry(self, entry_id, classroom_id, room, day, start, end):
+        """Add or move a committed timetable entry"""
+        with self._lock:
+            if self.loaded:
+                self._set_entry(entry_id, classroom_id, room, day, start, end)
+
+    def remove_entry(self, entry_id):
+        with self._lock:
+            if self.loaded:
+                self._remove_entry(entry_id)
+
+    def tag_counts(self):
+        with self._lock:
+            return {tag: len(room_ids) for tag, room_ids in self.by_tag.items()}
+
+    def _free_window(self, room_id, day_index, start, end):
+        """Minutes (from, until) of the free stretch around [start, end)"""
+        day_bits = (self.bitmaps.get(room_id, 0) >> (day_index * SLOTS_PER_DAY)) & DAY_MASK
+        first, last = start // SLOT_MINUTES, -(-end // SLOT_MINUTES)
+        before = day_bits & ((1 << first) - 1)
+        after = day_bits >> last
+        free_from = before.bit_length() * SLOT_MINUTES
+        free_until = (last + (after & -after).bit_length() - 1) * SLOT_MINUTES if after else 24 * 60
+        return free_from, free_until
+
+    def search(self, day, start, end, capacity=0, tags=(), building=None, limit=20):
+        """Rooms free for [start, end) on the day, best fit first.
+
+        Ranked by spare seats, then rooms in the requested building, then
+        the longest free stretch around the slot. Returns (rooms, total).
+        """
+        day_index = DAY_INDEX[day.strip().lower()]
+        mask = slot_mask(day_index, start, end)
+        building = (building or '').strip().lower()
+        with self._lock:
+            candidates = [room_id for _, room_id in self.by_capacity[bisect_left(self.by_capacity, (capacity, -1)):]]
+            if tags:
+                tag_sets = sorted((self.by_tag.get(tag, set()) for tag in tags), key=len)
+                candidates = [room_id for room_id in candidates if all(room_id in s for s in tag_sets)]
+            free = [room_id for room_id in candidates if not self.bitmaps.get(room_id, 0) & mask]
+
+            ranked = []
+            for room_id in free:
+                room = self.rooms[room_id]
+                free_from, free_until = self._free_window(room_id, day_index, start, end)
+                ranked.append(((
+                    room['capacity'] - capacity,
+                    bool(building) and room['building'].lower() != building,
+                    -(free_until - free_from),
+                    room['room_number'],
+                ), dict(room, free_from=free_from, free_until=free_until)))
+        ranked.sort(key=lambda item: item[0])
+        return [room for _, room in ranked[:limit]], len(ranked)
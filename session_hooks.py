@@ -0,0 +1,75 @@
+"""
+Session hooks that keep in-memory copies of database data in step.
+
+The dashboard counters, free-room bitmaps, live occupancy, calendar feeds,
+notification streams and the change feed all follow what each transaction
+changes in the same way: after every flush they note the objects they care
+about, bulk INSERT/UPDATE/DELETE statements on their models either add to
+those notes or mark the copy stale, and the notes are applied once the
+transaction commits and dropped if it rolls back. track_changes()
+registers those hooks for one of them.
+"""
+
+from sqlalchemy import event
+
+
+class TransactionChanges:
+    """What one transaction changed, as noted for one cache.
+
+    `items` holds whatever the cache's collectors add; `stale` means the
+    changes could not be worked out and the cache has to reload.
+    """
+    __slots__ = ('items', 'stale')
+
+    def __init__(self):
+        self.items = []
+        self.stale = False
+
+
+def pending_changes(session, key):
+    """The changes noted under key in the session's transaction so far"""
+    changes = session.info.get(key)
+    if changes is None:
+        changes = session.info[key] = TransactionChanges()
+    return changes
+
+
+def track_changes(session, key, models, collect, apply=None, collect_bulk=None):
+    """Register the hooks following one cache's changes on a session.
+
+    collect(session, changes) runs after every flush. Bulk statements on
+    `models` go to collect_bulk(orm_execute_state, changes), or mark the
+    cache stale without one; a result it returns is used as the
+    statement's result. After a commit that noted anything,
+    apply(session, changes) runs. The changes live in session.info[key]
+    until then and are dropped on rollback.
+    """
+    models = tuple(models)
+
+    @event.listens_for(session, 'after_flush')
+    def after_flush(session, flush_context):
+        collect(session, pending_changes(session, key))
+
+    @event.listens_for(session, 'do_orm_execute')
+    def do_orm_execute(orm_execute_state):
+        if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+            return None
+        mapper = orm_execute_state.bind_mapper
+        if mapper is None or mapper.class_ not in models:
+            return None
+        changes = pending_changes(orm_execute_state.session, key)
+        if collect_bulk is None:
+            changes.stale = True
+            return None
+        return collect_bulk(orm_execute_state, changes)
+
+    @event.listens_for(session, 'after_commit')
+    def after_commit(session):
+        changes = session.info.pop(key, None)
+        if apply is not None and changes is not None and (changes.stale or changes.items):
+            apply(session, changes)
+
+    @event.listens_for(session, 'after_soft_rollback')
+    def after_soft_rollback(session, previous_transaction):
+        if not session.in_transaction():
+            session.info.pop(key, None)
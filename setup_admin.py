@@ -4,15 +4,16 @@ Initialize the College Management System with an admin account
 Run this once after first setup: python setup_admin.py
 """
 
-from app import app, db, Admin
+from app import create_app, db, Admin, ensure_schema
 import sys
 
 def create_admin():
     """Create the initial admin account"""
     try:
+        app = create_app()
         with app.app_context():
             # Create tables
-            db.create_all()
+            ensure_schema()
             print("✓ Database tables created/verified")
             
             # Check if admin exists
@@ -0,0 +1,315 @@
+"""
+Weekly timetable generation as a constraint satisfaction problem.
+
+Every hour a course needs per week is a session to be placed in a
+(period, room) pair. The hard constraints: a teacher, a batch and a room
+take at most one session per period, the room must be large enough and
+have the required facilities, and existing timetable entries stay where
+they are. Solving runs in three steps:
+
+1. each session gets a domain of periods where its teacher and batch are
+   free and some suitable room is not already booked,
+2. sessions are assigned most-constrained first (fewest periods left);
+   the chosen period is removed from the domains of the sessions sharing
+   the teacher or batch (forward checking), and
+3. whatever could not be placed goes through a conflict-directed local
+   search: the session moves into the period/room that displaces the
+   fewest placed sessions, which are queued to be placed again, until
+   everything fits or the time budget runs out.
+
+The result never contains a clash; sessions that did not fit in time are
+reported as unplaced. Setting up the domains and the constraint graph
+also watches the deadline, and raises TimeLimitExceeded if it cannot
+finish in time. Problems are plain tuples and dicts, so independent
+groups (departments) can be solved in separate processes.
+
+A problem is a dict with:
+
+    periods   [(day, start_minute, end_minute), ...]
+    rooms     [(room_number, capacity, frozenset(facilities)), ...]
+    sessions  [(requirement, staff_id, batch or None, min_capacity, frozenset(facilities)), ...]
+    busy      {('staff' | 'batch' | 'room', key, period_index), ...} from existing entries
+"""
+
+import heapq
+import multiprocessing
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+# Share of the time budget left for merging and repairing group results
+MERGE_SHARE = 0.2
+# Iterations a displaced session is kept out of the period it lost
+TABU_TENURE = 10
+DEADLINE_CHECK_EVERY = 64
+# Below this many sessions, starting worker processes costs more than it saves
+PARALLEL_MIN_SESSIONS = 2000
+
+
+class TimeLimitExceeded(Exception):
+    """The problem could not even be set up before the deadline"""
+
+
+class Solver:
+    def __init__(self, problem, seed=0, preferred_rooms=None, deadline=None):
+        self.deadline = deadline
+        self.periods = problem['periods']
+        self.rooms = problem['rooms']
+        self.sessions = problem['sessions']
+        self.rng = random.Random(seed)
+        busy = problem.get('busy', ())
+        self.room_busy = {(key, period) for kind, key, period in busy if kind == 'room'}
+
+        # Suitable rooms (preferred first, then the best fit) and the periods
+        # where one of them is free, shared by sessions with the same needs
+        options = {}
+        for _, _, _, capacity, facilities in self.sessions:
+            self.check_deadline()
+            if (capacity, facilities) in options:
+                continue
+            rooms = [
+                r for r, (_, room_capacity, room_facilities) in enumerate(self.rooms)
+                if room_capacity >= capacity and facilities <= room_facilities
+            ]
+            rooms.sort(key=lambda r: (
+                preferred_rooms is not None and r not in preferred_rooms, self.rooms[r][1] - capacity, r
+            ))
+            periods = [
+                p for p in range(len(self.periods))
+                if any((self.rooms[r][0], p) not in self.room_busy for r in rooms)
+            ]
+            options[(capacity, facilities)] = (rooms, periods)
+
+        self.room_options = []
+        self.domains = []
+        for _, staff_id, batch, capacity, facilities in self.sessions:
+            self.check_deadline()
+            rooms, periods = options[(capacity, facilities)]
+            self.room_options.append(rooms)
+            self.domains.append([
+                p for p in periods
+                if ('staff', staff_id, p) not in busy and (batch is None or ('batch', batch, p) not in busy)
+            ])
+
+        # Sessions sharing a teacher or a batch constrain each other; this is
+        # quadratic in the size of each group, so it watches the deadline too
+        by_key = {}
+        for s, (_, staff_id, batch, _, _) in enumerate(self.sessions):
+            by_key.setdefault(('staff', staff_id), []).append(s)
+            if batch is not None:
+                by_key.setdefault(('batch', batch), []).append(s)
+        self.neighbours = [set() for _ in self.sessions]
+        for group in by_key.values():
+            for s in group:
+                self.check_deadline()
+                self.neighbours[s].update(group)
+        for s, neighbours in enumerate(self.neighbours):
+            neighbours.discard(s)
+
+        self.assignment = {}  # session -> (period, room)
+        self.staff_at = {}  # (staff_id, period) -> session
+        self.batch_at = {}
+        self.room_at = {}  # (room, period) -> session
+        self.day_load = {}  # (requirement, day) -> sessions placed that day
+
+    def check_deadline(self):
+        if self.deadline is not None and time.time() > self.deadline:
+            raise TimeLimitExceeded('Setting up the problem took longer than the time limit')
+
+    # Assignment bookkeeping
+    def assign(self, s, period, room):
+        requirement, staff_id, batch, _, _ = self.sessions[s]
+        self.assignment[s] = (period, room)
+        self.staff_at[(staff_id, period)] = s
+        if batch is not None:
+            self.batch_at[(batch, period)] = s
+        self.room_at[(room, period)] = s
+        key = (requirement, self.periods[period][0])
+        self.day_load[key] = self.day_load.get(key, 0) + 1
+
+    def unassign(self, s):
+        requirement, staff_id, batch, _, _ = self.sessions[s]
+        period, room = self.assignment.pop(s)
+        del self.staff_at[(staff_id, period)]
+        if batch is not None:
+            del self.batch_at[(batch, period)]
+        del self.room_at[(room, period)]
+        self.day_load[(requirement, self.periods[period][0])] -= 1
+
+    def free_room(self, s, period):
+        for room in self.room_options[s]:
+            if (room, period) not in self.room_at and (self.rooms[room][0], period) not in self.room_busy:
+                return room
+        return None
+
+    def fits(self, s, period, room):
+        _, staff_id, batch, _, _ = self.sessions[s]
+        return ((staff_id, period) not in self.staff_at
+                and (batch is None or (batch, period) not in self.batch_at)
+                and (room, period) not in self.room_at
+                and room in self.room_options[s]
+                and (self.rooms[room][0], period) not in self.room_busy)
+
+    def period_order(self, s, periods):
+        """Periods on the days with the fewest sessions of the same course first"""
+        requirement = self.sessions[s][0]
+        return sorted(periods, key=lambda p: (
+            self.day_load.get((requirement, self.periods[p][0]), 0), self.rng.random()
+        ))
+
+    # Step 2: most-constrained-first assignment with forward checking
+    def construct(self, deadline):
+        live = {s: set(self.domains[s]) for s in range(len(self.sessions)) if s not in self.assignment}
+        for s, (period, _) in self.assignment.items():
+            for n in self.neighbours[s]:
+                if n in live:
+                    live[n].discard(period)
+        heap = [(len(periods), -len(self.neighbours[s]), s) for s, periods in live.items()]
+        heapq.heapify(heap)
+
+        steps = 0
+        while heap:
+            steps += 1
+            if steps % DEADLINE_CHECK_EVERY == 0 and time.time() > deadline:
+                return
+            size, _, s = heapq.heappop(heap)
+            if s not in live or size != len(live[s]):
+                continue  # stale entry, the domain shrank since
+            periods = live.pop(s)
+            for period in self.period_order(s, periods):
+                room = self.free_room(s, period)
+                if room is not None:
+                    break
+            else:
+                continue  # left for the local search
+            self.assign(s, period, room)
+            for n in self.neighbours[s]:
+                if n in live and period in live[n]:
+                    live[n].discard(period)
+                    heapq.heappush(heap, (len(live[n]), -len(self.neighbours[n]), n))
+
+    # Step 3: conflict-directed local search over the unplaced sessions
+    def displaced_by(self, s, period, room):
+        _, staff_id, batch, _, _ = self.sessions[s]
+        clashes = {self.staff_at.get((staff_id, period)), self.room_at.get((room, period))}
+        if batch is not None:
+            clashes.add(self.batch_at.get((batch, period)))
+        clashes.discard(None)
+        return clashes
+
+    def repair(self, deadline):
+        unplaced = deque(s for s in range(len(self.sessions)) if s not in self.assignment and self.domains[s])
+        best = dict(self.assignment)
+        tabu = {}  # (session, period) -> iteration it may return
+        iteration = 0
+        while unplaced:
+            iteration += 1
+            if iteration % DEADLINE_CHECK_EVERY == 0 and time.time() > deadline:
+                break
+            s = unplaced.popleft()
+            choice, cost = None, None
+            for period in self.domains[s]:
+                if tabu.get((s, period), 0) > iteration:
+                    continue
+                for room in self.room_options[s]:
+                    if (self.rooms[room][0], period) in self.room_busy:
+                        continue
+                    displaced = self.displaced_by(s, period, room)
+                    score = len(displaced) + self.rng.random()
+                    if cost is None or score < cost:
+                        choice, cost = (period, room, displaced), score
+                    if not displaced:
+                        break
+                if cost is not None and cost < 1:
+                    break
+            if choice is None:
+                unplaced.append(s)
+                continue
+            period, room, displaced = choice
+            for other in displaced:
+                self.unassign(other)
+                tabu[(other, period)] = iteration + TABU_TENURE
+                unplaced.append(other)
+            self.assign(s, period, room)
+            if len(self.assignment) > len(best):
+                best = dict(self.assignment)
+
+        if len(best) > len(self.assignment):
+            for s in list(self.assignment):
+                self.unassign(s)
+            for s, (period, room) in best.items():
+                self.assign(s, period, room)
+
+    def solve(self, deadline, initial=None):
+        for s, (period, room) in (initial or {}).items():
+            if period in self.domains[s] and self.fits(s, period, room):
+                self.assign(s, period, room)
+        self.construct(deadline)
+        self.repair(deadline)
+        return {
+            'placed': dict(self.assignment),
+            'unplaced': [s for s in range(len(self.sessions)) if s not in self.assignment],
+        }
+
+
+def solve(problem, deadline, seed=0, initial=None, preferred_rooms=None):
+    """Solve a problem before the deadline (a time.time() value)"""
+    return Solver(problem, seed, preferred_rooms, deadline).solve(deadline, initial)
+
+
+def share_rooms(rooms, group_sizes):
+    """Split room indexes between groups in proportion to their sessions"""
+    total = sum(group_sizes) or 1
+    shares = [set() for _ in group_sizes]
+    order = sorted(range(len(rooms)), key=lambda r: (-rooms[r][1], r))
+    for r in order:
+        g = max(range(len(group_sizes)), key=lambda g: group_sizes[g] / total * len(rooms) - len(shares[g]))
+        shares[g].add(r)
+    return shares
+
+
+def _solve_group(problem, indexes, deadline, seed, preferred_rooms):
+    sub = dict(problem, sessions=[problem['sessions'][s] for s in indexes])
+    try:
+        result = solve(sub, deadline, seed, preferred_rooms=preferred_rooms)
+    except TimeLimitExceeded:
+        return {}  # the group's sessions are left to the final pass
+    return {indexes[s]: value for s, value in result['placed'].items()}
+
+
+def solve_groups(problem, groups, time_limit, processes=1, seed=0):
+    """Solve independent groups of sessions in parallel, then merge them.
+
+    Groups share the rooms, so each one prefers its own share of them; the
+    merge keeps every placement that still fits and runs the solver once
+    more over the whole problem for the rest. Raises TimeLimitExceeded if
+    that final pass cannot be set up in time.
+    """
+    started = time.time()
+    deadline = started + time_limit
+    group_deadline = started + time_limit * (1 - MERGE_SHARE)
+    groups = [list(group) for group in groups if group]
+    shares = share_rooms(problem['rooms'], [len(group) for group in groups])
+
+    merged = {}
+    if processes > 1 and len(groups) > 1 and len(problem['sessions']) >= PARALLEL_MIN_SESSIONS:
+        # Spawned workers don't inherit the locks and threads of the web process
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(processes, len(groups)), mp_context=context) as pool:
+            futures = [
+                pool.submit(_solve_group, problem, group, group_deadline, seed + i, shares[i])
+                for i, group in enumerate(groups)
+            ]
+            for future in futures:
+                try:
+                    merged.update(future.result(timeout=max(1.0, deadline - time.time())))
+                except FutureTimeout:
+                    pass  # the group's sessions are placed by the final pass
+    else:
+        for i, group in enumerate(groups):
+            merged.update(_solve_group(problem, group, group_deadline, seed + i, shares[i]))
+
+    result = solve(problem, deadline, seed, initial=merged)
+    result['seconds'] = round(time.time() - started, 3)
+    return result
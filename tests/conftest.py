@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db, ensure_schema, Admin, Staff
+
+
+@pytest.fixture
+def app():
+    """The testing configuration on a fresh in-memory database"""
+    app = create_app('testing')
+    with app.app_context():
+        ensure_schema()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def make_staff(app):
+    def make(employee_id, department='CS'):
+        staff = Staff(
+            employee_id=employee_id, email=f'{employee_id.lower()}@college.edu', name=f'Staff {employee_id}',
+            department=department, position='Lecturer'
+        )
+        staff.set_password('password')
+        db.session.add(staff)
+        db.session.commit()
+        return staff
+    return make
+
+
+@pytest.fixture
+def admin_client(app):
+    admin = Admin(email='admin@college.edu', name='Admin')
+    admin.set_password('password')
+    db.session.add(admin)
+    db.session.commit()
+    client = app.test_client()
+    response = client.post('/api/admin/login', json={'email': 'admin@college.edu', 'password': 'password'})
+    assert response.status_code == 200
+    return client
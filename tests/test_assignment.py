@@ -0,0 +1,64 @@
+import itertools
+import random
+
+from assignment import SubstitutePlanner, SubstituteRequest, CandidateProfile, hungarian
+
+
+def brute_force(matrix, width):
+    return min(sum(row[j] for row, j in zip(matrix, columns))
+               for columns in itertools.permutations(range(width), len(matrix)))
+
+
+def test_hungarian_matches_brute_force():
+    rng = random.Random(7)
+    for n, width in [(1, 1), (2, 2), (3, 3), (4, 4), (5, 5), (2, 5), (3, 6), (4, 7)]:
+        for _ in range(20):
+            matrix = [[rng.randint(0, 20) for _ in range(width)] for _ in range(n)]
+            columns = hungarian(matrix, width)
+            assert len(set(columns)) == n
+            assert sum(row[j] for row, j in zip(matrix, columns)) == brute_force(matrix, width)
+
+
+def best_plan(planner, requests):
+    """Most classes covered, then the cheapest, over every way to pick distinct substitutes"""
+    best = None
+    for picks in itertools.product(*[sorted(req.free) + [None] for req in requests]):
+        chosen = [staff_id for staff_id in picks if staff_id is not None]
+        if len(set(chosen)) < len(chosen):
+            continue
+        cost = sum(planner.cost(req, staff_id) for req, staff_id in zip(requests, picks) if staff_id is not None)
+        if best is None or (-len(chosen), cost) < best:
+            best = (-len(chosen), cost)
+    return best
+
+
+def test_balanced_plan_is_optimal_for_one_slot():
+    rng = random.Random(3)
+    for _ in range(30):
+        staff = range(1, rng.randint(2, 6))
+        profiles = {staff_id: CandidateProfile(rng.choice('AB'), {rng.choice(['C1', 'C2'])}, rng.randint(0, 5), 0)
+                    for staff_id in staff}
+        requests = [
+            SubstituteRequest(key, 'Monday 09:00', {s for s in staff if rng.random() < 0.6}, rng.choice('AB'),
+                              rng.choice(['C1', 'C2']))
+            for key in range(rng.randint(1, 4))
+        ]
+        planner = SubstitutePlanner(profiles)
+        result = planner.plan(requests)
+        assert len(set(result.values())) == len(result)
+        assert all(result[req.key] in req.free for req in requests if req.key in result)
+        cost = sum(SubstitutePlanner(profiles).cost(req, result[req.key]) for req in requests if req.key in result)
+        assert (-len(result), cost) == best_plan(SubstitutePlanner(profiles), requests)
+
+
+def test_infeasible_requests_are_left_uncovered():
+    profiles = {1: CandidateProfile('A', {'C1'}, 0, 0)}
+    requests = [
+        SubstituteRequest('a', 'Monday 09:00', {1}, 'A', 'C1'),
+        SubstituteRequest('b', 'Monday 09:00', {1}, 'A', 'C1'),
+        SubstituteRequest('c', 'Monday 09:00', set(), 'A', 'C1'),
+    ]
+    result = SubstitutePlanner(profiles).plan(requests)
+    assert list(result.values()) == [1]
+    assert set(result) <= {'a', 'b'}
+    assert SubstitutePlanner(profiles).plan([requests[2]]) == {}
@@ -0,0 +1,101 @@
+import random
+import threading
+import time
+
+import pytest
+
+from app import create_app, db, ensure_schema, ChangeLog, Classroom, Timetable
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    """The testing configuration on a database file, so threads get their own connections"""
+    app = create_app('testing', {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "feed.db"}',
+        'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': 8},
+    })
+    with app.app_context():
+        ensure_schema()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_change_ids_become_visible_in_order(file_app):
+    """A reader following the cursor sees every change, however the writers interleave"""
+    done = threading.Event()
+    seen = []
+    
+    def write(worker):
+        rng = random.Random(worker)
+        with file_app.app_context():
+            for i in range(15):
+                db.session.add(Classroom(room_number=f'W{worker}-{i}', room_name='Room', capacity=30))
+                db.session.flush()  # the change log row and its id exist from here
+                time.sleep(rng.random() * 0.005)
+                db.session.commit()
+            db.session.remove()
+    
+    def read():
+        cursor = 0
+        with file_app.app_context():
+            while True:
+                finished = done.is_set()
+                ids = [row.id for row in ChangeLog.query.filter(ChangeLog.id > cursor).order_by(ChangeLog.id)]
+                db.session.rollback()
+                seen.extend(ids)
+                cursor = ids[-1] if ids else cursor
+                if finished:
+                    break
+            db.session.remove()
+    
+    reader = threading.Thread(target=read)
+    writers = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    reader.start()
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    done.set()
+    reader.join()
+    
+    assert seen == sorted({row.id for row in ChangeLog.query})
+    assert len(seen) == 60
+
+
+def test_feed_replays_from_a_cursor(admin_client, make_staff):
+    staff_id = make_staff('E1').id
+    cursor = admin_client.get('/api/admin/changes').json['cursor']
+    
+    entry_ids = []
+    for day in ('Monday', 'Tuesday', 'Wednesday'):
+        response = admin_client.post('/api/admin/timetable', json={
+            'staff_id': staff_id, 'course_code': 'CS101', 'course_name': 'Programming',
+            'day': day, 'time_slot': '09:00-10:00', 'room': 'R1',
+        })
+        entry_ids.append(response.json['id'])
+    admin_client.put(f'/api/admin/timetable/{entry_ids[0]}', json={'course_name': 'Intro'})
+    admin_client.delete(f'/api/admin/timetable/{entry_ids[1]}')
+    
+    # Page by page: the insert and update of one entry collapse, the deleted entry is reported deleted
+    changes, page_cursor = [], cursor
+    while True:
+        page = admin_client.get(f'/api/admin/changes?cursor={page_cursor}&entities=timetable&limit=2').json
+        assert page['cursor'] >= page_cursor
+        changes.extend(page['changes'])
+        page_cursor = page['cursor']
+        if not page['has_more']:
+            break
+    latest = {change['id']: change for change in changes}
+    assert latest[entry_ids[0]]['data']['course_name'] == 'Intro'
+    assert latest[entry_ids[1]]['op'] == 'delete'
+    assert latest[entry_ids[2]]['op'] == 'insert'
+    
+    # Replaying the whole range at once gives the same final state, ordered by each record's last change
+    replay = admin_client.get(f'/api/admin/changes?cursor={cursor}&entities=timetable').json
+    assert replay['cursor'] == page_cursor and not replay['has_more']
+    assert sorted((c['id'], c['op']) for c in replay['changes']) == [
+        (entry_ids[0], 'insert'), (entry_ids[1], 'delete'), (entry_ids[2], 'insert')
+    ]
+    assert db.session.get(Timetable, entry_ids[1]) is None
+    assert admin_client.get(f'/api/admin/changes?cursor={page_cursor}').json['changes'] == []
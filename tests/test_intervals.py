@@ -0,0 +1,46 @@
+import random
+
+from intervals import IntervalIndex, overlaps
+
+
+def naive(intervals, start, end):
+    return sorted(i for i in intervals if overlaps(i[0], i[1], start, end))
+
+
+def test_overlapping_matches_a_scan():
+    rng = random.Random(5)
+    index, intervals = IntervalIndex(), []
+    for item in range(200):
+        start = rng.randrange(0, 1440)
+        # Mostly short classes and a few long blocks that start far left of later queries
+        end = start + (rng.randrange(300, 900) if item % 25 == 0 else rng.randrange(1, 120))
+        index.add('Monday', start, end, item)
+        intervals.append((start, end, item))
+    
+    for _ in range(300):
+        start = rng.randrange(0, 1500)
+        end = start + rng.randrange(1, 180)
+        assert sorted(index.overlapping('Monday', start, end)) == naive(intervals, start, end)
+    assert list(index.overlapping('Tuesday', 0, 1440)) == []
+
+
+def test_long_interval_is_found_from_far_right():
+    index = IntervalIndex()
+    index.add('room', 480, 1080, 'exam')
+    for item, start in enumerate(range(480, 1080, 60)):
+        index.add('room', start, start + 50, item)
+    
+    assert [item for _, _, item in index.at('room', 1015)] == ['exam']
+    assert [item for _, _, item in index.overlapping('room', 1075, 1200)] == ['exam']
+    assert list(index.overlapping('room', 1080, 1200)) == []
+    
+    index.remove('room', 480, 1080, 'exam')
+    assert list(index.at('room', 1015)) == []
+    assert [item for _, _, item in index.at('room', 500)] == [0]
+
+
+def test_overlapping_groups_chain_through_intervals():
+    index = IntervalIndex()
+    for start, end, item in [(0, 60, 'a'), (30, 90, 'b'), (80, 100, 'c'), (100, 120, 'd'), (110, 130, 'e')]:
+        index.add('staff', start, end, item)
+    assert list(index.overlapping_groups('staff')) == [['a', 'b', 'c'], ['d', 'e']]
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, TimetableJob
+from jobs import DONE, FAILED, QUEUED, RUNNING, JobWorkerPool
+
+
+@pytest.fixture
+def make_pool(app):
+    def make(handler):
+        pool = JobWorkerPool(db, TimetableJob, handler, workers=0, retry_delay=0)
+        pool.init_app(app)
+        return pool
+    return make
+
+
+def queue_job(max_attempts=2):
+    job = TimetableJob(params={}, max_attempts=max_attempts)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_job_left_running_by_a_dead_worker_is_retried(make_pool):
+    job_id = queue_job()
+    calls = []
+    pool = make_pool(lambda job: calls.append(job.id) or {'ok': True})
+    
+    # A worker claims the job and dies before recording an outcome
+    assert pool.claim().id == job_id
+    assert pool.run_pending() == 0
+    pool.requeue_stale()
+    assert db.session.get(TimetableJob, job_id).status == RUNNING  # not stale yet
+    
+    db.session.get(TimetableJob, job_id).started_at = datetime.utcnow() - timedelta(minutes=11)
+    db.session.commit()
+    pool.requeue_stale()
+    assert pool.run_pending() == 1
+    
+    job = db.session.get(TimetableJob, job_id)
+    assert (job.status, job.attempts, job.result) == (DONE, 2, {'ok': True})
+    assert calls == [job_id]
+
+
+def test_failed_job_is_retried_until_max_attempts(make_pool):
+    failing, recovering = queue_job(max_attempts=3), queue_job(max_attempts=3)
+    attempts = {}
+    
+    def handler(job):
+        attempts[job.id] = attempts.get(job.id, 0) + 1
+        if job.id == failing or attempts[job.id] < 2:
+            raise RuntimeError('worker crashed')
+        return {'attempt': attempts[job.id]}
+    
+    make_pool(handler).run_pending()
+    
+    failed, done = db.session.get(TimetableJob, failing), db.session.get(TimetableJob, recovering)
+    assert (failed.status, failed.attempts, failed.error) == (FAILED, 3, 'RuntimeError: worker crashed')
+    assert (done.status, done.attempts, done.result, done.error) == (DONE, 2, {'attempt': 2}, None)
+
+
+def test_retry_waits_for_the_backoff(make_pool):
+    job_id = queue_job()
+    pool = make_pool(lambda job: 1 / 0)
+    pool.retry_delay = 60
+    
+    assert pool.run_pending() == 1
+    job = db.session.get(TimetableJob, job_id)
+    assert (job.status, job.attempts) == (QUEUED, 1)
+    assert job.available_at > datetime.utcnow() + timedelta(seconds=50)
+    assert pool.claim() is None
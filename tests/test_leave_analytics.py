@@ -0,0 +1,76 @@
+from datetime import date
+
+from app import db, compute_leave_analytics, ClassRescheduling, Leave, Staff, Timetable
+
+
+def add_class(staff, day, time_slot):
+    entry = Timetable(staff_id=staff.id, course_code='CS101', course_name='Programming', day=day, room='R1')
+    entry.set_time_slot(time_slot)
+    db.session.add(entry)
+    db.session.commit()
+    return entry
+
+
+def test_fully_covered_multi_week_leave(app, make_staff):
+    absent, substitute = make_staff('E1'), make_staff('E2')
+    entries = [add_class(absent, 'Monday', '09:00-10:00'), add_class(absent, 'Wednesday', '11:00-12:00')]
+    # Two full weeks, Monday 2026-09-07 to Sunday 2026-09-20
+    leave = Leave(staff_id=absent.id, leave_date=date(2026, 9, 7), end_date=date(2026, 9, 20),
+                  leave_type='Sick', status='approved')
+    db.session.add(leave)
+    db.session.commit()
+    db.session.add_all(ClassRescheduling(
+        original_timetable_id=entry.id, original_staff_id=absent.id, assigned_staff_id=substitute.id,
+        leave_id=leave.id, reason='Auto-assigned due to leave'
+    ) for entry in entries)
+    db.session.commit()
+    
+    result = compute_leave_analytics(date(2026, 9, 1), date(2026, 9, 30), ('department',), 'approved', 20)
+    assert result['coverage'] == [{
+        'department': 'CS', 'month': '2026-09', 'classes_missed': 4, 'classes_covered': 4, 'coverage_rate': 1.0
+    }]
+    
+    # Clipped to the first week of the leave, both sides count the same dates
+    result = compute_leave_analytics(date(2026, 9, 1), date(2026, 9, 10), ('department',), 'approved', 20)
+    assert result['coverage'][0]['classes_missed'] == 2
+    assert result['coverage'][0]['coverage_rate'] == 1.0
+
+
+def test_partially_covered_leave(app, make_staff):
+    absent, substitute = make_staff('E1'), make_staff('E2')
+    covered = add_class(absent, 'Monday', '09:00-10:00')
+    add_class(absent, 'Tuesday', '09:00-10:00')
+    leave = Leave(staff_id=absent.id, leave_date=date(2026, 9, 7), end_date=date(2026, 9, 15),
+                  leave_type='Sick', status='approved')
+    db.session.add(leave)
+    db.session.commit()
+    db.session.add(ClassRescheduling(
+        original_timetable_id=covered.id, original_staff_id=absent.id, assigned_staff_id=substitute.id,
+        leave_id=leave.id, reason='Manual assignment'
+    ))
+    db.session.commit()
+    
+    # Mondays 7 and 14 are covered, Tuesdays 8 and 15 are not
+    coverage = compute_leave_analytics(date(2026, 9, 1), date(2026, 9, 30), ('department',), 'approved', 20)['coverage']
+    assert (coverage[0]['classes_missed'], coverage[0]['classes_covered']) == (4, 2)
+    assert coverage[0]['coverage_rate'] == 0.5
+
+
+def test_leave_of_deleted_staff_is_skipped(app, make_staff):
+    absent, substitute = make_staff('E1'), make_staff('E2')
+    entry = add_class(absent, 'Monday', '09:00-10:00')
+    leave = Leave(staff_id=absent.id, leave_date=date(2026, 9, 7), leave_type='Sick', status='approved')
+    db.session.add(leave)
+    db.session.commit()
+    db.session.add(ClassRescheduling(
+        original_timetable_id=entry.id, original_staff_id=absent.id, assigned_staff_id=substitute.id,
+        leave_id=leave.id, reason='Manual assignment'
+    ))
+    db.session.commit()
+    # Staff rows deleted outside the app leave their leaves behind (SQLite does not enforce the key)
+    db.session.execute(db.delete(Staff).where(Staff.id == absent.id))
+    db.session.commit()
+    
+    result = compute_leave_analytics(date(2026, 9, 1), date(2026, 9, 30), ('department',), 'approved', 20)
+    assert result['leaves_scanned'] == 0
+    assert result['coverage'] == []
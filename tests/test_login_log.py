@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+
+from app import db, login_row, write_login_events, LoginLog
+
+
+def events_for(staff_id, key='k1'):
+    login_time = datetime(2026, 10, 1, 9, 0)
+    logout_time = login_time + timedelta(hours=1)
+    login = {'type': 'login', 'row': login_row(key, 'staff', staff_id, '10.0.0.1', login_time)}
+    closed = dict(login_row(key, 'staff', staff_id, '10.0.0.1', login_time), logout_time=logout_time, status='logged_out')
+    logout = {'type': 'logout', 'session_key': key, 'time': logout_time, 'row': closed}
+    return login, logout
+
+
+def stored(key='k1'):
+    db.session.remove()
+    rows = LoginLog.query.filter_by(session_key=key).all()
+    return [(row.status, row.login_time, row.logout_time) for row in rows]
+
+
+def test_logout_flushed_before_its_login(app, make_staff):
+    # The logout reached a worker whose buffer flushed before the login's worker did
+    login, logout = events_for(make_staff('E1').id)
+    write_login_events([logout])
+    write_login_events([login])
+    assert stored() == [('logged_out', datetime(2026, 10, 1, 9, 0), datetime(2026, 10, 1, 10, 0))]
+
+
+def test_logout_after_login_and_in_same_batch(app, make_staff):
+    staff_id = make_staff('E1').id
+    login, logout = events_for(staff_id)
+    write_login_events([login])
+    assert stored()[0][0] == 'logged_in'
+    write_login_events([logout])
+    assert stored() == [('logged_out', datetime(2026, 10, 1, 9, 0), datetime(2026, 10, 1, 10, 0))]
+    
+    login, logout = events_for(staff_id, key='k2')
+    write_login_events([login, logout])
+    assert stored('k2') == [('logged_out', datetime(2026, 10, 1, 9, 0), datetime(2026, 10, 1, 10, 0))]
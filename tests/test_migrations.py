@@ -0,0 +1,26 @@
+from sqlalchemy import inspect, text
+
+import migrations
+from app import db, ensure_schema
+
+
+def test_later_migrations_wait_for_one_that_cannot_apply(app, make_staff):
+    staff_id = make_staff('E1').id
+    # Roll the database back to before migration 8 and double-book a slot
+    with db.engine.begin() as conn:
+        conn.execute(text('DELETE FROM schema_migrations WHERE version >= 8'))
+        conn.execute(text('DROP INDEX uq_timetable_day_staff_slot'))
+        for _ in range(2):
+            conn.execute(text(
+                "INSERT INTO timetable (staff_id, course_code, course_name, day, time_slot, room) "
+                "VALUES (:staff_id, 'CS101', 'Programming', 'Monday', '09:00-10:00', 'R1')"
+            ), {'staff_id': staff_id})
+    
+    assert ensure_schema() == []
+    assert [version for version, _ in migrations.pending_migrations(db.engine)] == [8, 9, 10]
+    
+    with db.engine.begin() as conn:
+        conn.execute(text('DELETE FROM timetable WHERE id = (SELECT MAX(id) FROM timetable)'))
+    assert ensure_schema() == [8, 9, 10]
+    indexes = {index['name'] for index in inspect(db.engine).get_indexes('timetable')}
+    assert 'uq_timetable_day_staff_slot' in indexes
@@ -0,0 +1,82 @@
+"""SQL statements per report page stay fixed however many rows there are."""
+
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import db, ClassRescheduling, Leave, LoginLog, Staff, Timetable
+
+ROWS = 250
+PAGE = 100
+
+# Same budgets as benchmarks/endpoints.py
+REPORTS = {
+    '/api/admin/timetable': ('timetable', 2),
+    '/api/admin/rescheduling': ('records', 3),
+    '/api/admin/leave-presence': ('leaves', 3),
+    '/api/admin/stats/login-activity': ('logs', 2),
+}
+
+
+@contextmanager
+def count_queries():
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@pytest.fixture
+def history(app, make_staff):
+    """ROWS timetable entries, leaves, substitutions and logins over a few staff"""
+    staff_ids = [make_staff(f'E{i}').id for i in range(5)]
+    now = datetime.utcnow()
+    db.session.execute(db.insert(Timetable), [{
+        'staff_id': staff_ids[i % 5], 'course_code': f'C{i}', 'course_name': 'Course', 'day': 'Monday',
+        'time_slot': f'slot {i}', 'start_minute': None, 'end_minute': None, 'room': f'R{i}', 'created_at': now
+    } for i in range(ROWS)])
+    db.session.execute(db.insert(Leave), [{
+        'staff_id': staff_ids[i % 5], 'leave_date': date(2026, 1, 1) + timedelta(days=i), 'leave_type': 'Sick',
+        'reason': '', 'status': 'approved', 'applied_at': now
+    } for i in range(ROWS)])
+    entry_ids = [entry_id for (entry_id,) in db.session.query(Timetable.id).order_by(Timetable.id)]
+    leave_ids = [leave_id for (leave_id,) in db.session.query(Leave.id).order_by(Leave.id)]
+    db.session.execute(db.insert(ClassRescheduling), [{
+        'original_timetable_id': entry_ids[i], 'original_staff_id': staff_ids[i % 5],
+        'assigned_staff_id': staff_ids[(i + 1) % 5], 'leave_id': leave_ids[i], 'reason': 'Manual assignment',
+        'created_at': now
+    } for i in range(ROWS)])
+    db.session.execute(db.insert(LoginLog), [{
+        'staff_id': staff_ids[i % 5], 'user_type': 'staff', 'login_time': now - timedelta(minutes=i),
+        'ip_address': '127.0.0.1', 'status': 'logged_out'
+    } for i in range(ROWS)])
+    db.session.commit()
+
+
+@pytest.mark.parametrize('path', sorted(REPORTS))
+def test_report_pages_run_a_fixed_number_of_queries(admin_client, history, path):
+    key, budget = REPORTS[path]
+    counts = []
+    rows = 0
+    cursor = None
+    while True:
+        with count_queries() as statements:
+            response = admin_client.get(path, query_string=dict(limit=PAGE, **({'cursor': cursor} if cursor else {})))
+        assert response.status_code == 200, response.json
+        data = response.json
+        counts.append(len(statements))
+        rows += len(data[key])
+        cursor = data.get('next_cursor')
+        if not cursor:
+            break
+    
+    assert rows >= ROWS and len(counts) >= ROWS // PAGE
+    assert max(counts) <= budget, counts
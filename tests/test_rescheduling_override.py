@@ -0,0 +1,57 @@
+from datetime import date
+
+import pytest
+
+from app import db, ClassRescheduling, Leave, Notification, Staff, Timetable
+
+
+@pytest.fixture
+def rescheduling(make_staff):
+    """A class of E1 on leave taken by E2, and E3 free to take it over"""
+    absent, substitute, other = make_staff('E1'), make_staff('E2'), make_staff('E3')
+    entry = Timetable(staff_id=absent.id, course_code='CS101', course_name='Programming', day='Monday', room='R1')
+    entry.set_time_slot('09:00-10:00')
+    leave = Leave(staff_id=absent.id, leave_date=date(2026, 1, 5), leave_type='sick', status='approved')
+    db.session.add_all([entry, leave])
+    db.session.flush()
+    rescheduling = ClassRescheduling(original_timetable_id=entry.id, original_staff_id=absent.id,
+                                     assigned_staff_id=substitute.id, leave_id=leave.id)
+    db.session.add(rescheduling)
+    db.session.commit()
+    return rescheduling.id, substitute.id, other.id
+
+
+def override(client, rescheduling_id, staff_id):
+    return client.post(f'/api/admin/rescheduling/{rescheduling_id}/override', json={'assigned_staff_id': staff_id})
+
+
+def test_override_notifies_both_substitutes(admin_client, rescheduling):
+    rescheduling_id, substitute_id, other_id = rescheduling
+    assert override(admin_client, rescheduling_id, other_id).status_code == 200
+    kinds = {(n.staff_id, n.kind) for n in Notification.query}
+    assert kinds == {(substitute_id, 'substitution_removed'), (other_id, 'substitution_assigned')}
+
+
+def test_override_rejects_unknown_or_inactive_staff(admin_client, rescheduling):
+    rescheduling_id, substitute_id, other_id = rescheduling
+    assert override(admin_client, rescheduling_id, None).status_code == 400
+    assert override(admin_client, rescheduling_id, 999).status_code == 404
+    db.session.get(Staff, other_id).is_active = False
+    db.session.commit()
+    assert override(admin_client, rescheduling_id, other_id).status_code == 400
+    
+    db.session.expire_all()
+    assert db.session.get(ClassRescheduling, rescheduling_id).assigned_staff_id == substitute_id
+    assert Notification.query.count() == 0
+
+
+def test_override_without_the_class_skips_the_notice(admin_client, rescheduling):
+    rescheduling_id, substitute_id, other_id = rescheduling
+    entry_id = db.session.get(ClassRescheduling, rescheduling_id).original_timetable_id
+    db.session.execute(db.delete(Timetable).where(Timetable.id == entry_id))
+    db.session.commit()
+    
+    assert override(admin_client, rescheduling_id, other_id).status_code == 200
+    db.session.expire_all()
+    assert db.session.get(ClassRescheduling, rescheduling_id).assigned_staff_id == other_id
+    assert Notification.query.count() == 0
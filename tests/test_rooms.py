@@ -0,0 +1,88 @@
+import random
+
+from intervals import overlaps
+from rooms import DAYS, RoomAvailabilityIndex, parse_facilities
+
+TAGS = ['projector', 'ac', 'lab', 'whiteboard']
+
+
+def make_rooms(rng, count=15):
+    return [
+        (room_id, f'R{room_id}', f'Room {room_id}', rng.choice([20, 30, 40, 60]), rng.choice(['A', 'B']), '1',
+         frozenset(tag for tag in TAGS if rng.random() < 0.4))
+        for room_id in range(1, count + 1)
+    ]
+
+
+def make_entries(rng, rooms, count=120):
+    entries = {}
+    for entry_id in range(1, count + 1):
+        start = rng.randrange(96, 216) * 5  # 08:00 to 18:00 on the 5-minute grid
+        entries[entry_id] = (entry_id, rng.choice(rooms)[0], None, rng.choice(DAYS[:5]).title(),
+                             start, start + rng.choice([30, 50, 60, 90]))
+    return entries
+
+
+def naive_free(rooms, entries, day, start, end, capacity, tags):
+    return sorted(
+        room_id for room_id, _, _, room_capacity, _, _, room_tags in rooms
+        if room_capacity >= capacity and set(tags) <= room_tags and not any(
+            classroom_id == room_id and entry_day == day and overlaps(entry_start, entry_end, start, end)
+            for _, classroom_id, _, entry_day, entry_start, entry_end in entries.values()
+        )
+    )
+
+
+def search_ids(index, day, start, end, capacity, tags):
+    rooms, total = index.search(day, start, end, capacity=capacity, tags=tags, limit=1000)
+    assert total == len(rooms)
+    return sorted(room['id'] for room in rooms)
+
+
+def test_search_matches_a_scan():
+    rng = random.Random(11)
+    rooms = make_rooms(rng)
+    entries = make_entries(rng, rooms)
+    index = RoomAvailabilityIndex()
+    index.load(rooms, entries.values())
+    
+    for _ in range(300):
+        day = rng.choice(DAYS[:5]).title()
+        start = rng.randrange(90, 220) * 5
+        end = start + rng.choice([5, 30, 60, 120])
+        capacity = rng.choice([0, 25, 40, 50])
+        tags = rng.sample(TAGS, rng.randrange(3))
+        assert search_ids(index, day, start, end, capacity, tags) == naive_free(rooms, entries, day, start, end,
+                                                                                capacity, tags)
+
+
+def test_moved_and_removed_entries_free_their_slots():
+    rng = random.Random(12)
+    rooms = make_rooms(rng)
+    entries = make_entries(rng, rooms)
+    index = RoomAvailabilityIndex()
+    index.load(rooms, entries.values())
+    
+    for entry_id in rng.sample(sorted(entries), 40):
+        if rng.random() < 0.5:
+            index.remove_entry(entry_id)
+            del entries[entry_id]
+        else:
+            start = rng.randrange(96, 216) * 5
+            entries[entry_id] = (entry_id, rng.choice(rooms)[0], None, rng.choice(DAYS[:5]).title(), start, start + 60)
+            index.set_entry(*entries[entry_id])
+    
+    for day in DAYS[:5]:
+        for start in range(480, 1080, 25):
+            assert search_ids(index, day.title(), start, start + 45, 0, ()) == naive_free(
+                rooms, entries, day.title(), start, start + 45, 0, ())
+
+
+def test_entries_match_rooms_by_number_and_free_window():
+    rooms = [(1, 'LH-1', 'Hall', 100, 'A', '1', parse_facilities('Projector, AC'))]
+    index = RoomAvailabilityIndex()
+    index.load(rooms, [(1, None, ' lh-1 ', 'Monday', 540, 600), (2, None, 'LH-1', 'Monday', 720, 780)])
+    
+    assert index.search('Monday', 570, 630)[1] == 0
+    found, _ = index.search('monday', 600, 660, tags=['projector', 'ac'])
+    assert (found[0]['free_from'], found[0]['free_until']) == (600, 720)
@@ -0,0 +1,61 @@
+from sqlalchemy import Column, Integer, String, create_engine, insert, update
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from session_hooks import track_changes
+
+Base = declarative_base()
+
+
+class Room(Base):
+    __tablename__ = 'room'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(20))
+
+
+def make_session(applied):
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    
+    def collect(session, changes):
+        changes.items.extend(obj.name for obj in session.new if isinstance(obj, Room))
+    
+    def apply(session, changes):
+        applied.append((sorted(changes.items), changes.stale))
+    
+    track_changes(Session, 'rooms', (Room,), collect, apply)
+    return Session()
+
+
+def test_changes_are_applied_once_committed():
+    applied = []
+    session = make_session(applied)
+    session.add(Room(name='A'))
+    session.flush()
+    session.add(Room(name='B'))
+    assert applied == []
+    session.commit()
+    assert applied == [(['A', 'B'], False)]
+    
+    session.commit()  # nothing noted, nothing applied
+    assert len(applied) == 1
+
+
+def test_rollback_drops_changes():
+    applied = []
+    session = make_session(applied)
+    session.add(Room(name='A'))
+    session.flush()
+    session.rollback()
+    session.add(Room(name='B'))
+    session.commit()
+    assert applied == [(['B'], False)]
+
+
+def test_bulk_statements_mark_the_cache_stale():
+    applied = []
+    session = make_session(applied)
+    session.execute(insert(Room), [{'name': 'A'}, {'name': 'B'}])
+    session.execute(update(Room).values(name='C'))
+    session.commit()
+    assert applied == [([], True)]
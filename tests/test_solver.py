@@ -0,0 +1,67 @@
+import random
+import time
+
+import pytest
+
+from solver import Solver, TimeLimitExceeded, solve, solve_groups
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+
+
+def make_problem(teachers=8, batches=6, rooms=4, hours=4, seed=1):
+    rng = random.Random(seed)
+    periods = [(day, start, start + 60) for day in DAYS for start in range(540, 960, 60)]
+    room_list = [(f'R{r}', 60 if r == 0 else 40, frozenset({'projector'}) if r == 0 else frozenset())
+                 for r in range(rooms)]
+    sessions = []
+    for requirement in range(teachers * 2):
+        staff_id, batch = requirement % teachers, f'B{rng.randrange(batches)}'
+        facilities = frozenset({'projector'}) if requirement % 7 == 0 else frozenset()
+        sessions.extend((requirement, staff_id, batch, 30, facilities) for _ in range(hours))
+    busy = {('staff', 0, 0), ('batch', 'B1', 1), ('room', 'R1', 2)}
+    return {'periods': periods, 'rooms': room_list, 'sessions': sessions, 'busy': busy}
+
+
+def assert_no_clash(problem, placed):
+    seen = set()
+    for s, (period, room) in placed.items():
+        _, staff_id, batch, capacity, facilities = problem['sessions'][s]
+        room_number, room_capacity, room_facilities = problem['rooms'][room]
+        assert room_capacity >= capacity and facilities <= room_facilities
+        keys = [('staff', staff_id, period), ('room', room_number, period)]
+        if batch is not None:
+            keys.append(('batch', batch, period))
+        for key in keys:
+            assert key not in seen and key not in problem['busy']
+            seen.add(key)
+
+
+def test_solution_has_no_clashes():
+    problem = make_problem()
+    result = solve(problem, time.time() + 5)
+    assert_no_clash(problem, result['placed'])
+    assert len(result['placed']) + len(result['unplaced']) == len(problem['sessions'])
+    assert not result['unplaced']
+
+
+def test_overfull_problem_reports_unplaced_sessions():
+    # One room and 35 periods cannot hold 64 sessions
+    problem = make_problem(rooms=1)
+    result = solve_groups(problem, [range(len(problem['sessions']))], time_limit=1)
+    assert_no_clash(problem, result['placed'])
+    assert len(result['placed']) <= len(problem['periods'])
+    assert sorted(result['unplaced']) == sorted(set(range(len(problem['sessions']))) - set(result['placed']))
+
+
+def test_groups_respect_the_time_limit():
+    problem = make_problem(teachers=30, batches=20, rooms=3, hours=5, seed=2)
+    groups = [[s for s, session in enumerate(problem['sessions']) if session[1] % 2 == parity] for parity in (0, 1)]
+    started = time.time()
+    result = solve_groups(problem, groups, time_limit=0.5)
+    assert time.time() - started < 1.5
+    assert_no_clash(problem, result['placed'])
+
+
+def test_setup_past_the_deadline_raises():
+    with pytest.raises(TimeLimitExceeded):
+        Solver(make_problem(), deadline=time.time() - 1)
@@ -0,0 +1,31 @@
+from app import db, Timetable
+
+
+def entry(staff_id, **fields):
+    return dict({
+        'staff_id': staff_id, 'course_code': 'CS101', 'course_name': 'Programming',
+        'day': 'Monday', 'time_slot': '09:00-10:00', 'room': 'R1',
+    }, **fields)
+
+
+def test_add_rejects_unknown_day(admin_client, make_staff):
+    staff_id = make_staff('E1').id
+    response = admin_client.post('/api/admin/timetable', json=entry(staff_id, day='Funday'))
+    assert response.status_code == 400
+    assert Timetable.query.count() == 0
+    
+    response = admin_client.post('/api/admin/timetable', json=entry(staff_id, day=' tuesday '))
+    assert response.status_code == 201
+    assert db.session.get(Timetable, response.json['id']).day == 'Tuesday'
+
+
+def test_update_rejects_unknown_day(admin_client, make_staff):
+    staff_id = make_staff('E1').id
+    entry_id = admin_client.post('/api/admin/timetable', json=entry(staff_id)).json['id']
+    
+    response = admin_client.put(f'/api/admin/timetable/{entry_id}', json={'day': 'Funday'})
+    assert response.status_code == 400
+    response = admin_client.put(f'/api/admin/timetable/{entry_id}', json={'course_name': 'Intro'})
+    assert response.status_code == 200
+    db.session.expire_all()
+    assert db.session.get(Timetable, entry_id).day == 'Monday'
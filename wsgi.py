@@ -0,0 +1,13 @@
+"""
+WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Uses the production configuration unless FLASK_CONFIG says otherwise.
+"""
+
+import os
+
+from app import create_app
+
+app = create_app(os.environ.get('FLASK_CONFIG', 'production'))